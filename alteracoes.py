@@ -0,0 +1,271 @@
+"""
+alteracoes.py — Changesets: troca, entre máquinas, só dos registros editados.
+
+Os triggers criados em database._criar_registro_alteracoes mantêm em
+main.alteracoes o último valor de cada campo de listas e linhas, com o carimbo
+HLC (relogio.py) de quem o escreveu. Daí:
+
+  - exportar(conn, desde): todos os campos dos registros que mudaram depois do
+    cursor `desde` (o "cursor" de um export anterior). O tamanho acompanha o
+    número de edições, não o do banco;
+  - aplicar(conn, changeset): junta campo a campo, vence o carimbo mais novo
+    (last-writer-wins). Nada se perde num conflito: edições em campos
+    diferentes se somam, e uma remoção só apaga o registro se for mais nova que
+    todas as edições dele — senão o registro é mantido (ou recriado).
+
+Ficam de fora as sequências, o banco de espera e o arquivo: arquivar e
+desarquivar não são registrados, e uma edição recebida para uma linha
+arquivada aqui a devolve ao principal antes de ser aplicada.
+"""
+
+import database
+import relogio
+import repositorio
+
+VERSAO_FORMATO = 1
+
+# Ordem de aplicação: as linhas precisam da lista (lista_id viaja como o uid dela)
+COLUNAS = {
+    "listas": database.COLUNAS_SINCRONIZADAS_LISTAS,
+    "linhas": database.COLUNAS_SINCRONIZADAS,
+}
+
+# Sem estes campos a linha não pode ser criada aqui (NOT NULL em linhas)
+OBRIGATORIAS = {
+    "listas": ("nome",),
+    "linhas": ("lista_id", "nome", "conteudo", "status", "opiniao"),
+}
+
+APAGADA = database.COLUNA_APAGADA
+
+
+class ChangesetError(ValueError):
+    """Changeset em formato desconhecido ou com entradas inválidas."""
+
+
+def cursor_atual(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM main.alteracoes").fetchone()[0]
+
+
+def iniciar_relogio(conn):
+    """O relógio do processo começa depois do último carimbo gravado (o relógio do sistema pode ter voltado)."""
+    ultimo = conn.execute("SELECT MAX(hlc) FROM main.alteracoes").fetchone()[0]
+    if ultimo:
+        relogio.relogio.observar(ultimo)
+
+
+def _valor_para_json(tabela, coluna, valor):
+    # sinopse fica comprimida no registro, como em sinopses
+    if (tabela, coluna) == ("linhas", "sinopse"):
+        return database.sinopse_texto(valor)
+    return valor
+
+
+def _valor_do_json(tabela, coluna, valor):
+    if (tabela, coluna) == ("linhas", "sinopse"):
+        return database.comprimir_sinopse(valor)
+    return valor
+
+
+# ============================================================
+# Exportação
+# ============================================================
+
+def exportar(conn, desde=0):
+    """
+    Changeset com os registros alterados depois do cursor `desde` (0 = tudo o
+    que já foi editado aqui ou recebido de outras máquinas).
+    """
+    conn.execute("BEGIN")
+    try:
+        cursor = cursor_atual(conn)
+        rows = conn.execute("""
+            SELECT a.tabela, a.uid, a.coluna, a.valor, a.hlc
+              FROM main.alteracoes a
+             WHERE (a.tabela, a.uid) IN (SELECT tabela, uid FROM main.alteracoes WHERE seq > ? AND seq <= ?)
+             ORDER BY a.tabela = 'linhas', a.uid, a.coluna
+        """, (int(desde), cursor)).fetchall()
+    finally:
+        conn.rollback()
+    return {
+        "formato": VERSAO_FORMATO,
+        "origem": relogio.relogio.no,
+        "desde": int(desde),
+        "cursor": cursor,
+        "registros": len({(row[0], row[1]) for row in rows}),
+        "alteracoes": [
+            {"tabela": tabela, "uid": uid, "coluna": coluna,
+             "valor": _valor_para_json(tabela, coluna, valor), "hlc": hlc}
+            for tabela, uid, coluna, valor, hlc in rows
+        ],
+    }
+
+
+# ============================================================
+# Aplicação (last-writer-wins por campo)
+# ============================================================
+
+def _agrupar(changeset):
+    """{(tabela, uid): {coluna: (hlc, valor)}} validado; repetições ficam com o carimbo mais novo."""
+    if not isinstance(changeset, dict) or changeset.get("formato") != VERSAO_FORMATO:
+        raise ChangesetError(f"Changeset de formato desconhecido (esperado formato {VERSAO_FORMATO})")
+    entradas = changeset.get("alteracoes")
+    if not isinstance(entradas, list):
+        raise ChangesetError("alteracoes deve ser uma lista")
+    grupos = {}
+    for i, entrada in enumerate(entradas):
+        try:
+            tabela, uid, coluna, hlc = entrada["tabela"], entrada["uid"], entrada["coluna"], entrada["hlc"]
+            valor = entrada.get("valor")
+        except (TypeError, KeyError) as e:
+            raise ChangesetError(f"alteracoes[{i}]: campo ausente {e}") from e
+        if tabela not in COLUNAS or (coluna not in COLUNAS[tabela] and coluna != APAGADA):
+            raise ChangesetError(f"alteracoes[{i}]: {tabela}.{coluna} não é sincronizada")
+        if not isinstance(uid, str) or not uid:
+            raise ChangesetError(f"alteracoes[{i}]: uid inválido")
+        try:
+            relogio.separar(hlc)
+        except relogio.RelogioError as e:
+            raise ChangesetError(f"alteracoes[{i}]: {e}") from e
+        campos = grupos.setdefault((tabela, uid), {})
+        if coluna not in campos or hlc > campos[coluna][0]:
+            campos[coluna] = (hlc, valor)
+    return grupos
+
+
+def _id_local(conn, tabela, uid):
+    row = conn.execute(f"SELECT id FROM main.{tabela} WHERE uid = ?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def _desarquivar(conn, uid):
+    """Devolve ao principal a linha arquivada com esse uid (ou 'base-<id>'). Retorna o id ou None."""
+    tem_uid = any(row[1] == "uid" for row in conn.execute("PRAGMA arquivo.table_xinfo(linhas)"))
+    row = conn.execute(
+        f"SELECT id FROM arquivo.linhas WHERE {'uid = ? OR ' if tem_uid else ''}'base-' || id = ?",
+        (uid, uid) if tem_uid else (uid,)
+    ).fetchone()
+    if row is None or not repositorio.desarquivar_linhas(conn, [row[0]]):
+        return None
+    return row[0]
+
+
+def _gravar_registro(conn, tabela, uid, campos):
+    for coluna, (hlc, valor) in campos.items():
+        conn.execute("""
+            INSERT OR REPLACE INTO main.alteracoes (tabela, uid, coluna, valor, hlc, seq)
+            VALUES (?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM main.alteracoes))
+        """, (tabela, uid, coluna, _valor_do_json(tabela, coluna, valor), hlc))
+
+
+def _valores_locais(conn, tabela, campos):
+    """Valores do changeset convertidos para gravar em main.<tabela>; None se a lista da linha não existe aqui."""
+    valores = {}
+    for coluna, (_, valor) in campos.items():
+        if coluna == APAGADA:
+            continue
+        if coluna == "lista_id":
+            valor = _id_local(conn, "listas", valor) if valor is not None else None
+            if valor is None:
+                return None
+        elif coluna == "sinopse" and valor is None:
+            valor = ""   # '' apaga a sinopse (NULL seria ignorado pelo trigger)
+        valores[coluna] = valor
+    return valores
+
+
+def _aplicar_registro(conn, tabela, uid, remotos, resultado, listas_apagadas):
+    locais = {
+        coluna: (hlc, _valor_para_json(tabela, coluna, valor))
+        for coluna, valor, hlc in conn.execute(
+            "SELECT coluna, valor, hlc FROM main.alteracoes WHERE tabela = ? AND uid = ?", (tabela, uid)
+        )
+    }
+    novos = {c: (h, v) for c, (h, v) in remotos.items() if c not in locais or h > locais[c][0]}
+    resultado["ignoradas"] += len(remotos) - len(novos)
+    if not novos:
+        return
+    campos = dict(locais, **novos)
+    apagada = campos.get(APAGADA)
+    ultima_edicao = max((h for c, (h, _) in campos.items() if c != APAGADA), default=None)
+    existe = apagada is None or (ultima_edicao is not None and ultima_edicao > apagada[0])
+
+    linha_id = _id_local(conn, tabela, uid)
+    if linha_id is None and existe and tabela == "linhas":
+        linha_id = _desarquivar(conn, uid)
+
+    if not existe:
+        if linha_id is not None and tabela == "linhas":
+            repositorio.remover_linha(conn, repositorio.MAIN, linha_id)
+            resultado["apagadas"] += 1
+        elif linha_id is not None:
+            # Só depois das linhas: a lista pode ter ficado com edições mais novas que a remoção
+            listas_apagadas.append((linha_id, uid))
+    elif linha_id is None:
+        valores = _valores_locais(conn, tabela, campos)
+        if valores is None or any(valores.get(c) is None for c in OBRIGATORIAS[tabela]):
+            # Falta a lista ou parte dos campos: fica para um changeset mais completo
+            resultado["pendentes"] += 1
+            return
+        colunas = list(valores) + ["uid"]
+        novo_id = conn.execute(
+            f"INSERT INTO main.{tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            list(valores.values()) + [uid]
+        ).lastrowid
+        if tabela == "linhas":
+            database.sync_linha_tags(conn, novo_id, valores.get("tags"), repositorio.MAIN)
+        resultado["criadas"] += 1
+    else:
+        valores = _valores_locais(conn, tabela, {c: v for c, v in novos.items() if c != APAGADA})
+        if valores is None:
+            resultado["pendentes"] += 1
+            return
+        if valores:
+            conn.execute(
+                f"UPDATE main.{tabela} SET {', '.join(f'{c} = ?' for c in valores)} WHERE id = ?",
+                list(valores.values()) + [linha_id]
+            )
+            if "tags" in valores:
+                database.sync_linha_tags(conn, linha_id, valores["tags"], repositorio.MAIN)
+            resultado["atualizadas"] += 1
+        elif apagada is not None:
+            # Remoção recebida, mas há edição local mais nova: o registro fica
+            resultado["mantidas"] += 1
+    _gravar_registro(conn, tabela, uid, novos)
+    resultado["aplicadas"] += len(novos)
+
+
+def aplicar(conn, changeset):
+    """
+    Aplica um changeset (de exportar() em outra máquina) numa transação só.
+    Retorna contagens: campos aplicados/ignorados (mais velhos que os daqui) e
+    registros criados, atualizados, apagados, mantidos (remoção perdeu para
+    edição local) e pendentes (faltou a lista ou campos para criar a linha).
+    """
+    grupos = _agrupar(changeset)
+    resultado = {"origem": changeset.get("origem"), "recebidas": sum(len(c) for c in grupos.values()),
+                 "aplicadas": 0, "ignoradas": 0, "criadas": 0, "atualizadas": 0,
+                 "apagadas": 0, "mantidas": 0, "pendentes": 0}
+    for campos in grupos.values():
+        for hlc, _ in campos.values():
+            relogio.relogio.observar(hlc)
+
+    listas_apagadas = []
+    with repositorio.transacao(conn), database.sem_registro():
+        for tabela in COLUNAS:
+            for (t, uid), campos in grupos.items():
+                if t == tabela:
+                    _aplicar_registro(conn, tabela, uid, campos, resultado, listas_apagadas)
+        for lista_id, uid in listas_apagadas:
+            nome = repositorio.nome_lista(conn, repositorio.MAIN, lista_id)
+            if conn.execute("SELECT 1 FROM main.linhas WHERE lista_id = ? LIMIT 1", (lista_id,)).fetchone():
+                # A lista fica pelas linhas editadas depois da remoção; o nome com carimbo novo
+                # a recria na máquina de origem antes dessas linhas chegarem lá
+                _gravar_registro(conn, "listas", uid, {"nome": (relogio.relogio.agora(), nome)})
+                resultado["mantidas"] += 1
+            else:
+                repositorio.remover_lista(conn, repositorio.MAIN, lista_id)
+                resultado["apagadas"] += 1
+    resultado["cursor"] = cursor_atual(conn)
+    return resultado
+
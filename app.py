@@ -1,116 +1,33 @@
-from flask import Flask, Response, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, g, has_app_context
 import sqlite3
 import requests
 import re
 from datetime import datetime, timedelta, timezone
-import subprocess
 import json
 from deep_translator import GoogleTranslator
 import traceback
 import time
 from flask_caching import Cache
-import threading
 import os
 import sys
+import database
+import armazenamento
+import indice_colunar
+import snapshots
+import manutencao
+import sincronia_git
+import exportacao
+import alteracoes
+import historico
+
+# repositorio.py (SQLite, padrão) ou repositorio_pg.py, conforme LISTIT_BACKEND
+repositorio = armazenamento.carregar()
 
 app = Flask(__name__)
 
 index_tracker = {}
 index_tracker_manga = {}
 
-_git_lock = threading.Lock()
-
-def safe_git_commit(message, max_retries=2):
-    """Executa git add/commit/push com lock e retry."""
-    with _git_lock:
-        for attempt in range(max_retries):
-            try:
-                # Verifica se já existe lock
-                if os.path.exists('.git/index.lock'):
-                    try:
-                        os.remove('.git/index.lock')
-                        time.sleep(0.3)
-                    except:
-                        pass
-                
-                # Verifica se há mudanças para commitar
-                status_result = subprocess.run(
-                    ['git', 'status', '--porcelain', 'list_it.db'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=5,
-                    text=True
-                )
-                
-                # Se não há mudanças, não faz nada
-                if not status_result.stdout.strip():
-                    return True
-                
-                # Git add com silêncio
-                subprocess.run(
-                    ['git', 'add', 'list_it.db'],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    timeout=10
-                )
-                
-                # Git commit
-                result = subprocess.run(
-                    ['git', 'commit', '-m', message],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=10,
-                    text=True
-                )
-                
-                if "nothing to commit" in result.stdout.lower():
-                    print_success(f"✅ Git: {message}")
-                    return True
-                
-                if result.returncode != 0:
-                    if attempt < max_retries - 1:
-                        time.sleep(0.5)
-                        continue
-                    return False
-                
-                # Git push (com menor timeout)
-                push_result = subprocess.run(
-                    ['git', 'push'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=15,
-                    text=True
-                )
-                
-                if "cannot lock ref" in push_result.stderr or "failed to push" in push_result.stderr:
-                    if attempt < max_retries - 1:
-                        subprocess.run(['git', 'fetch', 'origin'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
-                        subprocess.run(['git', 'reset', '--hard', 'origin/main'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
-                        time.sleep(0.5)
-                        continue
-                    return False
-                
-                if push_result.returncode == 0:
-                    return True
-                else:
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-                        continue
-                    return False
-                    
-            except subprocess.TimeoutExpired:
-                if attempt < max_retries - 1:
-                    time.sleep(0.5)
-                    continue
-                return False
-            except Exception:
-                if attempt < max_retries - 1:
-                    time.sleep(0.5)
-                    continue
-                return False
-        
-        return False
-
 # ===== LOGS ESTILIZADOS (para terminal) =====
 try:
     import colorama
@@ -151,131 +68,123 @@ def print_error(text):
     print(_color_text(f"❌ {text}", color="bright_red", style="bright"))
 
 def init_db():
-    """Cria as tabelas do banco de dados SQLite, caso não existam."""
-    with sqlite3.connect("list_it.db") as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS listas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS linhas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lista_id INTEGER NOT NULL,
-                nome TEXT NOT NULL,
-                alias TEXT,
-                tags TEXT,
-                conteudo TEXT NOT NULL,
-                status TEXT NOT NULL,
-                episodio INTEGER,
-                opiniao TEXT NOT NULL,
-                imagem_url TEXT,
-                last_highlight TEXT,
-                sinonimos TEXT,
-                sinopse TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (lista_id) REFERENCES listas(id)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sequencias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                descricao TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sequencia_itens (
-                sequencia_id INTEGER NOT NULL,
-                linha_id INTEGER NOT NULL,
-                ordem INTEGER NOT NULL,
-                PRIMARY KEY (sequencia_id, linha_id),
-                FOREIGN KEY (sequencia_id) REFERENCES sequencias(id) ON DELETE CASCADE,
-                FOREIGN KEY (linha_id) REFERENCES linhas(id) ON DELETE CASCADE
-            )
-        """)
-        
-        conn.commit()
+    """Cria/atualiza o schema do banco principal via migrações versionadas."""
+    for versao, nome in database.migrate(database.MAIN_DB, database.MAIN_MIGRATIONS):
+        print_info(f"Migração aplicada em {database.MAIN_DB}: v{versao} ({nome})")
+    sincronizar_tag_bits(database.MAIN_DB)
+    conn = database.get_connection(database.MAIN_DB)
+    alteracoes.iniciar_relogio(conn)
+    conn.close()
+
+def sincronizar_tag_bits(path):
+    """Distribui bits para tags canônicas acrescentadas em database.TAGS_CANONICAS."""
+    conn = database.get_connection(path)
+    with repositorio.transacao(conn):
+        novas = database.sincronizar_tag_bits(conn)
+    conn.close()
+    if novas:
+        print_info(f"{novas} tags canônicas novas em {path}; máscaras recalculadas")
+
+def restaurar_exportacao():
+    """Refaz os .db cuja exportação no git é mais nova (ex.: depois de um git pull ou clone)."""
+    for banco, registros in exportacao.restaurar_desatualizados():
+        print_info(f"{banco} reconstruído a partir de {exportacao.diretorio(banco)} ({registros} registros)")
+
+if armazenamento.sqlite():
+    restaurar_exportacao()
+    init_db()
+else:
+    repositorio.preparar()
+    print_info(f"Backend {armazenamento.BACKEND}: schemas main/espera prontos")
+
+def _track_connection(conn):
+    """Registra a conexão para ser devolvida ao pool no fim da requisição."""
+    if has_app_context():
+        g.setdefault("_db_conns", []).append(conn)
+    return conn
 
-init_db()
+@app.teardown_appcontext
+def release_db_connections(exc):
+    for conn in g.pop("_db_conns", []):
+        conn.close()
 
 def get_db_connection():
-    conn = sqlite3.connect('list_it.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _track_connection(repositorio.conectar())
+
+# Rotas que só usam a interface do repositório (ver armazenamento.INTERFACE) e por
+# isso funcionam em qualquer backend. As demais ainda têm SQL do SQLite (FTS,
+# sequências, arquivo, snapshots, lote) e respondem 501 nos outros backends.
+ROTAS_PORTAVEIS = {
+    "static", "index", "proxy_image", "search_images", "search_image",
+    "get_listas", "add_lista", "delete_lista",
+    "get_linhas", "get_linha_details", "add_linha", "update_linha", "patch_linha",
+    "progress_linha", "delete_linha", "update_linha_imagem",
+    "get_all_tags", "get_lista_tags", "get_all_waiting_tags",
+    "get_waiting_listas", "add_waiting_lista", "delete_waiting_lista",
+    "get_waiting_linhas", "add_waiting_linha", "update_waiting_linha", "delete_waiting_linha",
+    "dedupe_waiting", "clear_waiting_db", "migrate_waiting_to_main", "migrate_wait_to_main_selective",
+    "move_items",
+}
+
+@app.before_request
+def exigir_rota_portavel():
+    if not armazenamento.sqlite() and request.endpoint and request.endpoint not in ROTAS_PORTAVEIS:
+        return jsonify({"error": f"Rota indisponível com LISTIT_BACKEND={armazenamento.BACKEND}"}), 501
+
+def iniciar_servicos():
+    """Snapshots, manutenção e índice do histórico (cada iniciar() sobe sua thread uma vez por processo)."""
+    if armazenamento.sqlite():
+        snapshots.iniciar()
+        manutencao.iniciar()
+        historico.iniciar()
+
+@app.before_request
+def iniciar_servicos_na_primeira_requisicao():
+    # Cobre `flask run`, gunicorn etc.: só o processo que atende requisições sobe as threads
+    iniciar_servicos()
+
+@app.after_request
+def contar_escrita(response):
+    """Cada escrita bem-sucedida conta para o próximo snapshot (ver snapshots.SNAPSHOT_A_CADA)."""
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        snapshots.registrar_escrita()
+    return response
 
 # ============================================================
 # NOVO: Banco de dados de espera (waiting_list.db)
 # ============================================================
 
-WAITING_DB = "waiting_list.db"
+WAITING_DB = database.WAITING_DB
 
 def init_waiting_db():
-    """Cria as tabelas do banco de espera, com a coluna migrated."""
-    with sqlite3.connect(WAITING_DB) as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS listas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS linhas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lista_id INTEGER NOT NULL,
-                nome TEXT NOT NULL,
-                alias TEXT,
-                tags TEXT,
-                conteudo TEXT NOT NULL,
-                status TEXT NOT NULL,
-                episodio INTEGER,
-                opiniao TEXT NOT NULL,
-                imagem_url TEXT,
-                last_highlight TEXT,
-                sinonimos TEXT,
-                sinopse TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                migrated INTEGER DEFAULT 0,   -- NOVA COLUNA
-                FOREIGN KEY (lista_id) REFERENCES listas(id)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sequencias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                descricao TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sequencia_itens (
-                sequencia_id INTEGER NOT NULL,
-                linha_id INTEGER NOT NULL,
-                ordem INTEGER NOT NULL,
-                PRIMARY KEY (sequencia_id, linha_id),
-                FOREIGN KEY (sequencia_id) REFERENCES sequencias(id) ON DELETE CASCADE,
-                FOREIGN KEY (linha_id) REFERENCES linhas(id) ON DELETE CASCADE
-            )
-        """)
-        
-        conn.commit()
+    """Cria/atualiza o schema do banco de espera (com a coluna migrated)."""
+    for versao, nome in database.migrate(WAITING_DB, database.WAITING_MIGRATIONS):
+        print_info(f"Migração aplicada em {WAITING_DB}: v{versao} ({nome})")
+    sincronizar_tag_bits(WAITING_DB)
 
-init_waiting_db()
+if armazenamento.sqlite():
+    init_waiting_db()
 
-def get_waiting_db_connection():
-    conn = sqlite3.connect(WAITING_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+def init_arquivo_db():
+    """Cria/atualiza o arquivo de linhas antigas (anexado às conexões do principal como "arquivo")."""
+    for versao, nome in database.migrate(database.ARQUIVO_DB, database.ARQUIVO_MIGRATIONS):
+        print_info(f"Migração aplicada em {database.ARQUIVO_DB}: v{versao} ({nome})")
+
+if armazenamento.sqlite():
+    init_arquivo_db()
+
+def init_historico_db():
+    """Índice local do histórico do git (historico.py); pode ser apagado, é refeito na próxima consulta."""
+    for versao, nome in database.migrate(database.HISTORICO_DB, database.HISTORICO_MIGRATIONS):
+        print_info(f"Migração aplicada em {database.HISTORICO_DB}: v{versao} ({nome})")
+
+if armazenamento.sqlite():
+    init_historico_db()
+
+# O banco de espera fica anexado às conexões do principal como o schema "espera":
+# as rotas /wait/* usam get_db_connection() e o repositorio com schema=ESPERA.
+ESPERA = repositorio.ESPERA
+MAIN = repositorio.MAIN
 
 # ============================================================
 # ENDPOINTS: Listas de espera
@@ -284,10 +193,8 @@ def get_waiting_db_connection():
 @app.route("/wait/listas", methods=["GET"])
 @app.route("/waiting/listas", methods=["GET"])
 def get_waiting_listas():
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM listas")
-    listas = [{"id": row[0], "nome": row[1]} for row in cursor.fetchall()]
+    conn = get_db_connection()
+    listas = repositorio.listar_listas(conn, ESPERA)
     conn.close()
     return jsonify(listas)
 
@@ -299,30 +206,24 @@ def add_waiting_lista():
     if not nome:
         return jsonify({"error": "Nome da lista é obrigatório"}), 400
     
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO listas (nome) VALUES (?)", (nome,))
-    conn.commit()
-    lista_id = cursor.lastrowid
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        lista_id = repositorio.criar_lista(conn, ESPERA, nome)
     conn.close()
+    sincronia_git.registrar(f"Criando Lista na espera: {nome} id: {lista_id}")
     return jsonify({"id": lista_id, "nome": nome})
 
 @app.route("/wait/listas/<int:lista_id>", methods=["DELETE"])
 @app.route("/waiting/listas/<int:lista_id>", methods=["DELETE"])
 def delete_waiting_lista(lista_id):
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome FROM listas WHERE id = ?", (lista_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return jsonify({"message": "Lista não encontrada."}), 404
-    
-    nome = row['nome']
-    cursor.execute("DELETE FROM linhas WHERE lista_id = ?", (lista_id,))
-    cursor.execute("DELETE FROM listas WHERE id = ?", (lista_id,))
-    conn.commit()
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        nome = repositorio.remover_lista(conn, ESPERA, lista_id)
     conn.close()
+    if nome is None:
+        return jsonify({"message": "Lista não encontrada."}), 404
+    manutencao.agendar()
+    sincronia_git.registrar(f"Removendo Lista da espera: {nome} id: {lista_id}")
     return jsonify({"message": f"Lista '{nome}' excluída com sucesso."})
 
 
@@ -333,34 +234,14 @@ def delete_waiting_lista(lista_id):
 @app.route("/wait/linhas/<int:lista_id>", methods=["GET"])
 @app.route("/waiting/linhas/<int:lista_id>", methods=["GET"])
 def get_waiting_linhas(lista_id):
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, lista_id, nome, tags, conteudo, status, episodio,
-            opiniao, imagem_url, last_highlight, sinopse, sinonimos, migrated
-        FROM linhas
-        WHERE lista_id = ?
-    """, (lista_id,))
-    linhas = []
-    for row in cursor.fetchall():
-        sinopse = row['sinopse'] or ""
-        sinonimos = json.loads(row['sinonimos']) if row['sinonimos'] else []
-        linhas.append({
-            "id": row['id'],
-            "lista_id": row['lista_id'],
-            "nome": row['nome'],
-            "tags": row['tags'],
-            "conteudo": row['conteudo'],
-            "status": row['status'],
-            "episodio": row['episodio'],
-            "opiniao": row['opiniao'],
-            "imagem_url": row['imagem_url'],
-            "last_highlight": row['last_highlight'],
-            "sinopse": sinopse,
-            "sinonimos": sinonimos,
-            "migrated": row['migrated']
-        })
+    conn = get_db_connection()
+    rows = repositorio.listar_linhas(conn, ESPERA, lista_id, LINHA_FIELDS[:-1] + ("migrated",))
     conn.close()
+    linhas = []
+    for row in rows:
+        linha = linha_to_json(row, LINHA_FIELDS[:-1])
+        linha["migrated"] = row['migrated']
+        linhas.append(linha)
     return jsonify(linhas)
 
 @app.route("/wait/linhas", methods=["POST"])
@@ -372,80 +253,64 @@ def add_waiting_linha():
         if field not in data:
             return jsonify({"error": f"Campo '{field}' é obrigatório"}), 400
     
-    now = datetime.now(timezone.utc).isoformat()
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO linhas (lista_id, nome, tags, conteudo, status, episodio, opiniao, imagem_url, sinonimos, sinopse, last_highlight)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        data["lista_id"],
-        data["nome"],
-        data.get("tags", ""),
-        data["conteudo"],
-        data["status"],
-        data.get("episodio"),
-        data["opiniao"],
-        data.get("imagem_url", ""),
-        json.dumps(data.get("sinonimos", [])),
-        data.get("sinopse", ""),
-        now
-    ))
-    conn.commit()
-    linha_id = cursor.lastrowid
+    dados = {"imagem_url": "", "sinopse": "", **data}
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        linha_id, now = repositorio.inserir_linha(conn, ESPERA, dados)
     conn.close()
+    # "na espera" fora do padrão "Linha: <nome> id:" de propósito: os ids da espera não são os do principal (historico.py)
+    sincronia_git.registrar(f"Adicionando na espera: {data['nome']} id: {linha_id}")
     return jsonify({"id": linha_id, "lista_id": data["lista_id"], "nome": data["nome"], "last_highlight": now})
 
 @app.route("/wait/linhas/<int:linha_id>", methods=["PUT"])
 @app.route("/waiting/linhas/<int:linha_id>", methods=["PUT"])
 def update_waiting_linha(linha_id):
     data = request.json
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM linhas WHERE id = ?", (linha_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
+    campos = {k: v for k, v in data.items()
+              if k in ("nome", "tags", "conteudo", "status", "episodio", "opiniao", "imagem_url", "sinopse", "sinonimos")}
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            alterados = repositorio.atualizar_linha(conn, ESPERA, linha_id, campos)
+    except repositorio.NaoEncontrado:
         return jsonify({"error": "Linha não encontrada"}), 404
-    
-    updates = []
-    params = []
-    for field in ["nome", "tags", "conteudo", "status", "episodio", "opiniao", "imagem_url", "sinopse"]:
-        if field in data:
-            updates.append(f"{field} = ?")
-            params.append(data[field])
-    
-    if "sinonimos" in data:
-        updates.append("sinonimos = ?")
-        params.append(json.dumps(data["sinonimos"]))
-    
-    if not updates:
+    finally:
         conn.close()
+    if not alterados:
         return jsonify({"message": "Nenhum campo para atualizar"}), 200
-    
-    params.append(linha_id)
-    cursor.execute(f"UPDATE linhas SET {', '.join(updates)} WHERE id = ?", params)
-    conn.commit()
-    conn.close()
+    sincronia_git.registrar(f"Atualizando na espera: id: {linha_id} ({', '.join(campos)})")
     return jsonify({"message": "Linha atualizada com sucesso!"})
 
 @app.route("/wait/linhas/<int:linha_id>", methods=["DELETE"])
 @app.route("/waiting/linhas/<int:linha_id>", methods=["DELETE"])
 def delete_waiting_linha(linha_id):
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome FROM linhas WHERE id = ?", (linha_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return jsonify({"message": "Linha não encontrada."}), 404
-    
-    nome = row['nome']
-    cursor.execute("DELETE FROM linhas WHERE id = ?", (linha_id,))
-    conn.commit()
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        nome = repositorio.remover_linha(conn, ESPERA, linha_id)
     conn.close()
+    if nome is None:
+        return jsonify({"message": "Linha não encontrada."}), 404
+    sincronia_git.registrar(f"Removendo da espera: {nome} id: {linha_id}")
     return jsonify({"message": f"Linha '{nome}' excluída com sucesso."})
 
+@app.route("/wait/dedupe", methods=["POST"])
+@app.route("/waiting/dedupe", methods=["POST"])
+def dedupe_waiting():
+    """Remove da espera o que já está no principal ou repetido na mesma lista. Body: {dry_run}"""
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get("dry_run", False))
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        duplicadas = repositorio.deduplicar_espera(conn, remover=not dry_run)
+    conn.close()
+    if duplicadas and not dry_run:
+        sincronia_git.registrar(f"Removendo {len(duplicadas)} linhas duplicadas da espera")
+    return jsonify({
+        "mensagem": f"{len(duplicadas)} linhas duplicadas {'encontradas' if dry_run else 'removidas'}.",
+        "dry_run": dry_run,
+        "duplicadas": duplicadas
+    })
+
 # ============================================================
 # ENDPOINT: Tags globais (principal e waiting)
 # ============================================================
@@ -453,188 +318,147 @@ def delete_waiting_linha(linha_id):
 @app.route("/tags/all", methods=["GET"])
 def get_all_tags():
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT tags FROM linhas")
-    rows = cursor.fetchall()
-    tags_set = set()
-    for row in rows:
-        if row['tags']:
-            for tag in row['tags'].split(','):
-                t = tag.strip()
-                if t:
-                    tags_set.add(t)
+    tags = repositorio.tags_em_uso(conn, MAIN)
+    conn.close()
+    return jsonify(tags)
+
+@app.route("/linhas/<int:lista_id>/tags", methods=["GET"])
+def get_lista_tags(lista_id):
+    conn = get_db_connection()
+    tags = repositorio.tags_em_uso(conn, MAIN, lista_id)
+    conn.close()
+    return jsonify(tags)
+
+@app.route("/codigos", methods=["GET"])
+def get_codigos():
+    """Rótulos de status/opinião/conteúdo com código, rank/mídia e aliases aceitos."""
+    conn = get_db_connection()
+    resultado = {}
+    for dimensao, tabela in database.DIMENSOES.items():
+        aliases = {}
+        for row in conn.execute("SELECT chave, codigo FROM rotulo_aliases WHERE dimensao = ?", (dimensao,)):
+            aliases.setdefault(row["codigo"], []).append(row["chave"])
+        resultado[dimensao] = [
+            {**dict(row), "aliases": aliases.get(row["id"], [])}
+            for row in conn.execute(f"SELECT * FROM {tabela} ORDER BY id")
+        ]
     conn.close()
-    return jsonify(sorted(tags_set))
+    return jsonify(resultado)
+
+@app.route("/tags/bits", methods=["GET"])
+def get_tag_bits():
+    """Bit de cada tag canônica em linhas.tag_mask (iguais nos dois bancos)."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT nome, chave, bit FROM tag_bits ORDER BY bit").fetchall()
+    conn.close()
+    return jsonify([dict(row) for row in rows])
 
 @app.route("/wait/tags/all", methods=["GET"])
 @app.route("/wait/tags/all", methods=["GET"])
 @app.route("/waiting/tags/all", methods=["GET"])
 def get_all_waiting_tags():
-    conn = get_waiting_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT tags FROM linhas")
-    rows = cursor.fetchall()
-    tags_set = set()
-    for row in rows:
-        if row['tags']:
-            for tag in row['tags'].split(','):
-                t = tag.strip()
-                if t:
-                    tags_set.add(t)
+    conn = get_db_connection()
+    tags = repositorio.tags_em_uso(conn, ESPERA)
     conn.close()
-    return jsonify(sorted(tags_set))
+    return jsonify(tags)
 
 # ============================================================
 # MIGRAÇÃO: Banco de espera → Banco principal (com AniList)
 # ============================================================
 
+def enriquecer_linhas_migradas(linha_ids):
+    """Busca na AniList imagem/sinopse/sinônimos das linhas migradas que ainda estão incompletas."""
+    if not linha_ids:
+        return {}
+    conn = get_db_connection()
+    rows = repositorio.linhas_incompletas(conn, linha_ids)
+    conn.close()
+    atualizacoes = {}
+    for row in rows:
+        media_type = "ANIME" if (row["conteudo"] or "").lower() in ["anime", "filme"] else "MANGA"
+        details = fetch_media_details(row["nome"], media_type)
+        if not details:
+            continue
+        imagem_url = fetch_anime_image_url(row["nome"]) if media_type == "ANIME" else fetch_manga_image_url(row["nome"])
+        atualizacoes[row["id"]] = {
+            "imagem_url": imagem_url,
+            "sinonimos": details["sinonimos"],
+            "sinopse": details["sinopse"]
+        }
+    if atualizacoes:
+        conn = get_db_connection()
+        with repositorio.transacao(conn):
+            for linha_id, campos in atualizacoes.items():
+                repositorio.atualizar_linha(conn, MAIN, linha_id, campos)
+        conn.close()
+    return atualizacoes
+
 @app.route("/migrate/wait/to/main", methods=["POST"])
 @app.route("/migrate/wait/to/main", methods=["POST"])
 @app.route("/migrate/waiting/to/main", methods=["POST"])
 def migrate_waiting_to_main():
+    """
+    Migra a espera (ou só a lista `lista_id`) para o principal numa única transação:
+    listas casadas pelo nome, linhas copiadas com INSERT ... SELECT e removidas da espera.
+    Depois busca na AniList os dados das linhas que chegaram incompletas (buscar_detalhes).
+    """
     data = request.get_json() or {}
     dry_run = data.get("dry_run", False)
     lista_id_filter = data.get("lista_id")
-    
-    wait_conn = get_waiting_db_connection()
-    main_conn = get_db_connection()
-    wait_cursor = wait_conn.cursor()
-    main_cursor = main_conn.cursor()
-    
-    if lista_id_filter:
-        wait_cursor.execute("SELECT id, nome FROM listas WHERE id = ?", (lista_id_filter,))
-    else:
-        wait_cursor.execute("SELECT id, nome FROM listas")
-    
-    waiting_lists = wait_cursor.fetchall()
-    
+    buscar_detalhes = data.get("buscar_detalhes", True)
+
+    conn = get_db_connection()
+    waiting_lists = [l for l in repositorio.listar_listas(conn, ESPERA)
+                     if not lista_id_filter or l["id"] == lista_id_filter]
     if not waiting_lists:
-        wait_conn.close()
-        main_conn.close()
+        conn.close()
         return jsonify({
             "mensagem": "Nenhuma lista no banco de espera.",
             "migrados": 0,
             "erros": []
         })
-    
-    resultados = {
-        "listas_migradas": 0,
-        "linhas_migradas": 0,
-        "linhas_com_erro": 0,
-        "erros": [],
-        "detalhes": []
-    }
-    
-    for wait_list in waiting_lists:
-        wait_list_id = wait_list["id"]
-        wait_list_nome = wait_list["nome"]
-        
-        main_cursor.execute("SELECT id FROM listas WHERE nome = ?", (wait_list_nome,))
-        existing = main_cursor.fetchone()
-        
-        if dry_run:
-            resultados["detalhes"].append({
-                "lista": wait_list_nome,
-                "acao": "simularia criação" if not existing else "já existe",
+
+    if dry_run:
+        principais = {l["nome"] for l in repositorio.listar_listas(conn, MAIN)}
+        conn.close()
+        return jsonify({
+            "mensagem": "Simulação concluída.",
+            "listas_migradas": 0,
+            "linhas_migradas": 0,
+            "linhas_com_erro": 0,
+            "erros": [],
+            "detalhes": [{
+                "lista": l["nome"],
+                "acao": "já existe" if l["nome"] in principais else "simularia criação",
                 "itens": []
-            })
-            continue
-        
-        if not existing:
-            main_cursor.execute("INSERT INTO listas (nome) VALUES (?)", (wait_list_nome,))
-            main_lista_id = main_cursor.lastrowid
-            main_conn.commit()
-            
-            safe_git_commit(f"Criando Lista: {wait_list_nome} id: {main_lista_id}")
-        else:
-            main_lista_id = existing["id"]
-        
-        wait_cursor.execute("""
-            SELECT id, nome, tags, conteudo, status, episodio, opiniao,
-                   imagem_url, sinonimos, sinopse
-              FROM linhas
-             WHERE lista_id = ?
-        """, (wait_list_id,))
-        waiting_lines = wait_cursor.fetchall()
-        
-        for wl in waiting_lines:
-            try:
-                nome_item = wl["nome"]
-                conteudo_type = wl["conteudo"]
-                
-                media_type = "ANIME" if conteudo_type.lower() in ["anime", "filme"] else "MANGA"
-                details = fetch_media_details(nome_item, media_type)
-                
-                if details:
-                    imagem_url = fetch_anime_image_url(nome_item) if media_type == "ANIME" else fetch_manga_image_url(nome_item)
-                    sinonimos = details["sinonimos"]
-                    sinopse = details["sinopse"]
-                else:
-                    imagem_url = wl["imagem_url"] or ""
-                    try:
-                        sinonimos = json.loads(wl["sinonimos"]) if wl["sinonimos"] else []
-                    except json.JSONDecodeError:
-                        sinonimos = []
-                    sinopse = wl["sinopse"] or ""
-                
-                main_cursor.execute("""
-                    INSERT INTO linhas (
-                        lista_id, nome, tags, conteudo, status, episodio, opiniao,
-                        imagem_url, sinonimos, sinopse
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    main_lista_id,
-                    nome_item,
-                    wl["tags"],
-                    conteudo_type,
-                    wl["status"],
-                    wl["episodio"],
-                    wl["opiniao"],
-                    imagem_url,
-                    json.dumps(sinonimos, ensure_ascii=False),
-                    sinopse
-                ))
-                main_conn.commit()
-                
-                safe_git_commit(f"Migrando linha: {nome_item}")
-                
-                resultados["linhas_migradas"] += 1
-                resultados["detalhes"].append({
-                    "linha": nome_item,
-                    "lista": wait_list_nome,
-                    "status": "ok",
-                    "imagem": "buscada" if details else "mantida"
-                })
-                
-                wait_cursor.execute("DELETE FROM linhas WHERE id = ?", (wl["id"],))
-                wait_conn.commit()
-                
-            except Exception as e:
-                resultados["linhas_com_erro"] += 1
-                resultados["erros"].append({
-                    "linha": wl["nome"],
-                    "lista": wait_list_nome,
-                    "erro": str(e)
-                })
-                print_error(f"Erro ao migrar linha '{wl['nome']}': {e}")
-        
-        wait_cursor.execute("SELECT COUNT(*) FROM linhas WHERE lista_id = ?", (wait_list_id,))
-        count = wait_cursor.fetchone()[0]
-        if count == 0:
-            wait_cursor.execute("DELETE FROM listas WHERE id = ?", (wait_list_id,))
-            wait_conn.commit()
-            resultados["listas_migradas"] += 1
-    
-    wait_conn.close()
-    main_conn.close()
-    
+            } for l in waiting_lists][:20]
+        })
+
+    try:
+        with repositorio.transacao(conn):
+            resultado = repositorio.migrar_espera(conn, lista_id_filter)
+    except repositorio.ErroDeBanco as e:
+        print_error(f"Erro ao migrar a espera: {e}")
+        return jsonify({"error": f"Erro ao migrar a espera: {e}"}), 500
+    finally:
+        conn.close()
+
+    novos_ids = [novo for _, novo in resultado["pares"]]
+    enriquecidas = enriquecer_linhas_migradas(novos_ids) if buscar_detalhes else {}
+    if novos_ids or resultado["listas_criadas"]:
+        sincronia_git.registrar(f"Migrando {len(novos_ids)} linhas da espera ({resultado['listas_criadas']} listas criadas)")
+
     return jsonify({
         "mensagem": "Migração concluída!",
-        "listas_migradas": resultados["listas_migradas"],
-        "linhas_migradas": resultados["linhas_migradas"],
-        "linhas_com_erro": resultados["linhas_com_erro"],
-        "erros": resultados["erros"],
-        "detalhes": resultados["detalhes"][:20]
+        "listas_migradas": resultado["listas_migradas"],
+        "linhas_migradas": len(novos_ids),
+        "linhas_com_erro": 0,
+        "erros": [],
+        "detalhes": [{
+            "linha_id": novo,
+            "status": "ok",
+            "imagem": "buscada" if novo in enriquecidas else "mantida"
+        } for novo in novos_ids][:20]
     })
 
 @app.route("/migrate/wait/to/main/selective", methods=["POST"])
@@ -647,150 +471,74 @@ def migrate_wait_to_main_selective():
     if not wait_list_id or not linha_ids or not main_list_id:
         return jsonify({"error": "wait_list_id, linha_ids e main_list_id são obrigatórios"}), 400
     
-    wait_conn = get_waiting_db_connection()
-    main_conn = get_db_connection()
-    wait_cursor = wait_conn.cursor()
-    main_cursor = main_conn.cursor()
-    
-    # Verifica se a lista principal existe
-    main_cursor.execute("SELECT id FROM listas WHERE id = ?", (main_list_id,))
-    if not main_cursor.fetchone():
-        wait_conn.close()
-        main_conn.close()
-        return jsonify({"error": "Lista principal não encontrada"}), 404
-    
-    resultados = {
-        "migrados": 0,
-        "erros": []
-    }
-    
-    for linha_id in linha_ids:
-        # Busca a linha na espera
-        wait_cursor.execute("""
-            SELECT id, nome, tags, conteudo, status, episodio, opiniao,
-                   imagem_url, sinonimos, sinopse
-              FROM linhas
-             WHERE id = ? AND lista_id = ?
-        """, (linha_id, wait_list_id))
-        linha = wait_cursor.fetchone()
-        if not linha:
-            resultados["erros"].append(f"Linha {linha_id} não encontrada na lista de espera")
-            continue
-        
-        # Verifica se já foi migrada
-        if linha.get("migrated", 0) == 1:
-            resultados["erros"].append(f"Linha {linha_id} já foi migrada anteriormente")
-            continue
-        
-        # Tenta buscar dados da AniList (opcional, mas mantemos)
-        nome_item = linha["nome"]
-        conteudo_type = linha["conteudo"]
-        media_type = "ANIME" if conteudo_type.lower() in ["anime", "filme"] else "MANGA"
-        details = fetch_media_details(nome_item, media_type)
-        
-        if details:
-            imagem_url = fetch_anime_image_url(nome_item) if media_type == "ANIME" else fetch_manga_image_url(nome_item)
-            sinonimos = details["sinonimos"]
-            sinopse = details["sinopse"]
-        else:
-            imagem_url = linha["imagem_url"] or ""
-            try:
-                sinonimos = json.loads(linha["sinonimos"]) if linha["sinonimos"] else []
-            except json.JSONDecodeError:
-                sinonimos = []
-            sinopse = linha["sinopse"] or ""
-        
-        # Insere na lista principal
-        try:
-            main_cursor.execute("""
-                INSERT INTO linhas (
-                    lista_id, nome, tags, conteudo, status, episodio, opiniao,
-                    imagem_url, sinonimos, sinopse
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                main_list_id,
-                nome_item,
-                linha["tags"],
-                conteudo_type,
-                linha["status"],
-                linha["episodio"],
-                linha["opiniao"],
-                imagem_url,
-                json.dumps(sinonimos, ensure_ascii=False),
-                sinopse
-            ))
-            main_conn.commit()
-            
-            # Marca como migrado na espera
-            wait_cursor.execute("UPDATE linhas SET migrated = 1 WHERE id = ?", (linha_id,))
-            wait_conn.commit()
-            
-            resultados["migrados"] += 1
-        except Exception as e:
-            resultados["erros"].append(f"Erro ao migrar linha {linha_id}: {str(e)}")
-    
-    wait_conn.close()
-    main_conn.close()
-    
-    # (Opcional) commits git - mantive apenas como exemplo, mas pode ser removido
-    # subprocess.run(['git', 'add', 'list_it.db'])
-    # subprocess.run(['git', 'commit', '-m', f"Migração seletiva para lista {main_list_id}"])
-    # subprocess.run(['git', 'push'])
-    
-    return jsonify(resultados)
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            pares, erros = repositorio.migrar_selecionadas(conn, wait_list_id, linha_ids, main_list_id)
+    except repositorio.NaoEncontrado as e:
+        return jsonify({"error": str(e)}), 404
+    finally:
+        conn.close()
+
+    novos_ids = [novo for _, novo in pares]
+    if data.get("buscar_detalhes", True):
+        enriquecer_linhas_migradas(novos_ids)
+    if novos_ids:
+        sincronia_git.registrar(f"Migração seletiva: {len(novos_ids)} linhas para a lista {main_list_id}")
+    return jsonify({"migrados": len(novos_ids), "erros": erros})
 
 @app.route("/move/items", methods=["POST"])
 def move_items():
     """
-    Move itens de uma lista para outra no banco principal.
-    Payload: { origem_lista_id, destino_lista_id, item_ids: [...] }
+    Move itens de uma lista para outra, no mesmo banco ou entre principal e espera.
+    Payload: { origem_lista_id, destino_lista_id, item_ids: [...],
+               origem_db: "main"|"wait", destino_db: "main"|"wait" }  (padrão "main")
+    Tudo roda numa única transação; a resposta traz o resultado de cada id.
     """
-    data = request.get_json()
+    data = request.get_json() or {}
     origem = data.get("origem_lista_id")
     destino = data.get("destino_lista_id")
+    origem_db = data.get("origem_db", "main")
+    destino_db = data.get("destino_db", "main")
     item_ids = data.get("item_ids", [])
+    schemas = {"main": MAIN, "wait": ESPERA}
 
     if not origem or not destino or not item_ids:
         return jsonify({"error": "origem_lista_id, destino_lista_id e item_ids são obrigatórios"}), 400
-
-    if origem == destino:
+    if origem_db not in schemas or destino_db not in schemas:
+        return jsonify({"error": "origem_db e destino_db devem ser 'main' ou 'wait'"}), 400
+    if origem == destino and origem_db == destino_db:
         return jsonify({"error": "Origem e destino não podem ser a mesma lista"}), 400
+    try:
+        item_ids = list(dict.fromkeys(int(i) for i in item_ids))
+    except (TypeError, ValueError):
+        return jsonify({"error": "item_ids deve conter apenas números"}), 400
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Verifica se as listas existem
-    cursor.execute("SELECT id FROM listas WHERE id = ?", (origem,))
-    if not cursor.fetchone():
-        conn.close()
-        return jsonify({"error": "Lista de origem não encontrada"}), 404
-    cursor.execute("SELECT id FROM listas WHERE id = ?", (destino,))
-    if not cursor.fetchone():
+    try:
+        with repositorio.transacao(conn):
+            novos_ids = repositorio.mover_linhas(
+                conn, schemas[origem_db], origem, schemas[destino_db], destino, item_ids
+            )
+    except repositorio.NaoEncontrado as e:
+        return jsonify({"error": str(e)}), 404
+    except repositorio.ErroDeBanco as e:
+        print_error(f"[MOVE] Erro ao mover itens: {e}")
+        return jsonify({"error": f"Erro ao mover itens: {e}"}), 500
+    finally:
         conn.close()
-        return jsonify({"error": "Lista de destino não encontrada"}), 404
 
-    resultados = {"movidos": 0, "erros": []}
+    resultados = {"movidos": len(novos_ids), "erros": [], "itens": []}
     for item_id in item_ids:
-        # Verifica se o item existe e pertence à origem
-        cursor.execute("SELECT id, nome FROM linhas WHERE id = ? AND lista_id = ?", (item_id, origem))
-        row = cursor.fetchone()
-        if not row:
-            resultados["erros"].append(f"Item {item_id} não encontrado na lista de origem")
-            continue
-        # Atualiza
-        try:
-            cursor.execute("UPDATE linhas SET lista_id = ? WHERE id = ?", (destino, item_id))
-            conn.commit()
-            resultados["movidos"] += 1
-        except Exception as e:
-            resultados["erros"].append(f"Erro ao mover item {item_id}: {str(e)}")
-    conn.close()
-
-    # (Opcional) commits git
-    # subprocess.run(['git', 'add', 'list_it.db'])
-    # subprocess.run(['git', 'commit', '-m', f"Movendo itens da lista {origem} para {destino}"])
-    # subprocess.run(['git', 'push'])
+        if item_id in novos_ids:
+            resultados["itens"].append({"id": item_id, "status": "movido", "novo_id": novos_ids[item_id]})
+        else:
+            erro = f"Item {item_id} não encontrado na lista de origem"
+            resultados["erros"].append(erro)
+            resultados["itens"].append({"id": item_id, "status": "erro", "erro": erro})
 
+    if novos_ids and "main" in (origem_db, destino_db):
+        sincronia_git.registrar(f"Movendo {len(novos_ids)} itens da lista {origem} ({origem_db}) para {destino} ({destino_db})")
     return jsonify(resultados)
 
 @app.route("/wait/clear", methods=["DELETE"])
@@ -801,13 +549,13 @@ def clear_waiting_db():
     if not confirm:
         return jsonify({"error": "Use ?confirm=true para confirmar"}), 400
     
-    with sqlite3.connect(WAITING_DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM sequencia_itens")
-        cursor.execute("DELETE FROM sequencias")
-        cursor.execute("DELETE FROM linhas")
-        cursor.execute("DELETE FROM listas")
-        conn.commit()
+    conn = get_db_connection()
+    with repositorio.transacao(conn):
+        repositorio.limpar(conn, ESPERA)
+    conn.close()
+    # O espaço das linhas apagadas volta ao disco na próxima manutenção
+    manutencao.agendar()
+    sincronia_git.registrar("Limpando o banco de espera")
     
     return jsonify({"mensagem": "Banco de espera limpo com sucesso."})
 
@@ -840,44 +588,38 @@ def proxy_image():
 @app.route("/listas", methods=["GET"])
 def get_listas():
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM listas")
-    listas = [{"id": row[0], "nome": row[1]} for row in cursor.fetchall()]
+    listas = repositorio.listar_listas(conn, MAIN)
+    conn.close()
     return jsonify(listas)
 
 @app.route("/listas", methods=["POST"])
 def add_lista():
     data = request.json
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO listas (nome) VALUES (?)", (data["nome"],))
-    conn.commit()
-    lista_id = cursor.lastrowid
+    with repositorio.transacao(conn):
+        lista_id = repositorio.criar_lista(conn, MAIN, data["nome"])
     conn.close()
     commit_message = f"Criando Lista: {data['nome']} id: {lista_id}"
-    safe_git_commit(commit_message)
+    sincronia_git.registrar(commit_message)
     return jsonify({"id": lista_id, "nome": data["nome"]})
 
 @app.route("/listas/<int:lista_id>", methods=["DELETE"])
 def delete_lista(lista_id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome FROM listas WHERE id = ?", (lista_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return jsonify({"message": "Lista não encontrada."}), 404
-    nome = row['nome']
     try:
-        cursor.execute("DELETE FROM linhas WHERE lista_id = ?", (lista_id,))
-        cursor.execute("DELETE FROM listas WHERE id = ?", (lista_id,))
-        conn.commit()
-        conn.close()
-        safe_git_commit(f"Removendo Lista: {nome} id: {lista_id}")
-        return jsonify({"message": "Lista excluída com sucesso."})
-    except Exception as e:
+        # Leva junto as linhas (também as arquivadas) e os itens de sequência delas
+        with repositorio.transacao(conn):
+            nome = repositorio.remover_lista(conn, MAIN, lista_id)
+    except repositorio.ErroDeBanco as e:
         print(f"[DELETE_LISTA] Erro: {e}")
         return jsonify({"message": "Erro ao deletar lista."}), 500
+    finally:
+        conn.close()
+    if nome is None:
+        return jsonify({"message": "Lista não encontrada."}), 404
+    manutencao.agendar()
+    sincronia_git.registrar(f"Removendo Lista: {nome} id: {lista_id}")
+    return jsonify({"message": "Lista excluída com sucesso."})
 
 def fetch_anime_image_url(query):
     url = "https://graphql.anilist.co"
@@ -1065,25 +807,20 @@ def update_linha_imagem(linha_id):
         return jsonify({"error": "imagem_url is required"}), 400
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE linhas SET imagem_url = ? WHERE id = ?", (imagem_url, linha_id))
-        conn.commit()
-        cursor.execute("SELECT nome FROM linhas WHERE id = ?", (linha_id,))
-        nome = cursor.fetchone()[0]
-        safe_git_commit(f"Atualizando Imagem da Linha: {nome} id: {linha_id}")
+        with repositorio.transacao(conn):
+            repositorio.atualizar_linha(conn, MAIN, linha_id, {"imagem_url": imagem_url})
+            nome = repositorio.nome_linha(conn, MAIN, linha_id)
         conn.close()
+        sincronia_git.registrar(f"Atualizando Imagem da Linha: {nome} id: {linha_id}")
         return jsonify({"message": "Imagem atualizada com sucesso!", "imagem_url": imagem_url})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/refresh_images', methods=['POST'])
 def refresh_images():
-    conn = sqlite3.connect('list_it.db')
+    conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, nome, conteudo FROM linhas
-        WHERE imagem_url IS NULL OR imagem_url = 'https://via.placeholder.com/300x450.png?text=Sem+Capa'
-    """)
+    cursor.execute("SELECT id, nome, conteudo FROM linhas WHERE falta_imagem = 1")
     linhas_com_erro = cursor.fetchall()
     atualizados = 0
     for linha_id, nome, conteudo in linhas_com_erro:
@@ -1096,7 +833,7 @@ def refresh_images():
     conn.close()
     if atualizados > 0:
         commit_message = f"Refresh de imagens: {atualizados} imagens atualizadas"
-        safe_git_commit(commit_message)
+        sincronia_git.registrar(commit_message)
     return jsonify({'mensagem': f'{atualizados} imagens atualizadas com sucesso.'})
 
 @app.route('/update_image_url', methods=['POST'])
@@ -1106,14 +843,14 @@ def update_image_url():
     new_url = data.get('new_url')
     if not linha_id or not new_url:
         return jsonify({'mensagem': 'Dados incompletos.'}), 400
-    conn = sqlite3.connect('list_it.db')
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE linhas SET imagem_url = ? WHERE id = ?", (new_url, linha_id))
     cursor.execute("SELECT nome FROM linhas WHERE id = ?", (linha_id,))
     nome = cursor.fetchone()[0]
     conn.commit()
     conn.close()
-    safe_git_commit(f"Atualizando URL da Imagem: {nome} id: {linha_id}")
+    sincronia_git.registrar(f"Atualizando URL da Imagem: {nome} id: {linha_id}")
     return jsonify({'mensagem': 'Imagem atualizada com sucesso.'})
 
 def fetch_media_details(query, media_type="ANIME", retries=3):
@@ -1154,7 +891,8 @@ def fetch_media_details(query, media_type="ANIME", retries=3):
                     sinonimos.append(s)
                 if len(sinonimos) >= 3:
                     break
-            sinopse = m.get("description") or ""
+            # Limpa o HTML da AniList uma vez, na entrada
+            sinopse = database.limpar_sinopse(m.get("description"))
             return {
                 "romaji": romaji,
                 "english": english,
@@ -1183,11 +921,11 @@ def search_details():
     if not q:
         return jsonify({"error": "q param missing"}), 400
     typ = "ANIME" if t == "anime" else "MANGA"
-    with sqlite3.connect("list_it.db") as conn:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT sinopse, sinonimos FROM linhas WHERE nome = ? COLLATE NOCASE",
-            (q,)
+            f"SELECT {database.sinopse_sql()} AS sinopse, sinonimos FROM linhas WHERE nome_norm = ?",
+            (database.nome_norm(q),)
         )
         row = cursor.fetchone()
     if row:
@@ -1209,17 +947,62 @@ def search_details():
         "sinonimos": details["sinonimos"]
     })
 
+@app.route("/search", methods=["GET"])
+def search():
+    """
+    Busca textual em todas as listas. Params: q, page, limit, lista_id, espera=true.
+    As linhas arquivadas só entram com include_archived=1 (origem "arquivo"; casam
+    nome, alias e sinônimos, sem ranking, e vêm depois das demais).
+    """
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "q param missing"}), 400
+    page = max(1, request.args.get("page", 1, type=int))
+    limit = min(100, max(1, request.args.get("limit", 20, type=int)))
+    lista_id = request.args.get("lista_id", type=int)
+    incluir_espera = request.args.get("espera", "false").lower() == "true"
+    incluir_arquivadas = request.args.get("include_archived", "").lower() in ("1", "true", "sim")
+    offset = (page - 1) * limit
+
+    # Cada schema devolve até offset+limit resultados; a página é montada após o merge por rank
+    conn = get_db_connection()
+    resultados, total = database.search_linhas(conn, q, offset + limit, 0, lista_id)
+    for r in resultados:
+        r["origem"] = "principal"
+    if incluir_espera:
+        espera, total_espera = database.search_linhas(conn, q, offset + limit, 0, lista_id, schema=ESPERA)
+        for r in espera:
+            r["origem"] = "espera"
+        resultados = sorted(resultados + espera, key=lambda r: r["rank"])
+        total += total_espera
+    if incluir_arquivadas:
+        arquivadas, total_arquivadas = repositorio.buscar_arquivadas(conn, q, offset + limit, lista_id)
+        for r in arquivadas:
+            r["origem"] = "arquivo"
+        resultados += arquivadas
+        total += total_arquivadas
+    conn.close()
+
+    return jsonify({
+        "query": q,
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "resultados": resultados[offset:offset + limit]
+    })
+
 @app.route("/linhas/<int:lista_id>/faltantes", methods=["GET"])
 def listar_faltantes(lista_id):
-    with sqlite3.connect("list_it.db", timeout=5) as conn:
+    with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute("""
+        # falta_imagem / falta_detalhes são colunas geradas com índices parciais
+        cur.execute(f"""
             SELECT id, nome, conteudo,
                    COALESCE(imagem_url, '')  AS imagem_url,
-                   COALESCE(sinopse, '')     AS sinopse,
+                   COALESCE({database.sinopse_sql()}, '') AS sinopse,
                    COALESCE(sinonimos, '[]') AS sinonimos_str
               FROM linhas
-             WHERE lista_id = ?
+             WHERE lista_id = ? AND (falta_imagem = 1 OR falta_detalhes = 1)
         """, (lista_id,))
         rows = cur.fetchall()
     faltantes = []
@@ -1228,18 +1011,14 @@ def listar_faltantes(lista_id):
             syn = json.loads(sinon_str)
         except json.JSONDecodeError:
             syn = []
-        falta_imagem   = (not img) or "placeholder.com" in img
-        falta_sinopse  = not sinopse.strip()
-        falta_synonyms = len(syn) < 3
-        if falta_imagem or falta_sinopse or falta_synonyms:
-            faltantes.append({
-                "id":        id_,
-                "nome":      nome,
-                "conteudo":  conteudo,
-                "imagem_url": img,
-                "sinopse":   sinopse,
-                "sinonimos": syn
-            })
+        faltantes.append({
+            "id":        id_,
+            "nome":      nome,
+            "conteudo":  conteudo,
+            "imagem_url": img,
+            "sinopse":   sinopse,
+            "sinonimos": syn
+        })
     return jsonify(faltantes)
 
 @app.route("/linhas/<int:linha_id>/details", methods=["PUT"])
@@ -1249,7 +1028,7 @@ def update_linha_details(linha_id):
     sinonimos = data.get("sinonimos")
     if sinopse is None or sinonimos is None:
         return jsonify({"error": "fields missing"}), 400
-    with sqlite3.connect("list_it.db", timeout=10) as conn:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE linhas SET sinonimos = ?, sinopse = ? WHERE id = ?",
@@ -1274,12 +1053,13 @@ def translate():
 @app.route("/refresh_details", methods=["POST"])
 def refresh_all_details():
     print_info("Iniciando refresh de detalhes...")
-    conn = sqlite3.connect("list_it.db")
+    conn = get_db_connection()
     cur = conn.cursor()
+    # Só os itens sem sinopse ou sem nenhum sinônimo (dentro do índice parcial de falta_detalhes)
     cur.execute("""
       SELECT id, nome, conteudo FROM linhas
-      WHERE sinonimos IS NULL OR sinonimos = '[]' 
-         OR sinopse IS NULL OR sinopse = '[]'
+      WHERE falta_detalhes = 1
+        AND (n_sinonimos = 0 OR tem_sinopse = 0)
     """)
     to_update = cur.fetchall()
     conn.close()
@@ -1293,7 +1073,7 @@ def refresh_all_details():
             has_data = det["romaji"] or det["english"] or det["sinonimos"] or det["sinopse"]
             if has_data:
                 try:
-                    conn = sqlite3.connect("list_it.db", timeout=10)
+                    conn = get_db_connection()
                     cur = conn.cursor()
                     cur.execute("""
                         UPDATE linhas 
@@ -1319,53 +1099,245 @@ def refresh_all_details():
     print_success(f"Refresh finalizado: {updated} de {len(to_update)} itens atualizados.")
     return jsonify({"updated": updated})
 
+LINHA_FIELDS = (
+    "id", "lista_id", "nome", "nome_norm", "tags", "conteudo", "status", "episodio",
+    "opiniao", "imagem_url", "last_highlight", "sinopse", "sinonimos", "tag_mask", "version", "needs_details"
+)
+# Sem fields= a listagem não traz a sinopse (comprimida em sinopses, vem em /linhas/<id>/details)
+LINHA_FIELDS_LISTA = tuple(f for f in LINHA_FIELDS if f != "sinopse")
+
+# order= -> (condição do cursor, ORDER BY). O cursor é sempre o id da última linha recebida;
+# a comparação simples por nome_norm deixa o SQLite buscar direto no índice (lista_id, nome_norm, id).
+_CURSOR_NOME = "(SELECT nome_norm{} FROM linhas WHERE id = ?)"
+LINHA_ORDERS = {
+    "id":    ("id > ?", "id"),
+    "-id":   ("id < ?", "id DESC"),
+    "nome":  (f"nome_norm >= {_CURSOR_NOME.format('')}"
+              f" AND (nome_norm, id) > {_CURSOR_NOME.format(', id')}",
+              "nome_norm, id"),
+    "-nome": (f"nome_norm <= {_CURSOR_NOME.format('')}"
+              f" AND (nome_norm, id) < {_CURSOR_NOME.format(', id')}",
+              "nome_norm DESC, id DESC"),
+}
+
+def linha_to_json(row, fields=LINHA_FIELDS):
+    """Monta o dict de resposta de uma linha apenas com os campos pedidos."""
+    item = {}
+    for field in fields:
+        if field == "sinopse":
+            item["sinopse"] = row['sinopse'] or ""
+        elif field == "sinonimos":
+            item["sinonimos"] = json.loads(row['sinonimos']) if row['sinonimos'] else []
+        elif field == "needs_details":
+            item["needs_details"] = bool(row['falta_detalhes'])
+        else:
+            item[field] = row[field]
+    return item
+
 @app.route("/linhas/<int:lista_id>", methods=["GET"])
 def get_linhas(lista_id):
+    """
+    Linhas de uma lista.
+    Params opcionais:
+      - after=<id>&limit=<n>: paginação por cursor (resposta vira {linhas, next_after})
+      - fields=id,nome,status: projeção de campos (sinopse só vem se pedida aqui)
+      - order=id|-id|nome|-nome: ordenação feita no servidor
+      - tag=X / sem_tag=Y: filtros por tag
+      - status=X / conteudo=Y / opiniao=>=Bom: filtros pelos códigos (aceitam aliases)
+      - include_archived=1: inclui as linhas do arquivo (cada linha ganha "arquivado")
+    Sem esses params a resposta continua sendo a lista completa, sem a sinopse.
+    """
+    fields = LINHA_FIELDS_LISTA
+    if request.args.get("fields"):
+        fields = tuple(f.strip() for f in request.args["fields"].split(",") if f.strip())
+        invalidos = [f for f in fields if f not in LINHA_FIELDS]
+        if invalidos:
+            return jsonify({"error": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+        if "id" not in fields:
+            fields = ("id",) + fields
+
+    order = request.args.get("order", "id")
+    if order not in LINHA_ORDERS:
+        return jsonify({"error": f"order deve ser um de: {', '.join(LINHA_ORDERS)}"}), 400
+    cursor_sql, order_sql = LINHA_ORDERS[order]
+
+    paginado = "limit" in request.args or "after" in request.args
+    after = request.args.get("after", type=int)
+    limit = min(500, max(1, request.args.get("limit", 100, type=int)))
+    incluir_arquivadas = request.args.get("include_archived", "").lower() in ("1", "true", "sim")
+
+    columns = [c for c in LINHA_FIELDS if c in fields and c != "needs_details"]
+    if "needs_details" in fields:
+        columns.append("falta_detalhes")
+
+    if not armazenamento.sqlite():
+        # Fora do SQLite só a listagem completa; filtros, cursores e arquivo montam SQL do SQLite
+        extras = [p for p in ("after", "limit", "tag", "sem_tag", "status", "conteudo", "opiniao", "include_archived")
+                  if p in request.args]
+        if extras:
+            return jsonify({"error": f"Parâmetros indisponíveis com LISTIT_BACKEND={armazenamento.BACKEND}: "
+                                     f"{', '.join(extras)}"}), 501
+        conn = get_db_connection()
+        rows = repositorio.listar_linhas(conn, MAIN, lista_id, list(dict.fromkeys(columns + ["nome_norm"])))
+        conn.close()
+        if order.lstrip("-") == "nome":
+            rows.sort(key=lambda row: (row["nome_norm"] or "", row["id"]))
+        if order.startswith("-"):
+            rows.reverse()
+        return jsonify([linha_to_json(row, fields) for row in rows])
+
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, lista_id, nome, tags, conteudo, status, episodio,
-               opiniao, imagem_url, last_highlight, sinopse, sinonimos
+
+    # Filtros opcionais por tag: ?tag=Romance&tag=Beijo&sem_tag=NTR
+    # (tags canônicas viram um único teste de bits sobre tag_mask)
+    com_tags, sem_tags = request.args.getlist("tag"), request.args.getlist("sem_tag")
+    tag_clauses, tag_params = database.tag_filter_sql(
+        com_tags, sem_tags, bits=database.tag_bits(conn) if com_tags or sem_tags else None
+    )
+    clauses = ["lista_id = ?"] + tag_clauses
+    params = [lista_id] + tag_params
+
+    # ?status=Lendo&conteudo=Manga (aceitam aliases) e ?opiniao=>=Bom, comparados pelos códigos
+    for dimensao in ("status", "conteudo"):
+        rotulos = request.args.getlist(dimensao)
+        if rotulos:
+            codigos = [database.codigo(conn, dimensao, r) for r in rotulos]
+            clauses.append(f"{dimensao}_id IN ({', '.join('?' * len(codigos))})")
+            params.extend(codigos)
+    if request.args.get("opiniao"):
+        opiniao_sql, opiniao_params = database.opiniao_filter_sql(request.args["opiniao"])
+        clauses.append(opiniao_sql)
+        params.extend(opiniao_params)
+    if after is not None:
+        clauses.append(cursor_sql)
+        params.extend([after] * cursor_sql.count("?"))
+
+    cte = ""
+    if incluir_arquivadas:
+        # Colunas usadas pelos filtros e cursores também precisam sair do CTE
+        usadas = ("id", "lista_id", "nome_norm", "tag_mask", "status_id", "conteudo_id", "opiniao_id")
+        cte = repositorio.cte_linhas_com_arquivo(conn, list(dict.fromkeys(usadas + tuple(columns))))
+        columns.append("arquivado")
+    elif "sinopse" in columns:
+        columns[columns.index("sinopse")] = f"{database.sinopse_sql()} AS sinopse"
+
+    sql = f"""
+        {cte}
+        SELECT {', '.join(columns)}
           FROM linhas
-         WHERE lista_id = ?
-    """, (lista_id,))
-    linhas = []
-    for row in cursor.fetchall():
-        sinopse = row['sinopse'] or ""
-        sinonimos = json.loads(row['sinonimos']) if row['sinonimos'] else []
-        needs_details = not (sinopse and len(sinonimos) >= 3)
-        linhas.append({
-            "id":            row['id'],
-            "lista_id":      row['lista_id'],
-            "nome":          row['nome'],
-            "tags":          row['tags'],
-            "conteudo":      row['conteudo'],
-            "status":        row['status'],
-            "episodio":      row['episodio'],
-            "opiniao":       row['opiniao'],
-            "imagem_url":    row['imagem_url'],
-            "last_highlight": row['last_highlight'],
-            "sinopse":       sinopse,
-            "sinonimos":     sinonimos,
-            "needs_details": needs_details
-        })
+         WHERE {' AND '.join(clauses)}
+         ORDER BY {order_sql}
+    """
+    if paginado:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    rows = conn.execute(sql, params).fetchall()
     conn.close()
-    return jsonify(linhas)
+    linhas = [linha_to_json(row, fields) for row in rows]
+    if incluir_arquivadas:
+        for linha, row in zip(linhas, rows):
+            linha["arquivado"] = bool(row["arquivado"])
+
+    if not paginado:
+        return jsonify(linhas)
+    next_after = linhas[-1]["id"] if len(linhas) == limit else None
+    return jsonify({"linhas": linhas, "next_after": next_after, "limit": limit})
+
+# Colunas das linhas em memória (NumPy) para o /query; sincroniza sozinho a cada consulta
+indice = indice_colunar.IndiceColunar(database.MAIN_DB)
+
+@app.route("/query", methods=["GET"])
+def query_linhas():
+    """
+    Filtra as linhas do principal no índice colunar em memória.
+    Params (todos opcionais e combináveis):
+      - lista_id=<id> (repetível)
+      - status / sem_status, conteudo / sem_conteudo (repetíveis, aceitam aliases)
+      - opiniao=>=Bom, tag=X / sem_tag=Y (repetíveis), nome=<trecho do nome>
+      - order=id|-id|nome|-nome|opiniao|-opiniao, limit=<n>&offset=<n>
+      - fields=id,nome,...: traz as linhas da página (sem fields só os ids)
+    """
+    fields = None
+    if request.args.get("fields"):
+        fields = tuple(f.strip() for f in request.args["fields"].split(",") if f.strip())
+        invalidos = [f for f in fields if f not in LINHA_FIELDS]
+        if invalidos:
+            return jsonify({"error": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+        if "id" not in fields:
+            fields = ("id",) + fields
+    order = request.args.get("order", "id")
+    if order not in indice_colunar.ORDENS:
+        return jsonify({"error": f"order deve ser um de: {', '.join(indice_colunar.ORDENS)}"}), 400
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = request.args.get("limit", type=int)
+
+    inicio = time.perf_counter()
+    ids = indice.consultar(
+        listas=request.args.getlist("lista_id", type=int),
+        status=request.args.getlist("status"), sem_status=request.args.getlist("sem_status"),
+        conteudo=request.args.getlist("conteudo"), sem_conteudo=request.args.getlist("sem_conteudo"),
+        opiniao=request.args.get("opiniao"),
+        tags=request.args.getlist("tag"), sem_tags=request.args.getlist("sem_tag"),
+        nome=request.args.get("nome"), ordem=order,
+    )
+    tempo_ms = (time.perf_counter() - inicio) * 1000
+    pagina = ids[offset:offset + limit if limit is not None else None].tolist()
+    resposta = {"total": len(ids), "ids": pagina, "offset": offset, "tempo_ms": round(tempo_ms, 3)}
+
+    if fields:
+        columns = [c for c in LINHA_FIELDS if c in fields and c != "needs_details"]
+        if "needs_details" in fields:
+            columns.append("falta_detalhes")
+        if "sinopse" in columns:
+            columns[columns.index("sinopse")] = f"{database.sinopse_sql()} AS sinopse"
+        conn = get_db_connection()
+        rows = conn.execute(f"""
+            SELECT {', '.join(columns)} FROM linhas
+             WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(pagina),)).fetchall()
+        conn.close()
+        por_id = {row["id"]: row for row in rows}
+        resposta["linhas"] = [linha_to_json(por_id[i], fields) for i in pagina if i in por_id]
+    return jsonify(resposta)
+
+@app.route("/query/status", methods=["GET"])
+def query_status():
+    return jsonify(indice.status())
+
+@app.route("/linhas/<int:linha_id>/details", methods=["GET"])
+def get_linha_details(linha_id):
+    """Retorna a linha completa (inclusive sinopse), para as telas de detalhe. Procura também no arquivo."""
+    conn = get_db_connection()
+    colunas = [f for f in LINHA_FIELDS if f != 'needs_details'] + ["falta_detalhes"]
+    if armazenamento.sqlite():
+        row = conn.execute(f"""
+            {repositorio.cte_linhas_com_arquivo(conn, colunas)}
+            SELECT {', '.join(colunas)}, arquivado
+              FROM linhas
+             WHERE id = ?
+        """, (linha_id,)).fetchone()
+    else:
+        # Sem arquivo fora do SQLite
+        row = repositorio.obter_linha(conn, MAIN, linha_id, colunas)
+        if row:
+            row["arquivado"] = 0
+    conn.close()
+    if not row:
+        return jsonify({"error": "Linha não encontrada"}), 404
+    item = linha_to_json(row)
+    item["arquivado"] = bool(row["arquivado"])
+    return jsonify(item)
 
 @app.route("/linhas", methods=["POST"])
 def add_linha():
     data = request.json
-    now = datetime.now(timezone.utc).isoformat()
+    dados = {c: data[c] for c in ("lista_id", "nome", "tags", "conteudo", "status", "episodio", "opiniao")}
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO linhas (lista_id, nome, tags, conteudo, status, episodio, opiniao, last_highlight)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (data["lista_id"], data["nome"], data["tags"], data["conteudo"], data["status"], data["episodio"], data["opiniao"], now))
-    conn.commit()
-    linha_id = cursor.lastrowid
+    with repositorio.transacao(conn):
+        linha_id, now = repositorio.inserir_linha(conn, MAIN, dados)
     conn.close()
-    safe_git_commit(f"Adicionando Linha: {data['nome']} id: {linha_id}")
+    sincronia_git.registrar(f"Adicionando Linha: {data['nome']} id: {linha_id}")
     return jsonify({"id": linha_id, "lista_id": data["lista_id"], "nome": data["nome"], "last_highlight": now})
 
 @app.route("/linhas/<int:linha_id>", methods=["PUT"])
@@ -1380,9 +1352,7 @@ def update_linha(linha_id):
     if isinstance(tags, (list, tuple)):
         tags = ", ".join(str(x).strip() for x in tags if x is not None)
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome, conteudo, status, episodio, opiniao, tags FROM linhas WHERE id = ?", (linha_id,))
-    existing = cursor.fetchone()
+    existing = repositorio.obter_linha(conn, MAIN, linha_id, ("nome", "conteudo", "status", "episodio", "opiniao", "tags"))
     if not existing:
         conn.close()
         return jsonify({"error": "Linha não encontrada"}), 404
@@ -1402,29 +1372,79 @@ def update_linha(linha_id):
         conn.close()
         return jsonify({"error": "Campos obrigatórios faltando"}), 400
     try:
-        cursor.execute("""
-            UPDATE linhas
-            SET nome = ?, conteudo = ?, status = ?, episodio = ?, opiniao = ?, tags = ?
-            WHERE id = ?
-        """, (nome, conteudo, status, episodio, opiniao, tags, linha_id))
-        conn.commit()
-        safe_git_commit(f"Atualizando Linha: {nome} id: {linha_id}")
+        with repositorio.transacao(conn):
+            repositorio.atualizar_linha(conn, MAIN, linha_id, {
+                "nome": nome, "conteudo": conteudo, "status": status,
+                "episodio": episodio, "opiniao": opiniao, "tags": tags
+            })
+        sincronia_git.registrar(f"Atualizando Linha: {nome} id: {linha_id}")
         conn.close()
         return jsonify({"message": "Linha atualizada com sucesso!"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/linhas/<int:linha_id>", methods=["PATCH"])
+def patch_linha(linha_id):
+    """
+    Atualiza só os campos enviados. Com "version" no body (ou If-Match) a escrita só
+    acontece se a linha ainda estiver nessa versão; senão 409 com a versão atual.
+    """
+    data = request.get_json() or {}
+    versao = data.pop("version", None)
+    if versao is None and request.headers.get("If-Match"):
+        versao = request.headers["If-Match"].strip('W/"')
+    campos = {k: v for k, v in data.items() if k in repositorio.COLUNAS_EDITAVEIS}
+    if not campos:
+        return jsonify({"error": "Nenhum campo para atualizar"}), 400
+    for obrigatorio in ("nome", "conteudo", "status"):
+        if obrigatorio in campos and not campos[obrigatorio]:
+            return jsonify({"error": f"Campo '{obrigatorio}' não pode ficar vazio"}), 400
+    try:
+        versao = int(versao) if versao is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "version deve ser um número"}), 400
+
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            repositorio.atualizar_linha(conn, MAIN, linha_id, campos, versao=versao)
+            nova_versao = repositorio.versao_linha(conn, MAIN, linha_id)
+            nome = repositorio.nome_linha(conn, MAIN, linha_id)
+    except repositorio.NaoEncontrado:
+        return jsonify({"error": "Linha não encontrada"}), 404
+    except repositorio.ConflitoDeVersao as e:
+        return jsonify({"error": str(e), "version": e.versao_atual}), 409
+    finally:
+        conn.close()
+    sincronia_git.registrar(f"Atualizando Linha: {nome} id: {linha_id} ({', '.join(campos)})")
+    return jsonify({"message": "Linha atualizada com sucesso!", "version": nova_versao})
+
+@app.route("/linhas/<int:linha_id>/progress", methods=["POST"])
+def progress_linha(linha_id):
+    """Incrementa/decrementa o episódio atomicamente. Body opcional: {"delta": 1} (negativo para voltar)."""
+    data = request.get_json(silent=True) or {}
+    delta = data.get("delta", 1)
+    # Só inteiros, como o ep+/ep- da CLI: episodio é uma contagem (6.5 não existe)
+    if isinstance(delta, bool) or not isinstance(delta, int):
+        return jsonify({"error": "delta deve ser um número inteiro"}), 400
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            linha = repositorio.avancar_progresso(conn, MAIN, linha_id, delta)
+    except repositorio.NaoEncontrado:
+        return jsonify({"error": "Linha não encontrada"}), 404
+    finally:
+        conn.close()
+    sincronia_git.registrar(f"Progresso da Linha: {linha['nome']} id: {linha_id} -> {linha['episodio']}")
+    return jsonify(linha)
+
 @app.route("/linhas/<int:linha_id>", methods=["DELETE"])
 def delete_linha(linha_id):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nome FROM linhas WHERE id = ?", (linha_id,))
-    row = cursor.fetchone()
-    nome = row['nome'] if row else 'Desconhecido'
-    cursor.execute("DELETE FROM linhas WHERE id = ?", (linha_id,))
-    conn.commit()
+    with repositorio.transacao(conn):
+        nome = repositorio.remover_linha(conn, MAIN, linha_id) or 'Desconhecido'
     conn.close()
-    safe_git_commit(f"Removendo Linha: {nome} id: {linha_id}")
+    sincronia_git.registrar(f"Removendo Linha: {nome} id: {linha_id}")
     return jsonify({"message": "Linha excluída com sucesso!"})
 
 @app.route('/to_highlight/<int:lista_id>')
@@ -1433,12 +1453,12 @@ def to_highlight(lista_id):
     cursor = conn.cursor()
     cutoff = (datetime.now(timezone.utc) - timedelta(days=15)).isoformat()
     cursor.execute("""
-        SELECT id, nome, imagem_url, tags, conteudo, status, episodio, opiniao, sinopse, sinonimos, last_highlight
+        SELECT id, nome, imagem_url, tags, conteudo, status, episodio, opiniao, sinonimos, last_highlight
         FROM linhas
         WHERE lista_id = ?
-        AND (
-            (conteudo = 'Anime' AND status LIKE '%vendo%') OR
-            (conteudo IN ('Manga', 'Webtoon', 'Manhwa') AND status LIKE '%lendo%')
+        AND (conteudo_id, status_id) IN (
+            -- Vendo para anime, Lendo para mangá/manhwa/webtoon (status_codigos.midia)
+            SELECT c.id, s.id FROM conteudo_codigos c JOIN status_codigos s ON s.midia = c.midia
         )
         AND (last_highlight IS NULL OR last_highlight <= ?)
     """, (lista_id, cutoff))
@@ -1456,7 +1476,7 @@ def mark_highlighted(linha_id):
     nome = cursor.fetchone()[0]
     conn.commit()
     conn.close()
-    safe_git_commit(f"Marcando highlight na Linha: {nome} id: {linha_id}")
+    sincronia_git.registrar(f"Marcando highlight na Linha: {nome} id: {linha_id}")
     return jsonify({'mensagem': 'Highlight atualizado.'})
 
 # ============================================================
@@ -1470,7 +1490,7 @@ def criar_sequencia():
     descricao = data.get('descricao', '')
     if not nome:
         return jsonify({"erro": "Nome da sequência é obrigatório"}), 400
-    with sqlite3.connect("list_it.db") as conn:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO sequencias (nome, descricao) VALUES (?, ?)",
@@ -1478,7 +1498,7 @@ def criar_sequencia():
         )
         sequencia_id = cursor.lastrowid
         conn.commit()
-        safe_git_commit(f"Criando Sequência: {nome} id: {sequencia_id}")
+        sincronia_git.registrar(f"Criando Sequência: {nome} id: {sequencia_id}")
     return jsonify({
         "id": sequencia_id,
         "nome": nome,
@@ -1492,7 +1512,7 @@ def adicionar_item_sequencia(sequencia_id):
     linha_id = data.get('linha_id')
     if not linha_id:
         return jsonify({"erro": "linha_id é obrigatório"}), 400
-    with sqlite3.connect("list_it.db") as conn:
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT nome FROM sequencias WHERE id = ?", (sequencia_id,))
         seq = cursor.fetchone()
@@ -1510,18 +1530,13 @@ def adicionar_item_sequencia(sequencia_id):
         """, (sequencia_id, linha_id))
         if cursor.fetchone():
             return jsonify({"erro": "Item já está nesta sequência"}), 400
-        cursor.execute("""
-            SELECT COALESCE(MAX(ordem), 0) FROM sequencia_itens 
-            WHERE sequencia_id = ?
-        """, (sequencia_id,))
-        max_ordem = cursor.fetchone()[0]
-        nova_ordem = max_ordem + 1
+        (nova_ordem,) = database.chaves_de_ordem(conn, sequencia_id, 1, data.get('posicao'))
         cursor.execute("""
             INSERT INTO sequencia_itens (sequencia_id, linha_id, ordem) 
             VALUES (?, ?, ?)
         """, (sequencia_id, linha_id, nova_ordem))
         conn.commit()
-        safe_git_commit(f"Adicionando {item_nome} à sequência {seq_nome} na ordem {nova_ordem}")
+        sincronia_git.registrar(f"Adicionando {item_nome} à sequência {seq_nome} na ordem {nova_ordem}")
     return jsonify({
         "mensagem": "Item adicionado à sequência com sucesso",
         "sequencia_id": sequencia_id,
@@ -1532,7 +1547,7 @@ def adicionar_item_sequencia(sequencia_id):
 @app.route('/sequencias', methods=['GET'])
 def listar_sequencias():
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1540,7 +1555,7 @@ def listar_sequencias():
                 FROM sequencias s
                 LEFT JOIN sequencia_itens si ON s.id = si.sequencia_id
                 GROUP BY s.id, s.nome, s.descricao
-                ORDER BY s.nome
+                ORDER BY s.nome COLLATE PT_BR
             """)
             sequencias = [dict(row) for row in cursor.fetchall()]
         return jsonify(sequencias)
@@ -1550,7 +1565,7 @@ def listar_sequencias():
 @app.route('/sequencias/<int:sequencia_id>', methods=['GET'])
 def obter_sequencia(sequencia_id):
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("""
@@ -1562,13 +1577,13 @@ def obter_sequencia(sequencia_id):
                 return jsonify({"erro": "Sequência não encontrada"}), 404
             cursor.execute("""
                 SELECT l.id, l.nome, l.imagem_url, l.conteudo, l.status, 
-                    l.episodio, l.tags, l.opiniao, l.sinopse, l.sinonimos, si.ordem 
+                    l.episodio, l.tags, l.opiniao, l.sinonimos, si.ordem 
                 FROM linhas l
                 JOIN sequencia_itens si ON l.id = si.linha_id
                 WHERE si.sequencia_id = ?
                 ORDER BY si.ordem
             """, (sequencia_id,))
-            itens = [dict(row) for row in cursor.fetchall()]
+            itens = [dict(row, posicao=posicao) for posicao, row in enumerate(cursor.fetchall(), start=1)]
         return jsonify({
             "sequencia": dict(sequencia),
             "itens": itens,
@@ -1581,7 +1596,7 @@ def obter_sequencia(sequencia_id):
 @app.route('/sequencias/<int:sequencia_id>/itens/<int:linha_id>', methods=['DELETE'])
 def remover_item_sequencia(sequencia_id, linha_id):
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT 1 FROM sequencia_itens 
@@ -1598,7 +1613,7 @@ def remover_item_sequencia(sequencia_id, linha_id):
                 WHERE sequencia_id = ? AND linha_id = ?
             """, (sequencia_id, linha_id))
             conn.commit()
-            safe_git_commit(f"Removendo {item_nome} da sequência {seq_nome}")
+            sincronia_git.registrar(f"Removendo {item_nome} da sequência {seq_nome}")
         return jsonify({
             "mensagem": "Item removido da sequência com sucesso",
             "sequencia_id": sequencia_id,
@@ -1613,7 +1628,7 @@ def atualizar_ordem_sequencia(sequencia_id):
     if not isinstance(data, list):
         return jsonify({"erro": "Dados devem ser uma lista de itens"}), 400
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM sequencias WHERE id = ?", (sequencia_id,))
             if not cursor.fetchone():
@@ -1636,7 +1651,7 @@ def atualizar_ordem_sequencia(sequencia_id):
             conn.commit()
             cursor.execute("SELECT nome FROM sequencias WHERE id = ?", (sequencia_id,))
             seq_nome = cursor.fetchone()[0]
-            safe_git_commit(f"Atualizando ordem na sequência {seq_nome}")
+            sincronia_git.registrar(f"Atualizando ordem na sequência {seq_nome}")
         return jsonify({
             "mensagem": "Ordem da sequência atualizada com sucesso",
             "total_itens_atualizados": len(data)
@@ -1644,10 +1659,132 @@ def atualizar_ordem_sequencia(sequencia_id):
     except sqlite3.Error as e:
         return jsonify({"erro": f"Erro ao atualizar ordem: {str(e)}"}), 500
 
+def _ids_validos(cursor, tabela, ids):
+    """Filtra, numa consulta só, os ids que existem na tabela."""
+    cursor.execute(f"SELECT id FROM {tabela} WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+    return {row[0] for row in cursor.fetchall()}
+
+@app.route('/sequencias/<int:sequencia_id>/itens/lote', methods=['POST'])
+def adicionar_itens_sequencia(sequencia_id):
+    """
+    Adiciona vários itens de uma vez.
+    Payload: { linha_ids: [...], posicao: n (opcional, 1-based; padrão = fim) }
+    """
+    data = request.get_json() or {}
+    linha_ids = data.get('linha_ids') or []
+    posicao = data.get('posicao')
+    if not isinstance(linha_ids, list) or not linha_ids:
+        return jsonify({"erro": "linha_ids deve ser uma lista não vazia"}), 400
+    try:
+        linha_ids = list(dict.fromkeys(int(i) for i in linha_ids))
+        posicao = int(posicao) if posicao is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"erro": "linha_ids e posicao devem ser números"}), 400
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT nome FROM sequencias WHERE id = ?", (sequencia_id,))
+        seq = cursor.fetchone()
+        if not seq:
+            conn.rollback()
+            return jsonify({"erro": "Sequência não encontrada"}), 404
+        existentes = _ids_validos(cursor, "linhas", linha_ids)
+        cursor.execute("SELECT linha_id FROM sequencia_itens WHERE sequencia_id = ?", (sequencia_id,))
+        ja_na_sequencia = {row[0] for row in cursor.fetchall()}
+        novos = [i for i in linha_ids if i in existentes and i not in ja_na_sequencia]
+        erros = [f"Item {i} não encontrado" for i in linha_ids if i not in existentes]
+        erros += [f"Item {i} já está nesta sequência" for i in linha_ids if i in ja_na_sequencia]
+        if novos:
+            chaves = database.chaves_de_ordem(conn, sequencia_id, len(novos), posicao)
+            cursor.executemany(
+                "INSERT INTO sequencia_itens (sequencia_id, linha_id, ordem) VALUES (?, ?, ?)",
+                [(sequencia_id, linha_id, ordem) for linha_id, ordem in zip(novos, chaves)]
+            )
+        conn.commit()
+        if novos:
+            sincronia_git.registrar(f"Adicionando {len(novos)} itens à sequência {seq[0]}")
+    return jsonify({
+        "mensagem": f"{len(novos)} itens adicionados à sequência",
+        "sequencia_id": sequencia_id,
+        "adicionados": novos,
+        "erros": erros
+    }), 201
+
+@app.route('/sequencias/<int:sequencia_id>/itens', methods=['DELETE'])
+def remover_itens_sequencia(sequencia_id):
+    """Remove vários itens de uma vez. Payload: { linha_ids: [...] }"""
+    data = request.get_json(silent=True) or {}
+    linha_ids = data.get('linha_ids') or []
+    if not isinstance(linha_ids, list) or not linha_ids:
+        return jsonify({"erro": "linha_ids deve ser uma lista não vazia"}), 400
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT nome FROM sequencias WHERE id = ?", (sequencia_id,))
+        seq = cursor.fetchone()
+        if not seq:
+            conn.rollback()
+            return jsonify({"erro": "Sequência não encontrada"}), 404
+        cursor.execute("""
+            DELETE FROM sequencia_itens
+             WHERE sequencia_id = ? AND linha_id IN (SELECT value FROM json_each(?))
+        """, (sequencia_id, json.dumps(linha_ids)))
+        removidos = cursor.rowcount
+        conn.commit()
+        if removidos:
+            sincronia_git.registrar(f"Removendo {removidos} itens da sequência {seq[0]}")
+    return jsonify({
+        "mensagem": f"{removidos} itens removidos da sequência",
+        "sequencia_id": sequencia_id,
+        "removidos": removidos
+    })
+
+@app.route('/sequencias/<int:sequencia_id>/itens/<int:linha_id>/posicao', methods=['PUT'])
+def mover_item_sequencia(sequencia_id, linha_id):
+    """
+    Move um item para a posição (1-based) informada.
+    Só a linha movida é reescrita, a não ser que a sequência precise ser rebalanceada.
+    """
+    data = request.get_json() or {}
+    try:
+        posicao = int(data.get('posicao'))
+    except (TypeError, ValueError):
+        return jsonify({"erro": "posicao é obrigatória e deve ser um número"}), 400
+    if posicao < 1:
+        return jsonify({"erro": "posicao deve ser >= 1"}), 400
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            SELECT s.nome, l.nome FROM sequencia_itens si
+              JOIN sequencias s ON s.id = si.sequencia_id
+              JOIN linhas l ON l.id = si.linha_id
+             WHERE si.sequencia_id = ? AND si.linha_id = ?
+        """, (sequencia_id, linha_id))
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            return jsonify({"erro": "Item não encontrado na sequência"}), 404
+        seq_nome, item_nome = row
+        (ordem,) = database.chaves_de_ordem(conn, sequencia_id, 1, posicao, ignorar=linha_id)
+        cursor.execute("""
+            UPDATE sequencia_itens SET ordem = ?
+             WHERE sequencia_id = ? AND linha_id = ?
+        """, (ordem, sequencia_id, linha_id))
+        conn.commit()
+        sincronia_git.registrar(f"Movendo {item_nome} para a posição {posicao} da sequência {seq_nome}")
+    return jsonify({
+        "mensagem": "Item reposicionado com sucesso",
+        "sequencia_id": sequencia_id,
+        "linha_id": linha_id,
+        "posicao": posicao,
+        "ordem": ordem
+    })
+
 @app.route('/sequencias/<int:sequencia_id>', methods=['DELETE'])
 def deletar_sequencia(sequencia_id):
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT nome FROM sequencias WHERE id = ?", (sequencia_id,))
             seq_nome = cursor.fetchone()
@@ -1656,7 +1793,7 @@ def deletar_sequencia(sequencia_id):
             seq_nome = seq_nome[0]
             cursor.execute("DELETE FROM sequencias WHERE id = ?", (sequencia_id,))
             conn.commit()
-            safe_git_commit(f"Removendo sequência {seq_nome}")
+            sincronia_git.registrar(f"Removendo sequência {seq_nome}")
         return jsonify({
             "mensagem": "Sequência deletada com sucesso",
             "sequencia_id": sequencia_id,
@@ -1668,7 +1805,7 @@ def deletar_sequencia(sequencia_id):
 @app.route('/linhas/<int:linha_id>/sequencias', methods=['GET'])
 def obter_sequencias_do_item(linha_id):
     try:
-        with sqlite3.connect("list_it.db") as conn:
+        with get_db_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT nome FROM linhas WHERE id = ?", (linha_id,))
@@ -1680,7 +1817,7 @@ def obter_sequencias_do_item(linha_id):
                 FROM sequencias s
                 JOIN sequencia_itens si ON s.id = si.sequencia_id
                 WHERE si.linha_id = ?
-                ORDER BY s.nome
+                ORDER BY s.nome COLLATE PT_BR
             """, (linha_id,))
             sequencias = [dict(row) for row in cursor.fetchall()]
             item_nome = item['nome']
@@ -1693,8 +1830,441 @@ def obter_sequencias_do_item(linha_id):
     except sqlite3.Error as e:
         return jsonify({"erro": f"Erro ao buscar sequências: {str(e)}"}), 500
 
+# ============================================================
+# LOTE DE ESCRITAS (/batch)
+# ============================================================
+
+BATCH_MAX_OPERACOES = 1000
+
+class BatchError(Exception):
+    """Falha de validação de uma operação do lote (desfaz o lote inteiro)."""
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+def _batch_exigir(dados, *campos):
+    faltando = [c for c in campos if dados.get(c) in (None, "")]
+    if faltando:
+        raise BatchError(f"Campos obrigatórios faltando: {', '.join(faltando)}")
+
+def _batch_nome(cursor, tabela, item_id):
+    cursor.execute(f"SELECT nome FROM {tabela} WHERE id = ?", (item_id,))
+    row = cursor.fetchone()
+    if not row:
+        raise BatchError(f"{tabela} id {item_id} não encontrado", 404)
+    return row[0]
+
+def _batch_linha_create(cursor, dados, _id):
+    _batch_exigir(dados, "lista_id", "nome", "conteudo", "status", "opiniao")
+    _batch_nome(cursor, "listas", dados["lista_id"])
+    tags = dados.get("tags") or ""
+    cursor.execute("""
+        INSERT INTO linhas (lista_id, nome, tags, conteudo, status, episodio, opiniao,
+                            imagem_url, sinopse, sinonimos, last_highlight)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (dados["lista_id"], dados["nome"], tags, dados["conteudo"], dados["status"],
+          dados.get("episodio"), dados.get("opiniao"), dados.get("imagem_url"),
+          dados.get("sinopse"), json.dumps(dados.get("sinonimos") or [], ensure_ascii=False),
+          datetime.now(timezone.utc).isoformat()))
+    linha_id = cursor.lastrowid
+    database.sync_linha_tags(cursor.connection, linha_id, tags)
+    return linha_id, f"Adicionando Linha: {dados['nome']} id: {linha_id}"
+
+BATCH_LINHA_CAMPOS = ("lista_id", "nome", "tags", "conteudo", "status", "episodio", "opiniao",
+                      "imagem_url", "sinopse", "sinonimos", "last_highlight")
+
+def _batch_linha_update(cursor, dados, linha_id):
+    nome = _batch_nome(cursor, "linhas", linha_id)
+    dados = {k: v for k, v in dados.items() if k in BATCH_LINHA_CAMPOS}
+    if not dados:
+        raise BatchError("Nenhum campo para atualizar")
+    for campo in ("lista_id", "nome", "conteudo", "status"):
+        if campo in dados and not dados[campo]:
+            raise BatchError(f"Campo '{campo}' não pode ficar vazio")
+    if "lista_id" in dados:
+        _batch_nome(cursor, "listas", dados["lista_id"])
+    if isinstance(dados.get("tags"), (list, tuple)):
+        dados["tags"] = ", ".join(str(x).strip() for x in dados["tags"] if x is not None)
+    if "sinonimos" in dados:
+        dados["sinonimos"] = json.dumps(dados["sinonimos"] or [], ensure_ascii=False)
+    if dados.get("last_highlight") is True:
+        dados["last_highlight"] = datetime.now(timezone.utc).isoformat()
+    sets = ", ".join(f"{campo} = ?" for campo in dados)
+    cursor.execute(f"UPDATE linhas SET {sets} WHERE id = ?", list(dados.values()) + [linha_id])
+    if "tags" in dados:
+        database.sync_linha_tags(cursor.connection, linha_id, dados["tags"])
+    return linha_id, f"Atualizando Linha: {dados.get('nome', nome)} id: {linha_id}"
+
+def _batch_linha_delete(cursor, dados, linha_id):
+    nome = _batch_nome(cursor, "linhas", linha_id)
+    cursor.execute("DELETE FROM sequencia_itens WHERE linha_id = ?", (linha_id,))
+    cursor.execute("DELETE FROM linhas WHERE id = ?", (linha_id,))
+    return linha_id, f"Removendo Linha: {nome} id: {linha_id}"
+
+def _batch_lista_create(cursor, dados, _id):
+    _batch_exigir(dados, "nome")
+    cursor.execute("INSERT INTO listas (nome) VALUES (?)", (dados["nome"],))
+    return cursor.lastrowid, f"Criando Lista: {dados['nome']} id: {cursor.lastrowid}"
+
+def _batch_lista_update(cursor, dados, lista_id):
+    _batch_exigir(dados, "nome")
+    _batch_nome(cursor, "listas", lista_id)
+    cursor.execute("UPDATE listas SET nome = ? WHERE id = ?", (dados["nome"], lista_id))
+    return lista_id, f"Renomeando Lista: {dados['nome']} id: {lista_id}"
+
+def _batch_lista_delete(cursor, dados, lista_id):
+    nome = _batch_nome(cursor, "listas", lista_id)
+    cursor.execute("""
+        DELETE FROM sequencia_itens
+         WHERE linha_id IN (SELECT id FROM linhas WHERE lista_id = ?)
+    """, (lista_id,))
+    cursor.execute("DELETE FROM linhas WHERE lista_id = ?", (lista_id,))
+    cursor.execute("DELETE FROM listas WHERE id = ?", (lista_id,))
+    return lista_id, f"Removendo Lista: {nome} id: {lista_id}"
+
+def _batch_sequencia_create(cursor, dados, _id):
+    _batch_exigir(dados, "nome")
+    cursor.execute("INSERT INTO sequencias (nome, descricao) VALUES (?, ?)",
+                   (dados["nome"], dados.get("descricao", "")))
+    return cursor.lastrowid, f"Criando Sequência: {dados['nome']} id: {cursor.lastrowid}"
+
+def _batch_sequencia_update(cursor, dados, sequencia_id):
+    _batch_nome(cursor, "sequencias", sequencia_id)
+    campos = {k: dados[k] for k in ("nome", "descricao") if k in dados}
+    if not campos or campos.get("nome") == "":
+        raise BatchError("Informe nome e/ou descricao")
+    sets = ", ".join(f"{campo} = ?" for campo in campos)
+    cursor.execute(f"UPDATE sequencias SET {sets} WHERE id = ?", list(campos.values()) + [sequencia_id])
+    return sequencia_id, f"Atualizando Sequência id: {sequencia_id}"
+
+def _batch_sequencia_delete(cursor, dados, sequencia_id):
+    nome = _batch_nome(cursor, "sequencias", sequencia_id)
+    cursor.execute("DELETE FROM sequencia_itens WHERE sequencia_id = ?", (sequencia_id,))
+    cursor.execute("DELETE FROM sequencias WHERE id = ?", (sequencia_id,))
+    return sequencia_id, f"Removendo sequência {nome}"
+
+def _batch_sequencia_item_create(cursor, dados, _id):
+    _batch_exigir(dados, "sequencia_id", "linha_id")
+    seq_nome = _batch_nome(cursor, "sequencias", dados["sequencia_id"])
+    item_nome = _batch_nome(cursor, "linhas", dados["linha_id"])
+    ordem = dados.get("ordem")
+    if ordem is None:
+        (ordem,) = database.chaves_de_ordem(cursor.connection, dados["sequencia_id"], 1, dados.get("posicao"))
+    try:
+        cursor.execute("INSERT INTO sequencia_itens (sequencia_id, linha_id, ordem) VALUES (?, ?, ?)",
+                       (dados["sequencia_id"], dados["linha_id"], ordem))
+    except sqlite3.IntegrityError:
+        raise BatchError("Item já está nesta sequência")
+    return dados["linha_id"], f"Adicionando {item_nome} à sequência {seq_nome} na ordem {ordem}"
+
+def _batch_sequencia_item_update(cursor, dados, _id):
+    _batch_exigir(dados, "sequencia_id", "linha_id", "ordem")
+    cursor.execute("UPDATE sequencia_itens SET ordem = ? WHERE sequencia_id = ? AND linha_id = ?",
+                   (dados["ordem"], dados["sequencia_id"], dados["linha_id"]))
+    if cursor.rowcount == 0:
+        raise BatchError(f"Item {dados['linha_id']} não encontrado na sequência", 404)
+    return dados["linha_id"], f"Atualizando ordem na sequência id: {dados['sequencia_id']}"
+
+def _batch_sequencia_item_delete(cursor, dados, _id):
+    _batch_exigir(dados, "sequencia_id", "linha_id")
+    cursor.execute("DELETE FROM sequencia_itens WHERE sequencia_id = ? AND linha_id = ?",
+                   (dados["sequencia_id"], dados["linha_id"]))
+    if cursor.rowcount == 0:
+        raise BatchError(f"Item {dados['linha_id']} não encontrado na sequência", 404)
+    return dados["linha_id"], f"Removendo item {dados['linha_id']} da sequência id: {dados['sequencia_id']}"
+
+# (op, tipo) -> handler(cursor, dados, id) -> (id, descrição para o commit)
+BATCH_HANDLERS = {
+    ("create", "linha"): _batch_linha_create,
+    ("update", "linha"): _batch_linha_update,
+    ("delete", "linha"): _batch_linha_delete,
+    ("create", "lista"): _batch_lista_create,
+    ("update", "lista"): _batch_lista_update,
+    ("delete", "lista"): _batch_lista_delete,
+    ("create", "sequencia"): _batch_sequencia_create,
+    ("update", "sequencia"): _batch_sequencia_update,
+    ("delete", "sequencia"): _batch_sequencia_delete,
+    ("create", "sequencia_item"): _batch_sequencia_item_create,
+    ("update", "sequencia_item"): _batch_sequencia_item_update,
+    ("delete", "sequencia_item"): _batch_sequencia_item_delete,
+}
+
+def _batch_resolver_refs(valor, ids_criados):
+    """Troca referências "$N" pelo id gerado pela operação N do mesmo lote."""
+    if isinstance(valor, str) and valor.startswith("$") and valor[1:].isdigit():
+        indice = int(valor[1:])
+        if indice >= len(ids_criados):
+            raise BatchError(f"Referência {valor} aponta para uma operação posterior")
+        return ids_criados[indice]
+    return valor
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """
+    Executa um lote ordenado de escritas numa única transação (tudo ou nada)
+    e gera um único commit no git.
+
+    Corpo: {"operacoes": [{"op": "create|update|delete",
+                           "tipo": "linha|lista|sequencia|sequencia_item",
+                           "id": 12, "dados": {...}}, ...],
+            "mensagem": "opcional"}
+    Valores "$N" em id/dados referenciam o id criado pela operação N.
+    """
+    data = request.get_json(silent=True)
+    operacoes = data.get("operacoes") if isinstance(data, dict) else data
+    if not isinstance(operacoes, list) or not operacoes:
+        return jsonify({"error": "Envie 'operacoes' como uma lista não vazia"}), 400
+    if len(operacoes) > BATCH_MAX_OPERACOES:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_OPERACOES} operações por lote"}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    ids_criados = []
+    descricoes = []
+    indice = 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for indice, operacao in enumerate(operacoes):
+            if not isinstance(operacao, dict):
+                raise BatchError("Operação deve ser um objeto")
+            handler = BATCH_HANDLERS.get((operacao.get("op"), operacao.get("tipo")))
+            if not handler:
+                raise BatchError(f"Operação desconhecida: {operacao.get('op')} {operacao.get('tipo')}")
+            dados = operacao.get("dados") or {}
+            if not isinstance(dados, dict):
+                raise BatchError("Campo 'dados' deve ser um objeto")
+            dados = {k: _batch_resolver_refs(v, ids_criados) for k, v in dados.items()}
+            item_id = _batch_resolver_refs(operacao.get("id"), ids_criados)
+            if operacao["op"] != "create" and operacao["tipo"] != "sequencia_item" and item_id is None:
+                raise BatchError("Campo 'id' é obrigatório")
+            item_id, descricao = handler(cursor, dados, item_id)
+            ids_criados.append(item_id)
+            descricoes.append(descricao)
+        conn.commit()
+    except BatchError as e:
+        conn.rollback()
+        return jsonify({"error": str(e), "indice": indice}), e.status
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        return jsonify({"error": str(e), "indice": indice}), 400
+    except sqlite3.Error as e:
+        conn.rollback()
+        print_error(f"[BATCH] Erro na operação {indice}: {e}")
+        return jsonify({"error": str(e), "indice": indice}), 500
+    finally:
+        conn.close()
+
+    titulo = (data.get("mensagem") if isinstance(data, dict) else None) or f"Lote: {len(descricoes)} operações"
+    corpo = "\n".join(descricoes[:50])
+    if len(descricoes) > 50:
+        corpo += f"\n... e mais {len(descricoes) - 50}"
+    sincronia_git.registrar(f"{titulo}\n\n{corpo}")
+    print_success(f"Lote aplicado: {len(descricoes)} operações")
+    return jsonify({
+        "mensagem": "Lote aplicado com sucesso",
+        "total": len(descricoes),
+        "resultados": [
+            {"indice": i, "op": op["op"], "tipo": op["tipo"], "id": ids_criados[i]}
+            for i, op in enumerate(operacoes)
+        ]
+    })
+
+# ============================================================
+# ARQUIVO (linhas terminadas e antigas em arquivo.db)
+# ============================================================
+
+@app.route("/arquivo", methods=["GET"])
+def resumo_arquivo():
+    conn = get_db_connection()
+    resumo = repositorio.resumo_arquivo(conn)
+    conn.close()
+    return jsonify({"listas": resumo, "total": sum(r["linhas"] for r in resumo)})
+
+@app.route("/arquivo/arquivar", methods=["POST"])
+def arquivar():
+    """
+    Body (opcional): {meses, status: [...], dry_run}. Move para o arquivo as linhas com
+    status terminado e sem edição há `meses` meses. dry_run só lista as candidatas.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        meses = int(data.get("meses", repositorio.ARQUIVO_MESES))
+    except (TypeError, ValueError):
+        return jsonify({"error": "meses deve ser um número inteiro"}), 400
+    status = data.get("status") or repositorio.STATUS_ARQUIVAVEIS
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            candidatas = repositorio.candidatas_ao_arquivo(conn, meses, status)
+            if not data.get("dry_run"):
+                repositorio.arquivar_linhas(conn, [c["id"] for c in candidatas])
+    finally:
+        conn.close()
+    if data.get("dry_run"):
+        return jsonify({"candidatas": candidatas, "total": len(candidatas)})
+    if candidatas:
+        sincronia_git.registrar(f"Arquivando {len(candidatas)} linhas (sem edição há {meses} meses)")
+        print_success(f"{len(candidatas)} linhas arquivadas")
+    return jsonify({"mensagem": f"{len(candidatas)} linhas arquivadas.", "arquivadas": candidatas})
+
+@app.route("/arquivo/desarquivar", methods=["POST"])
+def desarquivar():
+    """Body: {ids: [...]}. Devolve as linhas ao principal com o mesmo id."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids") or []
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return jsonify({"error": "ids deve ser uma lista de inteiros"}), 400
+    conn = get_db_connection()
+    try:
+        with repositorio.transacao(conn):
+            devolvidos = repositorio.desarquivar_linhas(conn, ids)
+    finally:
+        conn.close()
+    if devolvidos:
+        sincronia_git.registrar(f"Desarquivando {len(devolvidos)} linhas: {', '.join(map(str, devolvidos))}")
+    nao_encontrados = [i for i in ids if i not in devolvidos]
+    return jsonify({"devolvidos": devolvidos, "nao_encontrados": nao_encontrados})
+
+# ============================================================
+# SNAPSHOTS (cópias de segurança locais)
+# ============================================================
+
+@app.route("/snapshots", methods=["GET"])
+def listar_snapshots():
+    return jsonify({"snapshots": snapshots.listar_snapshots(), "status": snapshots.status()})
+
+@app.route("/snapshots", methods=["POST"])
+def criar_snapshot():
+    try:
+        criados = snapshots.snapshot_de_todos("manual")
+    except snapshots.SnapshotError as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"mensagem": "Snapshot criado.", "arquivos": criados})
+
+@app.route("/snapshots/restore", methods=["POST"])
+def restaurar_snapshot():
+    """Body: {arquivo, confirm: true}. Guarda um snapshot do estado atual antes de restaurar."""
+    data = request.get_json() or {}
+    if not data.get("confirm"):
+        return jsonify({"error": "Envie confirm: true para restaurar"}), 400
+    try:
+        banco, seguranca = snapshots.restaurar_snapshot(data.get("arquivo"))
+    except snapshots.SnapshotError as e:
+        return jsonify({"error": str(e)}), 400
+    cache.clear()
+    indice.invalidar()
+    if banco in (database.MAIN_DB, database.ARQUIVO_DB):
+        sincronia_git.registrar(f"Restaurando snapshot {data.get('arquivo')}")
+    print_success(f"Snapshot {data.get('arquivo')} restaurado em {banco}")
+    return jsonify({"mensagem": f"{banco} restaurado.", "banco": banco, "snapshot_anterior": seguranca})
+
+# ============================================================
+# SINCRONIA COM O GIT (commits agrupados em segundo plano)
+# ============================================================
+
+@app.route("/sync", methods=["GET"])
+def status_sincronia():
+    return jsonify(sincronia_git.status())
+
+@app.route("/sync", methods=["POST"])
+def sincronizar_agora():
+    """Commita o que estiver pendente e faz push sem esperar o agrupamento nem o backoff."""
+    sincronia_git.sincronizar_agora()
+    return jsonify({"mensagem": "Sincronia agendada.", "status": sincronia_git.status()}), 202
+
+# ============================================================
+# CHANGESETS (troca de registros editados entre máquinas)
+# ============================================================
+
+@app.route("/changeset", methods=["GET"])
+def exportar_changeset():
+    """?desde=<cursor> devolvido por um export anterior (padrão 0: tudo o que já foi editado)."""
+    try:
+        desde = int(request.args.get("desde", 0))
+    except ValueError:
+        return jsonify({"error": "desde deve ser um número (o cursor de um export anterior)"}), 400
+    conn = get_db_connection()
+    return jsonify(alteracoes.exportar(conn, desde))
+
+@app.route("/changeset", methods=["POST"])
+def aplicar_changeset():
+    """Body: changeset de GET /changeset de outra máquina. Junta campo a campo (vence o mais recente)."""
+    changeset = request.get_json(silent=True)
+    conn = get_db_connection()
+    try:
+        resultado = alteracoes.aplicar(conn, changeset)
+    except alteracoes.ChangesetError as e:
+        return jsonify({"error": str(e)}), 400
+    if resultado["aplicadas"]:
+        sincronia_git.registrar(f"Aplicando changeset de {resultado['origem']}: {resultado['aplicadas']} campos")
+        print_success(f"Changeset de {resultado['origem']}: {resultado['criadas']} criados, "
+                      f"{resultado['atualizadas']} atualizados, {resultado['apagadas']} apagados")
+    if resultado["pendentes"]:
+        print_warning(f"Changeset de {resultado['origem']}: {resultado['pendentes']} registros pendentes")
+    return jsonify(resultado)
+
+# ============================================================
+# HISTÓRICO (índice dos commits do git)
+# ============================================================
+
+@app.route("/linhas/<int:linha_id>/history", methods=["GET"])
+def historico_linha(linha_id):
+    """?coluna=status para só as mudanças de um campo (ex.: quando terminei); ?limite=N commits."""
+    coluna = request.args.get("coluna") or None
+    if coluna and coluna not in historico.COLUNAS:
+        return jsonify({"error": f"coluna deve ser uma de: {', '.join(historico.COLUNAS)}"}), 400
+    limite = request.args.get("limite", type=int)
+    erro = None
+    try:
+        # Só os commits novos desde a última consulta; se outra indexação estiver rodando, responde com o que já há
+        historico.atualizar()
+    except historico.HistoricoError as e:
+        erro = str(e)
+    conn = get_db_connection()
+    nome = repositorio.nome_linha(conn, MAIN, linha_id)
+    if nome is None:
+        arquivada = repositorio.linha_arquivada(conn, linha_id, "nome")
+        nome = arquivada["nome"] if arquivada else None
+    return jsonify({
+        "linha_id": linha_id,
+        "nome": nome,
+        "commits": historico.linha(linha_id, coluna, limite),
+        "indice": historico.status(),
+        "erro": erro,
+    })
+
+# ============================================================
+# MANUTENÇÃO (ANALYZE, vacuum incremental, órfãos, integridade)
+# ============================================================
+
+@app.route("/manutencao", methods=["GET"])
+def status_manutencao():
+    return jsonify(manutencao.status())
+
+@app.route("/manutencao", methods=["POST"])
+def executar_manutencao():
+    """Body opcional: {tarefas: [...]} (padrão: todas, ver manutencao.TAREFAS)."""
+    data = request.get_json(silent=True) or {}
+    tarefas = data.get("tarefas")
+    if tarefas is not None and (not isinstance(tarefas, list) or not all(isinstance(t, str) for t in tarefas)):
+        return jsonify({"error": "tarefas deve ser uma lista de nomes"}), 400
+    try:
+        relatorio = manutencao.executar(tarefas)
+    except manutencao.ManutencaoEmAndamento as e:
+        return jsonify({"error": str(e)}), 409
+    except manutencao.ManutencaoError as e:
+        return jsonify({"error": str(e)}), 400
+    falhas = [nome for nome, item in relatorio.items() if not item["ok"]]
+    if falhas:
+        print_error(f"Manutenção com falhas: {', '.join(falhas)}")
+    return jsonify({"tarefas": relatorio, "bancos": manutencao.tamanhos()})
+
 if __name__ == "__main__":
     import logging
     log = logging.getLogger('werkzeug')
     log.setLevel(logging.WARNING)
-    app.run(debug=True)
\ No newline at end of file
+    usar_reloader = True
+    # O processo pai do reloader só vigia os arquivos; quem atende é o filho (WERKZEUG_RUN_MAIN)
+    if not usar_reloader or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        iniciar_servicos()
+    app.run(debug=True, use_reloader=usar_reloader)
\ No newline at end of file
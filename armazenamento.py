@@ -0,0 +1,53 @@
+"""
+armazenamento.py — Escolhe a implementação do repositório de dados.
+
+As rotas falam com o repositório (listas, linhas, tags, espera) e não com o
+banco. Há duas implementações com a mesma interface:
+
+  - "sqlite"   (repositorio.py): list_it.db + waiting_list.db + arquivo.db, o padrão;
+  - "postgres" (repositorio_pg.py): schemas main/espera num servidor PostgreSQL.
+
+A escolha vem de LISTIT_BACKEND. Recursos que dependem do SQLite (busca FTS,
+sequências, arquivo, snapshots e o versionamento no git) só existem
+no backend "sqlite"; as rotas que funcionam nos dois estão em ROTAS_PORTAVEIS (app.py).
+"""
+
+import importlib
+import os
+
+BACKEND = os.environ.get("LISTIT_BACKEND", "sqlite").strip().lower()
+
+MODULOS = {
+    "sqlite": "repositorio",
+    "postgres": "repositorio_pg",
+}
+
+# O que toda implementação precisa oferecer (mesmas assinaturas e retornos de repositorio.py)
+INTERFACE = (
+    "MAIN", "ESPERA", "COLUNAS_EDITAVEIS", "NaoEncontrado", "ConflitoDeVersao", "ErroDeBanco",
+    "conectar", "transacao",
+    "listar_listas", "nome_lista", "criar_lista", "remover_lista", "limpar",
+    "listar_linhas", "obter_linha", "nome_linha", "inserir_linha", "versao_linha",
+    "atualizar_linha", "avancar_progresso", "remover_linha", "linhas_incompletas", "tags_em_uso",
+    "mover_linhas", "migrar_espera", "migrar_selecionadas", "deduplicar_espera",
+)
+
+
+class BackendInvalido(RuntimeError):
+    """LISTIT_BACKEND desconhecido ou implementação incompleta."""
+
+
+def carregar(backend=None):
+    """Importa o módulo do backend e confere que ele cumpre INTERFACE."""
+    backend = (backend or BACKEND).strip().lower()
+    if backend not in MODULOS:
+        raise BackendInvalido(f"LISTIT_BACKEND inválido: {backend} (use {' ou '.join(MODULOS)})")
+    modulo = importlib.import_module(MODULOS[backend])
+    faltando = [nome for nome in INTERFACE if not hasattr(modulo, nome)]
+    if faltando:
+        raise BackendInvalido(f"{MODULOS[backend]} não implementa: {', '.join(faltando)}")
+    return modulo
+
+
+def sqlite():
+    return BACKEND == "sqlite"
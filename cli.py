@@ -12,6 +12,8 @@ import threading
 import unicodedata
 import random
 import json
+import textwrap
+from functools import lru_cache
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill
 import re
@@ -206,14 +208,26 @@ def _norm_command_name(s: str) -> str:
         return ""
     return _norm(s.replace("_", " ").replace("-", " "))
 
+def _nome_norm(s: str) -> str:
+    """Mesma normalização de database.nome_norm (coluna nome_norm que o servidor devolve)."""
+    if not isinstance(s, str):
+        return ""
+    return " ".join(re.findall(r"\w+", _strip_accents(s).casefold()))
+
+def item_nome_norm(item):
+    """nome_norm vindo do servidor; calcula só para itens antigos/editados localmente."""
+    norm = item.get("nome_norm")
+    if norm is None:
+        norm = _nome_norm(item.get("nome") or item.get("name") or "")
+    return norm
+
 def search_items(itens, termo):
-    termo_norm = _norm(termo)
+    termo_norm = _nome_norm(termo)
     resultados = []
     for it in itens:
         if not isinstance(it, dict):
             continue
-        nome = it.get("nome") or it.get("name") or ""
-        if termo_norm in _norm(nome):
+        if termo_norm in item_nome_norm(it):
             resultados.append(it)
     return resultados
 
@@ -225,6 +239,8 @@ def enrich_created_line_from_anilist(line_id, nome, content_type, is_waiting=Fal
 
     media_type = "anime" if content_type in ["anime", "filme"] else "manga"
     try:
+        # Junta imagem e detalhes numa única escrita (um commit no git)
+        dados = {}
         image_resp = requests.get(
             f"{API_BASE.rstrip('/')}/search_image",
             params={"q": nome, "type": media_type},
@@ -233,11 +249,7 @@ def enrich_created_line_from_anilist(line_id, nome, content_type, is_waiting=Fal
         if image_resp.ok:
             image_url = image_resp.json().get("image_url")
             if image_url:
-                requests.put(
-                    f"{API_BASE.rstrip('/')}/linhas/{line_id}/imagem",
-                    json={"imagem_url": image_url},
-                    timeout=8,
-                )
+                dados["imagem_url"] = image_url
 
         details_resp = requests.get(
             f"{API_BASE.rstrip('/')}/search_details",
@@ -249,31 +261,77 @@ def enrich_created_line_from_anilist(line_id, nome, content_type, is_waiting=Fal
             sinopse = details.get("sinopse")
             sinonimos = details.get("sinonimos")
             if sinopse is not None and sinonimos is not None:
-                requests.put(
-                    f"{API_BASE.rstrip('/')}/linhas/{line_id}/details",
-                    json={"sinopse": sinopse, "sinonimos": sinonimos},
-                    timeout=8,
-                )
+                dados.update({"sinopse": sinopse, "sinonimos": sinonimos})
+
+        if dados:
+            _, err = batch_request(
+                [{"op": "update", "tipo": "linha", "id": line_id, "dados": dados}],
+                mensagem=f"Enriquecendo Linha: {nome} id: {line_id}",
+            )
+            if err:
+                return False, err
         return True, None
     except Exception as e:
         return False, str(e)
 
 
-def _split_tags_field(tags_field):
+@lru_cache(maxsize=4096)
+def _tag_keys(tags_field, strip_accents=False):
+    """Conjunto de tags normalizadas de um campo 'a, b, c' (calculado uma vez por string)."""
     if not isinstance(tags_field, str):
-        return []
-    parts = [p.strip() for p in tags_field.split(",") if p.strip()]
-    return [(_norm(p), p) for p in parts]
+        return frozenset()
+    norm = _norm if strip_accents else str.casefold
+    return frozenset(norm(p.strip()) for p in tags_field.split(",") if p.strip())
+
+def item_tag_keys(item, strip_accents=False):
+    if not isinstance(item, dict):
+        return frozenset()
+    return _tag_keys(item.get("tags") or "", strip_accents)
 
 def tags_contains(item, tag_check):
+    return _norm(tag_check) in item_tag_keys(item, strip_accents=True)
+
+# Bits das tags canônicas (tabela tag_bits do servidor); None = ainda não buscado
+_TAG_BITS = None
+
+def fetch_tag_bits():
+    """{chave casefold: bit} vindo de /tags/bits. Vazio se o servidor não responder."""
+    global _TAG_BITS
+    if _TAG_BITS is None:
+        try:
+            r = requests.get(f"{API_BASE.rstrip('/')}/tags/bits", timeout=5)
+            r.raise_for_status()
+            _TAG_BITS = {t["chave"]: t["bit"] for t in r.json()}
+            _tag_mask.cache_clear()
+        except Exception:
+            return {}
+    return _TAG_BITS
+
+def tags_to_mask(tags):
+    """Separa tags (casefold) em (máscara das canônicas, conjunto das que não têm bit)."""
+    bits = fetch_tag_bits()
+    mask = 0
+    resto = set()
+    for tag in tags:
+        bit = bits.get(tag)
+        if bit is None:
+            resto.add(tag)
+        else:
+            mask |= 1 << bit
+    return mask, resto
+
+@lru_cache(maxsize=4096)
+def _tag_mask(tags_field):
+    return tags_to_mask(_tag_keys(tags_field))[0]
+
+def item_tag_mask(item):
+    """tag_mask da linha (vinda do servidor ou calculada do campo tags se foi editada localmente)."""
     if not isinstance(item, dict):
-        return False
-    tags_field = item.get("tags") or ""
-    norm_tag_check = _norm(tag_check)
-    for norm, orig in _split_tags_field(tags_field):
-        if norm == norm_tag_check:
-            return True
-    return False
+        return 0
+    mask = item.get("tag_mask")
+    if mask is None:
+        mask = _tag_mask(item.get("tags") or "")
+    return mask
 
 # ============================================================
 # SISTEMA DE TAGS LOCAL (do tagsSystem.js)
@@ -354,10 +412,21 @@ def print_help_main():
         ("migrate_wait <id>", "Migra seletivamente itens de uma lista de espera para o principal."),
         ("clear_wait", "Limpa todo o banco de espera (com confirmação)."),
         ("verify_api", "Verifica se a API do AniList está respondendo."),
+        ("search <termo> [--wait] [--archived]", "Busca em todas as listas (nome, sinônimos, sinopse)."),
         ("help | ?", "Mostra este help."),
         ("clear | cls", "Limpa a tela."),
         ("exit | quit", "Sai do CLI."),
-        ("move", "Move itens entre listas do banco principal."),
+        ("move", "Move itens entre listas (principal e espera)."),
+        ("snapshots", "Lista as cópias de segurança locais dos bancos."),
+        ("snapshot", "Cria um snapshot agora."),
+        ("restore_snapshot [n]", "Restaura um snapshot (com confirmação)."),
+        ("maintenance [run]", "Mostra (ou executa agora) a manutenção dos bancos."),
+        ("sync [now]", "Mostra (ou força agora) o commit/push dos bancos no git."),
+        ("changes_export [arq] [desde]", "Exporta um changeset (registros editados depois do cursor)."),
+        ("changes_apply <arq>", "Aplica um changeset de outra máquina (vence a edição mais nova)."),
+        ("history <id> [campo]", "Mostra as alterações do item no histórico do git."),
+        ("archive [meses]", "Arquiva itens terminados sem edição há N meses (com prévia)."),
+        ("unarchive <ids>", "Devolve itens arquivados à lista principal."),
     ]
     for cmd, desc in commands:
         cmd_col = color_text(cmd.ljust(22), **STYLE["command"])
@@ -403,9 +472,11 @@ def print_help_item():
         ("edit <campo> <novo_valor>", "Edita um campo localmente."),
         ("edit", "Modo interativo de edição."),
         ("save", "Salva as alterações no servidor."),
+        ("ep+ [n] | ep- [n]", "Avança/volta o episódio/capítulo (padrão 1)."),
         ("refresh", "Recarrega o item do servidor."),
         ("delete", "Exclui o item (com confirmação)."),
         ("check", "Atualiza o highlight."),
+        ("history [campo]", "Alterações do item no histórico do git."),
         ("back | b", "Volta para a lista."),
         ("help | ?", "Mostra este help."),
         ("clear | cls", "Limpa a tela."),
@@ -442,10 +513,54 @@ def fetch_wait_lists_request():
     except Exception as e:
         return None, f"Erro: {e}"
 
-def fetch_lines_request(list_id):
+# Campos usados nas listagens; a sinopse só é buscada ao abrir o item (ou exportar)
+LINE_LIST_FIELDS = "id,lista_id,nome,nome_norm,tags,conteudo,status,episodio,opiniao,imagem_url,last_highlight,sinonimos,tag_mask,needs_details"
+LINE_PAGE_SIZE = 500
+# Campos calculados pelo servidor a partir de outro campo; ficam inválidos se ele for editado localmente
+CAMPOS_DERIVADOS = {"tags": "tag_mask", "nome": "nome_norm"}
+
+def fetch_lines_request(list_id, fields=None, page_size=None):
+    """Busca as linhas de uma lista. Com page_size percorre as páginas por cursor (after=)."""
     url = f"{API_BASE.rstrip('/')}/linhas/{list_id}"
+    params = {"fields": fields} if fields else {}
     try:
-        r = requests.get(url, timeout=8)
+        if not page_size:
+            r = requests.get(url, params=params, timeout=8)
+            if r.status_code >= 400:
+                return None, f"Erro {r.status_code}: {r.text}"
+            return r.json(), None
+        params["limit"] = page_size
+        linhas = []
+        while True:
+            r = requests.get(url, params=params, timeout=8)
+            if r.status_code >= 400:
+                return None, f"Erro {r.status_code}: {r.text}"
+            data = r.json()
+            linhas.extend(data.get("linhas") or [])
+            if data.get("next_after") is None:
+                return linhas, None
+            params["after"] = data["next_after"]
+    except Exception as e:
+        return None, f"Erro: {e}"
+
+def batch_request(operacoes, mensagem=None):
+    """Envia um lote de escritas para /batch (uma transação e um commit no git)."""
+    url = f"{API_BASE.rstrip('/')}/batch"
+    payload = {"operacoes": operacoes}
+    if mensagem:
+        payload["mensagem"] = mensagem
+    try:
+        r = requests.post(url, json=payload, timeout=60)
+        if r.status_code >= 400:
+            return None, f"Erro {r.status_code}: {r.text}"
+        return r.json(), None
+    except Exception as e:
+        return None, f"Erro: {e}"
+
+def fetch_line_details_request(line_id):
+    url = f"{API_BASE.rstrip('/')}/linhas/{line_id}/details"
+    try:
+        r = requests.get(url, timeout=6)
         if r.status_code >= 400:
             return None, f"Erro {r.status_code}: {r.text}"
         return r.json(), None
@@ -462,6 +577,21 @@ def fetch_wait_lines_request(list_id):
     except Exception as e:
         return None, f"Erro: {e}"
 
+def fetch_search_request(termo, incluir_espera=False, limit=100, incluir_arquivadas=False):
+    url = f"{API_BASE.rstrip('/')}/search"
+    params = {"q": termo, "limit": limit}
+    if incluir_espera:
+        params["espera"] = "true"
+    if incluir_arquivadas:
+        params["include_archived"] = "1"
+    try:
+        r = requests.get(url, params=params, timeout=8)
+        if r.status_code >= 400:
+            return None, f"Erro {r.status_code}: {r.text}"
+        return r.json(), None
+    except Exception as e:
+        return None, f"Erro: {e}"
+
 def verify_anilist_api():
     import time
     from datetime import datetime
@@ -1079,18 +1209,24 @@ class PaginatedDisplay:
                 return "Ordenado Z→A."
             if method in ("rate", "rate -r"):
                 opiniao_order = ["Favorito", "Muito Bom", "Recomendo", "Bom", "Mediano", "Ruim", "Horrivel", "Horrível", "Não Vi", "Nao Vi"]
+                m_goat, sem_bit = tags_to_mask({"goat"})
+                m_love, sem_bit_love = tags_to_mask({"beijo", "romance do bom"})
+                m_rel, sem_bit_rel = tags_to_mask({"namoro", "casamento", "noivado"})
+                usa_mascara = not (sem_bit or sem_bit_love or sem_bit_rel)
                 def get_priority(item):
-                    tags_field = item.get("tags") if isinstance(item, dict) else ""
-                    tags_norm = [t for (t, orig) in _split_tags_field(tags_field)]
-                    def has_tag(t): return _norm(t) in tags_norm
-                    has_relation = any(has_tag(x) for x in ("namoro", "casamento", "noivado"))
-                    is_bestlove = has_tag("goat") and has_tag("beijo") and has_tag("romance do bom") and has_relation
-                    if is_bestlove:
+                    if usa_mascara:
+                        mask = item_tag_mask(item)
+                        has_goat = bool(mask & m_goat)
+                        is_love = mask & m_love == m_love and bool(mask & m_rel)
+                    else:
+                        tags_norm = item_tag_keys(item, strip_accents=True)
+                        def has_tag(t): return _norm(t) in tags_norm
+                        has_relation = any(has_tag(x) for x in ("namoro", "casamento", "noivado"))
+                        has_goat = has_tag("goat")
+                        is_love = (has_tag("beijo") and has_tag("romance do bom") and has_relation)
+                    if is_love and has_goat:
                         return 0
-                    is_love = (has_tag("beijo") and has_tag("romance do bom") and has_relation)
-                    if is_love and has_tag("goat"):
-                        return 1
-                    if has_tag("goat"):
+                    if has_goat:
                         return 2
                     opiniao_raw = item.get("opiniao") if isinstance(item, dict) else ""
                     opiniao_norm = _norm(opiniao_raw)
@@ -1125,14 +1261,8 @@ def extrair_tags_dos_itens(itens):
     return sorted(todas_tags)
 
 def filtrar_por_tag(itens, tag_procurada):
-    tag_procurada = tag_procurada.lower()
-    resultados = []
-    for item in itens:
-        if isinstance(item, dict) and item.get("tags"):
-            tags_item = [tag.strip().lower() for tag in item["tags"].split(",")]
-            if tag_procurada in tags_item:
-                resultados.append(item)
-    return resultados
+    tag_procurada = tag_procurada.strip().casefold()
+    return [item for item in itens if tag_procurada in item_tag_keys(item)]
 
 def filtrar_por_status(itens, status_procurado):
     status_procurado = status_procurado.lower()
@@ -1299,7 +1429,7 @@ class OpenListContext:
             )
         else:
             lines, err = with_minimum_spinner(
-                lambda: fetch_lines_request(self.id),
+                lambda: fetch_lines_request(self.id, fields=LINE_LIST_FIELDS, page_size=LINE_PAGE_SIZE),
                 text=f"Buscando linhas da lista '{self.name}'...",
                 min_seconds=0.6
             )
@@ -1332,14 +1462,13 @@ class OpenListContext:
     def open_item_by_name(self, nome):
         if not isinstance(nome, str) or not nome.strip():
             return None, "Nome inválido."
-        nome_normalizado = _norm_command_name(nome)
+        nome_normalizado = _nome_norm(nome)
         exact_match = None
         partial_matches = []
         for idx, item in enumerate(self.lines, start=1):
             if not isinstance(item, dict):
                 continue
-            item_name = item.get("nome") or item.get("name") or ""
-            item_norm = _norm_command_name(item_name)
+            item_norm = item_nome_norm(item)
             if item_norm == nome_normalizado:
                 exact_match = (idx, item)
                 break
@@ -1374,12 +1503,19 @@ class OpenListContext:
             if parsed["statuses"]:
                 sts = set(parsed["statuses"])
                 itens = [it for it in itens if isinstance(it, dict) and it.get("status","").casefold() in sts]
-            if parsed["excluded_tags"]:
-                excl = set(parsed["excluded_tags"])
+            # Tags canônicas viram um teste de bits; só as demais passam pelas strings
+            req_mask, req_rest = tags_to_mask(parsed["required_tags"])
+            excl_mask, excl_rest = tags_to_mask(parsed["excluded_tags"])
+            if req_mask or excl_mask:
+                itens = [it for it in itens if isinstance(it, dict)
+                         and item_tag_mask(it) & req_mask == req_mask
+                         and not item_tag_mask(it) & excl_mask]
+            if excl_rest:
+                excl = excl_rest
                 def has_excluded(it):
                     if not isinstance(it, dict):
                         return False
-                    tags = [t.strip().casefold() for t in (it.get("tags") or "").split(",") if t.strip()]
+                    tags = item_tag_keys(it)
                     for ex in excl:
                         if ex.startswith("__conteudo__:"):
                             need = ex.split(":",1)[1]
@@ -1389,13 +1525,12 @@ class OpenListContext:
                             return True
                     return False
                 itens = [it for it in itens if not has_excluded(it)]
-            if parsed["required_tags"]:
-                req = set(parsed["required_tags"])
+            if req_rest:
+                req = req_rest
                 def has_all_required(it):
                     if not isinstance(it, dict):
                         return False
-                    tags = [t.strip().casefold() for t in (it.get("tags") or "").split(",") if t.strip()]
-                    return req.issubset(set(tags))
+                    return req.issubset(item_tag_keys(it))
                 itens = [it for it in itens if has_all_required(it)]
         titulo = f"LINHAS DA LISTA: {self.name}"
         if filtro_expresao:
@@ -1468,6 +1603,16 @@ class OpenListContext:
             "image": ask_opt("Incluir Imagem (URL)?", True),
         }
 
+        # As listagens não trazem a sinopse; busca só ela quando for exportada
+        if opts["sinopse"] and not self.is_waiting and any(isinstance(it, dict) and "sinopse" not in it for it in items):
+            sinopses, err = fetch_lines_request(self.id, fields="id,sinopse", page_size=LINE_PAGE_SIZE)
+            if err:
+                return False, err
+            por_id = {s["id"]: s.get("sinopse") for s in sinopses}
+            for it in items:
+                if isinstance(it, dict) and "sinopse" not in it:
+                    it["sinopse"] = por_id.get(it.get("id"), "")
+
         color_map = {}
         used = set()
         def rand_color():
@@ -1836,8 +1981,21 @@ class ItemContext:
         self.index_in_view = int(idx_in_view)
         self.name = str(self.item.get("id") or self.item.get("nome") or f"item{self.index_in_view}")
         self.modified = False
+        # Como o item estava no servidor; save() envia só o que mudou em relação a isto
+        self.original = dict(self.item)
+
+    def ensure_details(self):
+        """Carrega sob demanda os campos que as listagens não trazem (sinopse)."""
+        if "sinopse" in self.item or "id" not in self.item or getattr(self.parent, "is_waiting", False):
+            return
+        details, err = fetch_line_details_request(self.item["id"])
+        if not err and isinstance(details, dict):
+            novos = {k: v for k, v in details.items() if k not in self.item or self.item[k] == self.original.get(k)}
+            self.item.update(novos)
+            self.original.update(details)
 
     def show_details(self):
+        self.ensure_details()
         i = self.item
         clear_screen()
         
@@ -1922,12 +2080,10 @@ class ItemContext:
         sinopse = i.get('sinopse') or ''
         print(f"  {color_text('Sinopse:', color=label_color)}")
         if sinopse:
-            # Quebra a sinopse em linhas de 76 caracteres
-            lines = []
-            for j in range(0, len(sinopse), 76):
-                lines.append(f"    {sinopse[j:j+76]}")
-            for line in lines:
-                print(color_text(line, color=value_color))
+            # A sinopse já vem em texto puro; quebra cada parágrafo em linhas de até 76 caracteres
+            for paragrafo in sinopse.split("\n"):
+                for line in textwrap.wrap(paragrafo, 76) or [""]:
+                    print(color_text(f"    {line}", color=value_color))
         else:
             print(f"    {color_text('(sem sinopse)', color='bright_black')}")
         
@@ -1951,6 +2107,8 @@ class ItemContext:
         }
         field = aliases.get(field, field)
         self.item[field] = new_value
+        if field in CAMPOS_DERIVADOS:
+            self.item.pop(CAMPOS_DERIVADOS[field], None)
         self.modified = True
         return f"Campo '{field}' atualizado localmente."
 
@@ -1965,6 +2123,8 @@ class ItemContext:
                     self.item[f] = [s.strip() for s in raw.split(";") if s.strip()]
                 else:
                     self.item[f] = raw
+                if f in CAMPOS_DERIVADOS:
+                    self.item.pop(CAMPOS_DERIVADOS[f], None)
                 self.modified = True
         return "Edição local concluída."
 
@@ -1995,33 +2155,63 @@ class ItemContext:
             "imagem_url": self.item.get("imagem_url"),
             "sinonimos": self.item.get("sinonimos")
         }
-        payload = {k: v for k, v in payload.items() if v is not None}
-        url = f"{API_BASE.rstrip('/')}/linhas/{self.item['id']}"
+        payload = {k: v for k, v in payload.items() if v is not None and v != self.original.get(k)}
+        if not payload:
+            self.modified = False
+            return True, "Nada para salvar."
         try:
-            r = requests.put(url, json=payload, timeout=8)
+            if getattr(self.parent, "is_waiting", False):
+                r = requests.put(f"{API_BASE.rstrip('/')}/wait/linhas/{self.item['id']}", json=payload, timeout=8)
+            else:
+                # PATCH condicionado à versão lida: não sobrescreve edições feitas no navegador
+                if self.item.get("version") is not None:
+                    payload["version"] = self.item["version"]
+                r = requests.patch(f"{API_BASE.rstrip('/')}/linhas/{self.item['id']}", json=payload, timeout=8)
+            if r.status_code == 409:
+                return False, "O item foi alterado em outro lugar. Use 'refresh' e edite de novo."
             if r.status_code >= 400:
                 return False, f"Erro {r.status_code}: {r.text}"
+            versao = (r.json() or {}).get("version") if r.content else None
+            if versao is not None:
+                self.item["version"] = versao
+            self.original = dict(self.item)
             self.modified = False
-            return True, f"Salvo com sucesso: {self.item['id']}"
+            return True, f"Salvo com sucesso: {self.item['id']} ({', '.join(k for k in payload if k != 'version')})"
         except Exception as e:
             return False, f"Erro de rede: {e}"
 
-    def refresh(self):
+    def progress(self, delta):
+        """Soma delta ao episódio direto no servidor (sem ler/escrever o item inteiro)."""
         if "id" not in self.item:
             return False, "Item sem ID."
-        url = f"{API_BASE.rstrip('/')}/linhas/{self.item['id']}"
+        if getattr(self.parent, "is_waiting", False):
+            return False, "Progresso só está disponível para itens da lista principal."
         try:
-            r = requests.get(url, timeout=6)
+            r = requests.post(f"{API_BASE.rstrip('/')}/linhas/{self.item['id']}/progress",
+                              json={"delta": delta}, timeout=8)
             if r.status_code >= 400:
                 return False, f"Erro {r.status_code}: {r.text}"
-            new = r.json()
-            if isinstance(new, dict):
-                self.item = new
-                return True, "Dados atualizados do servidor."
-            return False, "Resposta inesperada do servidor."
+            data = r.json()
+            for campo in ("episodio", "version"):
+                self.item[campo] = data.get(campo)
+                self.original[campo] = data.get(campo)
+            return True, f"Episódio/capítulo agora: {data.get('episodio')}"
         except Exception as e:
             return False, f"Erro de rede: {e}"
 
+    def refresh(self):
+        if "id" not in self.item:
+            return False, "Item sem ID."
+        new, err = fetch_line_details_request(self.item["id"])
+        if err:
+            return False, err
+        if isinstance(new, dict):
+            self.item = new
+            self.original = dict(new)
+            self.modified = False
+            return True, "Dados atualizados do servidor."
+        return False, "Resposta inesperada do servidor."
+
     def delete(self):
         if "id" not in self.item:
             return False, "Item sem ID."
@@ -2305,21 +2495,29 @@ def cmd_migrate_wait(wait_list_id=None):
 
 def cmd_move():
     """
-    Comando interativo para mover itens entre listas do banco principal.
-    O usuário escolhe os itens pelo número de ordem (posição) exibido na lista.
+    Comando interativo para mover itens entre listas (principal e/ou espera).
+    O usuário escolhe os itens pelo número de ordem (posição) exibido na lista;
+    a seleção inteira vai para o servidor numa única requisição.
     """
     listas, err = fetch_lists_request()
     if err:
         print_error(f"Erro ao buscar listas: {err}")
         return
+    listas = [dict(l, db="main") for l in (listas or [])]
+    listas_espera, err = fetch_wait_lists_request()
+    if not err and listas_espera:
+        listas += [dict(l, db="wait") for l in listas_espera]
     if not listas:
-        print_info("Nenhuma lista principal disponível.")
+        print_info("Nenhuma lista disponível.")
         return
 
-    fancy_header(["📋 LISTAS PRINCIPAIS DISPONÍVEIS"], color="bright_green")
+    def rotulo(lista):
+        return f"{lista['nome']} (espera)" if lista["db"] == "wait" else lista["nome"]
+
+    fancy_header(["📋 LISTAS DISPONÍVEIS"], color="bright_green")
     for idx, lista in enumerate(listas, start=1):
         id_colored = color_text(f"(ID:{lista['id']})", **STYLE["dim"])
-        print(f"{color_text(str(idx).rjust(3), **STYLE['number'])}. {color_text(lista['nome'], color='bright_white', style='bright')} {id_colored}")
+        print(f"{color_text(str(idx).rjust(3), **STYLE['number'])}. {color_text(rotulo(lista), color='bright_white', style='bright')} {id_colored}")
     print(color_text("-" * 80, **STYLE["dim"]))
 
     while True:
@@ -2331,7 +2529,10 @@ def cmd_move():
                 break
         print_error("Opção inválida. Tente novamente.")
 
-    linhas, err = fetch_lines_request(origem['id'])
+    if origem["db"] == "wait":
+        linhas, err = fetch_wait_lines_request(origem['id'])
+    else:
+        linhas, err = fetch_lines_request(origem['id'], fields="id,nome", page_size=LINE_PAGE_SIZE)
     if err:
         print_error(f"Erro ao buscar linhas: {err}")
         return
@@ -2340,22 +2541,29 @@ def cmd_move():
         return
 
     linhas_ordenadas = sorted(linhas, key=lambda x: x.get('nome', '').casefold())
-    fancy_header([f"📋 LISTA ORIGEM: {origem['nome']} (ID {origem['id']})"], color="bright_cyan")
+    fancy_header([f"📋 LISTA ORIGEM: {rotulo(origem)} (ID {origem['id']})"], color="bright_cyan")
     for idx, linha in enumerate(linhas_ordenadas, start=1):
         id_colored = color_text(f"(ID:{linha['id']})", **STYLE["dim"])
         print(f"{color_text(str(idx).rjust(3), **STYLE['number'])}. {color_text(linha['nome'], color='bright_white', style='bright')} {id_colored}")
     print(color_text("-" * 80, **STYLE["dim"]))
 
     while True:
-        raw = input(color_text("Quais itens você quer mover? (digite os números de posição separados por vírgula, ex: 1,3,5): ", **STYLE["info"])).strip()
+        raw = input(color_text("Quais itens você quer mover? (posições separadas por vírgula, faixas ou 'todos', ex: 1,3,5-12): ", **STYLE["info"])).strip()
         if not raw:
             print_info("Nenhum número informado. Operação cancelada.")
             return
         indices = []
+        if raw.lower() in ("todos", "*"):
+            indices = list(range(1, len(linhas_ordenadas) + 1))
         for part in raw.split(','):
             part = part.strip()
             if part.isdigit():
                 indices.append(int(part))
+            elif "-" in part:
+                inicio, _, fim = part.partition("-")
+                if inicio.strip().isdigit() and fim.strip().isdigit():
+                    indices.extend(range(int(inicio), int(fim) + 1))
+        indices = list(dict.fromkeys(indices))
         if not indices:
             print_error("Números inválidos. Tente novamente.")
             continue
@@ -2366,7 +2574,7 @@ def cmd_move():
         ids_selecionados = [linhas_ordenadas[i-1]['id'] for i in indices]
         break
 
-    listas_destino = [l for l in listas if l['id'] != origem['id']]
+    listas_destino = [l for l in listas if (l['id'], l['db']) != (origem['id'], origem['db'])]
     if not listas_destino:
         print_info("Não há outra lista para mover. Operação cancelada.")
         return
@@ -2374,7 +2582,7 @@ def cmd_move():
     fancy_header(["📋 LISTAS DESTINO DISPONÍVEIS (excluindo origem)"], color="bright_green")
     for idx, lista in enumerate(listas_destino, start=1):
         id_colored = color_text(f"(ID:{lista['id']})", **STYLE["dim"])
-        print(f"{color_text(str(idx).rjust(3), **STYLE['number'])}. {color_text(lista['nome'], color='bright_white', style='bright')} {id_colored}")
+        print(f"{color_text(str(idx).rjust(3), **STYLE['number'])}. {color_text(rotulo(lista), color='bright_white', style='bright')} {id_colored}")
     print(color_text("-" * 80, **STYLE["dim"]))
 
     while True:
@@ -2387,9 +2595,9 @@ def cmd_move():
         print_error("Opção inválida. Tente novamente.")
 
     fancy_header(["📋 RESUMO DA MOVIMENTAÇÃO"], color="bright_cyan")
-    print(color_text(f"📌 Origem: {origem['nome']} (ID {origem['id']})", color="bright_white", style="bright"))
-    print(color_text(f"📌 Itens a mover (posições): {', '.join(str(i) for i in indices)}", **STYLE["info"]))
-    print(color_text(f"📌 Destino: {destino['nome']} (ID {destino['id']})", color="bright_green", style="bright"))
+    print(color_text(f"📌 Origem: {rotulo(origem)} (ID {origem['id']})", color="bright_white", style="bright"))
+    print(color_text(f"📌 Itens a mover: {len(indices)}", **STYLE["info"]))
+    print(color_text(f"📌 Destino: {rotulo(destino)} (ID {destino['id']})", color="bright_green", style="bright"))
     print(color_text("=" * 80, **STYLE["dim"]))
     confirm = input(color_text("Confirmar movimentação? (s/N): ", **STYLE["highlight"])).strip().lower()
     if confirm != 's':
@@ -2400,6 +2608,8 @@ def cmd_move():
     payload = {
         "origem_lista_id": origem['id'],
         "destino_lista_id": destino['id'],
+        "origem_db": origem['db'],
+        "destino_db": destino['db'],
         "item_ids": ids_selecionados
     }
     try:
@@ -2439,6 +2649,33 @@ def print_welcome_banner():
     print(color_text("   Digite 'help' para ver os comandos disponíveis.", **STYLE["dim"]))
     print()
 
+def cmd_global_search(args):
+    """Busca textual em todas as listas via endpoint /search do servidor."""
+    incluir_espera = "--wait" in args
+    incluir_arquivadas = "--archived" in args
+    termo = " ".join(a for a in args if a not in ("--wait", "--archived")).strip()
+    if not termo:
+        print_error("Uso: search <termo> [--wait] [--archived]")
+        return
+    data, err = with_minimum_spinner(
+        lambda: fetch_search_request(termo, incluir_espera, incluir_arquivadas=incluir_arquivadas),
+        text=f"Buscando '{termo}' em todas as listas...",
+        min_seconds=0.6
+    )
+    if err:
+        print_error(f"Erro na busca: {err}")
+        return
+    itens = []
+    for r in data.get("resultados", []):
+        item = dict(r)
+        lista = r.get("lista_nome") or r.get("lista_id")
+        sufixo = {"espera": " (espera)", "arquivo": " (arquivado)"}.get(r.get("origem"), "")
+        item["nome"] = f"{r.get('nome')}  → {lista}{sufixo}"
+        itens.append(item)
+    titulo = f"BUSCA GLOBAL: \"{termo}\" ({data.get('total', len(itens))} resultados)"
+    display = PaginatedDisplay(itens, titulo, items_per_page=None)
+    display.render_page()
+
 def cmd_clear_wait():
     confirm = input(color_text("⚠️ Tem certeza que deseja limpar todo o banco de espera? (y/N): ", **STYLE["warning"])).strip().lower()
     if confirm == "y":
@@ -2454,6 +2691,263 @@ def cmd_clear_wait():
     else:
         print_info("Operação cancelada.")
 
+def cmd_snapshots():
+    try:
+        r = requests.get(f"{API_BASE.rstrip('/')}/snapshots", timeout=10)
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        print_error(f"Erro ao listar snapshots: {e}")
+        return []
+    lista = data.get("snapshots", [])
+    status = data.get("status", {})
+    fancy_header(["💾 SNAPSHOTS"], color="bright_cyan")
+    if not lista:
+        print(color_text("  Nenhum snapshot guardado ainda.", **STYLE["dim"]))
+    for idx, snap in enumerate(lista, start=1):
+        num = color_text(f"{idx:3d}.", **STYLE["number"])
+        tamanho = f"{snap.get('tamanho', 0) / 1024:.0f} KB"
+        print(f"  {num} {snap.get('arquivo')}  {color_text(tamanho, **STYLE['dim'])}")
+    if status:
+        print(color_text(f"\n  Último: {status.get('ultimo_snapshot') or '-'} | "
+                         f"escritas desde então: {status.get('escritas_desde_ultimo', 0)}", **STYLE["dim"]))
+        if status.get("ultimo_erro"):
+            print_error(status["ultimo_erro"])
+    return lista
+
+def cmd_snapshot_now():
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/snapshots", timeout=60)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+        print_success(f"Snapshot criado: {', '.join(data.get('arquivos', []))}")
+    except Exception as e:
+        print_error(f"Erro: {e}")
+
+def cmd_restore_snapshot(chave=None):
+    lista = cmd_snapshots()
+    if not lista:
+        return
+    if not chave:
+        chave = input(color_text("Número ou nome do snapshot a restaurar: ", **STYLE["info"])).strip()
+    if chave.isdigit() and 1 <= int(chave) <= len(lista):
+        arquivo = lista[int(chave) - 1]["arquivo"]
+    else:
+        arquivo = chave
+    confirm = input(color_text(f"⚠️ Restaurar '{arquivo}'? O estado atual vira um snapshot antes. (y/N): ", **STYLE["warning"])).strip().lower()
+    if confirm != "y":
+        print_info("Operação cancelada.")
+        return
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/snapshots/restore",
+                          json={"arquivo": arquivo, "confirm": True}, timeout=120)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+        print_success(f"{data.get('mensagem')} Estado anterior salvo em {data.get('snapshot_anterior')}.")
+    except Exception as e:
+        print_error(f"Erro: {e}")
+
+def cmd_maintenance(args):
+    executar = bool(args) and args[0] == "run"
+    try:
+        if executar:
+            r = requests.post(f"{API_BASE.rstrip('/')}/manutencao", json={"tarefas": args[1:]}, timeout=300)
+        else:
+            r = requests.get(f"{API_BASE.rstrip('/')}/manutencao", timeout=10)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    fancy_header(["🧹 MANUTENÇÃO"], color="bright_cyan")
+    if not executar:
+        print(color_text(f"  Última: {data.get('ultima_execucao') or '-'} | "
+                         f"a cada {data.get('intervalo_segundos', 0) // 3600} h", **STYLE["dim"]))
+    for nome, item in data.get("tarefas", {}).items():
+        marca = "✅" if item.get("ok") else "❌"
+        duracao = f"{item.get('duracao_ms', 0):.0f} ms"
+        print(f"  {marca} {color_text(nome.ljust(14), **STYLE['command'])} {color_text(duracao, **STYLE['dim'])}")
+        if item.get("erro"):
+            print_error(f"     {item['erro']}")
+    for schema, banco in data.get("bancos", {}).items():
+        livres = banco.get("paginas_livres", 0)
+        print(color_text(f"  {schema}: {banco.get('bytes', 0) / 1024:.0f} KB, {livres} páginas livres", **STYLE["dim"]))
+
+def cmd_sync(args):
+    try:
+        if args and args[0] == "now":
+            r = requests.post(f"{API_BASE.rstrip('/')}/sync", timeout=10)
+        else:
+            r = requests.get(f"{API_BASE.rstrip('/')}/sync", timeout=10)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    if "mensagem" in data:
+        print_success(data["mensagem"])
+        data = data.get("status", {})
+    fancy_header(["🔄 GIT"], color="bright_cyan")
+    print(color_text(f"  Alterações pendentes: {data.get('pendentes', 0)} | "
+                     f"commits nesta sessão: {data.get('commits', 0)}", **STYLE["dim"]))
+    print(color_text(f"  Último commit: {data.get('ultimo_commit') or '-'} | "
+                     f"último push: {data.get('ultimo_push') or '-'}", **STYLE["dim"]))
+    if data.get("push_pendente"):
+        print_info(f"Push pendente (próxima tentativa em {data.get('push_em_segundos') or 0:.0f}s)")
+    if data.get("ultimo_erro"):
+        print_error(data["ultimo_erro"])
+
+def cmd_changes_export(args):
+    """changes_export [arquivo] [desde]: grava em arquivo o changeset dos registros editados depois do cursor."""
+    desde = next((a for a in args if a.isdigit()), "0")
+    arquivo = next((a for a in args if not a.isdigit()), None)
+    try:
+        r = requests.get(f"{API_BASE.rstrip('/')}/changeset", params={"desde": desde}, timeout=60)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    arquivo = arquivo or f"changeset-{data['origem']}-{data['desde']}-{data['cursor']}.json"
+    with open(arquivo, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    print_success(f"{data['registros']} registros ({len(data['alteracoes'])} campos) gravados em {arquivo}")
+    print_info(f"No próximo export para a mesma máquina use: changes_export {data['cursor']}")
+
+def cmd_changes_apply(args):
+    if not args:
+        print_error("Uso: changes_apply <arquivo>")
+        return
+    try:
+        with open(args[0], encoding="utf-8") as f:
+            changeset = json.load(f)
+    except (OSError, ValueError) as e:
+        print_error(f"Não foi possível ler {args[0]}: {e}")
+        return
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/changeset", json=changeset, timeout=120)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    print_success(f"Changeset de {data.get('origem')}: {data['aplicadas']} campos aplicados, "
+                  f"{data['ignoradas']} ignorados (já havia edição mais nova)")
+    print(color_text(f"  Criados: {data['criadas']} | atualizados: {data['atualizadas']} | "
+                     f"apagados: {data['apagadas']} | mantidos: {data['mantidas']}", **STYLE["dim"]))
+    if data.get("pendentes"):
+        print_info(f"{data['pendentes']} registros pendentes (falta a lista ou campos): "
+                   "aplique também um changeset mais completo (changes_export 0) da outra máquina")
+
+def cmd_history(args, linha_id=None):
+    """history <id> [campo] (ou history [campo] com um item aberto): o que mudou no item, commit a commit."""
+    if linha_id is None:
+        if not args or not args[0].isdigit():
+            print_error("Uso: history <id> [campo]")
+            return
+        linha_id, args = int(args[0]), args[1:]
+    params = {"coluna": args[0]} if args else {}
+    try:
+        r = requests.get(f"{API_BASE.rstrip('/')}/linhas/{linha_id}/history", params=params, timeout=120)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    fancy_header([f"🕘 HISTÓRICO: {data.get('nome') or linha_id}"], color="bright_cyan")
+    if data.get("erro"):
+        print_info(f"Índice do git não atualizado: {data['erro']}")
+    commits = data.get("commits", [])
+    if not commits:
+        print(color_text("  Nenhuma alteração encontrada no histórico do git.", **STYLE["dim"]))
+    for commit in commits:
+        quando = (commit.get("quando") or "")[:16].replace("T", " ")
+        print(f"  {color_text(quando, **STYLE['number'])}  {commit.get('assunto')}")
+        for evento in commit.get("eventos", []):
+            if evento["evento"] == "alterada":
+                texto = f"{evento['coluna']}: {evento['antes']} → {evento['depois']}"
+            else:
+                texto = evento["evento"]
+            print(color_text(f"      {texto}", **STYLE["arg"]))
+        for mensagem in commit.get("mensagens", []):
+            if mensagem != commit.get("assunto"):
+                print(color_text(f"      · {mensagem}", **STYLE["dim"]))
+    if (data.get("indice") or {}).get("indexando"):
+        print_info("Indexação do histórico em andamento: os commits mais novos podem faltar.")
+
+def cmd_archive(args):
+    meses = int(args[0]) if args and args[0].isdigit() else None
+    body = {"dry_run": True}
+    if meses is not None:
+        body["meses"] = meses
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/arquivo/arquivar", json=body, timeout=30)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro ao buscar candidatas: {e}")
+        return
+    candidatas = data.get("candidatas", [])
+    fancy_header(["🗄️ ARQUIVAR"], color="bright_cyan")
+    if not candidatas:
+        print_info("Nenhum item para arquivar.")
+        return
+    for item in candidatas[:30]:
+        num = color_text(f"{item['id']:5d}", **STYLE["number"])
+        detalhe = f"{item.get('status')} · {(item.get('atualizada_em') or '-')[:10]}"
+        print(f"  {num} {item['nome']}  {color_text(detalhe, **STYLE['dim'])}")
+    if len(candidatas) > 30:
+        print(color_text(f"  ... e mais {len(candidatas) - 30}", **STYLE["dim"]))
+    confirm = input(color_text(f"Arquivar {len(candidatas)} itens? (y/N): ", **STYLE["warning"])).strip().lower()
+    if confirm != "y":
+        print_info("Operação cancelada.")
+        return
+    body.pop("dry_run")
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/arquivo/arquivar", json=body, timeout=60)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+        print_success(data.get("mensagem"))
+    except Exception as e:
+        print_error(f"Erro: {e}")
+
+def cmd_unarchive(args):
+    ids = [int(a) for a in " ".join(args).replace(",", " ").split() if a.isdigit()]
+    if not ids:
+        print_error("Uso: unarchive <id> [id ...]")
+        return
+    try:
+        r = requests.post(f"{API_BASE.rstrip('/')}/arquivo/desarquivar", json={"ids": ids}, timeout=30)
+        data = r.json()
+        if r.status_code >= 400:
+            print_error(data.get("error", f"Erro {r.status_code}"))
+            return
+    except Exception as e:
+        print_error(f"Erro: {e}")
+        return
+    if data.get("devolvidos"):
+        print_success(f"Devolvidos: {', '.join(map(str, data['devolvidos']))}")
+    if data.get("nao_encontrados"):
+        print_warning(f"Não estão no arquivo: {', '.join(map(str, data['nao_encontrados']))}")
+
 # DEPOIS - Parser mais robusto
 
 def parse_command(line):
@@ -2621,6 +3115,50 @@ def main():
                     cmd_clear_wait()
                     continue
 
+                if cmd == "snapshots":
+                    cmd_snapshots()
+                    continue
+
+                if cmd == "snapshot":
+                    cmd_snapshot_now()
+                    continue
+
+                if cmd == "restore_snapshot":
+                    cmd_restore_snapshot(" ".join(args) if args else None)
+                    continue
+
+                if cmd == "maintenance":
+                    cmd_maintenance(args)
+                    continue
+
+                if cmd == "sync":
+                    cmd_sync(args)
+                    continue
+
+                if cmd == "changes_export":
+                    cmd_changes_export(args)
+                    continue
+
+                if cmd == "changes_apply":
+                    cmd_changes_apply(args)
+                    continue
+
+                if cmd == "history":
+                    cmd_history(args)
+                    continue
+
+                if cmd == "archive":
+                    cmd_archive(args)
+                    continue
+
+                if cmd == "unarchive":
+                    cmd_unarchive(args)
+                    continue
+
+                if cmd == "search":
+                    cmd_global_search(args)
+                    continue
+
                 if cmd in ("clear", "cls"):
                     clear_screen()
                     continue
@@ -2722,6 +3260,19 @@ def main():
                         print_error(f"Erro ao salvar: {msg}")
                     continue
 
+                if cmd in ("ep+", "ep-"):
+                    try:
+                        passo = int(args[0]) if args else 1
+                    except ValueError:
+                        print_info("Uso: ep+ [n] | ep- [n] (n inteiro)")
+                        continue
+                    ok, msg = current_ctx.progress(passo if cmd == "ep+" else -passo)
+                    if ok:
+                        print_success(msg)
+                    else:
+                        print_error(f"Erro: {msg}")
+                    continue
+
                 if cmd == "refresh":
                     ok, msg = current_ctx.refresh()
                     if ok:
@@ -2753,6 +3304,13 @@ def main():
                         print_error(f"Erro: {msg}")
                     continue
 
+                if cmd == "history":
+                    if getattr(current_ctx.parent, "is_waiting", False) or "id" not in current_ctx.item:
+                        print_info("O histórico do git só cobre itens da lista principal.")
+                    else:
+                        cmd_history(args, current_ctx.item["id"])
+                    continue
+
                 if cmd in ("back", "b"):
                     fancy_header([f"⬅️ Voltando para '{current_ctx.parent.name}'"], color="bright_cyan")
                     current_ctx = current_ctx.parent
@@ -1,6 +1,7 @@
 # padronizador_tags.py
 import sqlite3
 import re
+import database
 
 def normalizar_texto(texto):
     """Remove acentos e converte para minúsculas para comparação"""
@@ -223,6 +224,7 @@ def padronizar_tags():
         # Atualiza no banco se houve mudança
         if nova_tags_string != tags_originais:
             cursor.execute("UPDATE linhas SET tags = ? WHERE id = ?", (nova_tags_string, linha_id))
+            database.sync_linha_tags(conn, linha_id, nova_tags_string)
             linhas_alteradas += 1
             print(f"✅ Linha {linha_id} atualizada: {nova_tags_string}")
     
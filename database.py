@@ -0,0 +1,1411 @@
+"""
+database.py — Camada única de conexões SQLite (list_it.db e waiting_list.db).
+
+Mantém um pool de conexões por arquivo, todas em modo WAL e com o mesmo perfil
+de PRAGMAs, para que o servidor Flask e o CLI possam ler/escrever ao mesmo tempo
+sem "database is locked" e sem pagar o custo de abrir conexão a cada rota.
+
+As conexões do banco principal já vêm com o banco de espera anexado como o
+schema "espera" e o arquivo de linhas antigas como "arquivo", então operações
+entre os bancos cabem numa transação só.
+"""
+
+import html
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+from contextlib import contextmanager
+
+import relogio
+
+MAIN_DB = "list_it.db"
+WAITING_DB = "waiting_list.db"
+ARQUIVO_DB = "arquivo.db"
+# Índice local do histórico do git (fora do git; ver historico.py)
+HISTORICO_DB = "historico.db"
+
+# Perfil de PRAGMAs aplicado em toda conexão nova
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 268435456,   # 256 MB
+    "cache_size": -16000,     # ~16 MB (valor negativo = KiB)
+    "temp_store": "MEMORY",
+}
+
+# Quantidade de statements preparados mantidos em cache por conexão
+STATEMENT_CACHE_SIZE = 256
+
+# Quantas conexões ociosas cada pool guarda para reutilizar
+POOL_MAX_IDLE = 8
+
+MAIN_SCHEMA = "main"
+ESPERA_SCHEMA = "espera"
+ARQUIVO_SCHEMA = "arquivo"
+
+# Bancos anexados (ATTACH) automaticamente às conexões de cada arquivo
+ANEXOS = {MAIN_DB: {ESPERA_SCHEMA: WAITING_DB, ARQUIVO_SCHEMA: ARQUIVO_DB}}
+
+# PRAGMAs que valem por schema e precisam ser repetidos nos bancos anexados
+PRAGMAS_POR_SCHEMA = ("journal_mode", "synchronous", "mmap_size", "cache_size")
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexão que volta para o pool ao chamar close() em vez de fechar."""
+
+    _pool = None
+    _checked_out = False
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            return sqlite3.Connection.close(self)
+        pool.release(self)
+
+    def really_close(self):
+        self._pool = None
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """Pool simples (LIFO) de conexões para um único arquivo de banco."""
+
+    def __init__(self, path, max_idle=POOL_MAX_IDLE, anexos=None):
+        self.path = path
+        self.max_idle = max_idle
+        self.anexos = dict(anexos or {})
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=PRAGMAS["busy_timeout"] / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=PooledConnection,
+        )
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        registrar_funcoes(conn)
+        for schema, arquivo in self.anexos.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (arquivo,))
+            for name in PRAGMAS_POR_SCHEMA:
+                conn.execute(f"PRAGMA {schema}.{name} = {PRAGMAS[name]}")
+        conn.row_factory = sqlite3.Row
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._new_connection()
+        conn.row_factory = sqlite3.Row
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool, descartando transações não commitadas."""
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.really_close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.really_close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=MAIN_DB):
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path, anexos=ANEXOS.get(path))
+        return pool
+
+
+def get_connection(path=MAIN_DB):
+    """Retorna uma conexão do pool (row_factory = sqlite3.Row).
+
+    Chamar close() devolve a conexão ao pool.
+    """
+    return get_pool(path).acquire()
+
+
+def checkpoint(path=MAIN_DB):
+    """Força o checkpoint do WAL para que o arquivo .db fique completo em disco.
+
+    Necessário antes de copiar o .db por fora do SQLite, já que em modo WAL as
+    escritas recentes ficam no arquivo -wal até o checkpoint.
+    """
+    conn = get_connection(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Índice normalizado de tags (tags + linha_tags)
+# ============================================================
+
+def split_tags(tags_field):
+    """Quebra o campo livre 'a, b, c' em tags limpas, sem duplicatas."""
+    if isinstance(tags_field, (list, tuple)):
+        parts = [str(t) for t in tags_field if t is not None]
+    elif isinstance(tags_field, str):
+        parts = tags_field.split(",")
+    else:
+        return []
+    tags = []
+    for part in parts:
+        tag = part.strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def init_tag_index(conn):
+    """Cria as tabelas tags/linha_tags e preenche a partir de linhas.tags na primeira vez."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'linha_tags'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            chave TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tags_chave ON tags(chave)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS linha_tags (
+            linha_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (linha_id, tag_id),
+            FOREIGN KEY (linha_id) REFERENCES linhas(id) ON DELETE CASCADE,
+            FOREIGN KEY (tag_id) REFERENCES tags(id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linha_tags_tag ON linha_tags(tag_id, linha_id)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_delete_tags
+        AFTER DELETE ON linhas
+        BEGIN
+            DELETE FROM linha_tags WHERE linha_id = OLD.id;
+        END
+    """)
+    if not exists:
+        rebuild_tag_index(conn)
+
+
+def rebuild_tag_index(conn):
+    """Reconstrói linha_tags inteira a partir da coluna linhas.tags."""
+    conn.execute("DELETE FROM linha_tags")
+    rows = conn.execute(
+        "SELECT id, tags FROM linhas WHERE tags IS NOT NULL AND tags != ''"
+    ).fetchall()
+    for linha_id, tags_field in rows:
+        sync_linha_tags(conn, linha_id, tags_field)
+
+
+def _tag_id(conn, nome, schema=MAIN_SCHEMA):
+    row = conn.execute(f"SELECT id FROM {schema}.tags WHERE nome = ?", (nome,)).fetchone()
+    if row:
+        return row[0]
+    cursor = conn.execute(
+        f"INSERT INTO {schema}.tags (nome, chave) VALUES (?, ?)", (nome, nome.casefold())
+    )
+    return cursor.lastrowid
+
+
+def sync_linha_tags(conn, linha_id, tags_field, schema=MAIN_SCHEMA):
+    """Atualiza linha_tags da linha. Deve rodar na mesma transação do INSERT/UPDATE."""
+    conn.execute(f"DELETE FROM {schema}.linha_tags WHERE linha_id = ?", (linha_id,))
+    tag_ids = {_tag_id(conn, nome, schema) for nome in split_tags(tags_field)}
+    conn.executemany(
+        f"INSERT INTO {schema}.linha_tags (linha_id, tag_id) VALUES (?, ?)",
+        [(linha_id, tag_id) for tag_id in tag_ids]
+    )
+
+
+def tag_filter_sql(required=(), excluded=(), alias="linhas", schema=MAIN_SCHEMA, bits=None):
+    """
+    Monta as cláusulas para filtrar por tags (sem diferenciar maiúsculas).
+    Tags com bit em `bits` (ver tag_bits) viram um teste único sobre tag_mask;
+    as demais caem no EXISTS sobre linha_tags.
+    """
+    clauses = []
+    params = []
+    if bits:
+        exigida, required = mascara_de_tags(required, bits)
+        proibida, excluded = mascara_de_tags(excluded, bits)
+        if exigida:
+            clauses.append(f"({alias}.tag_mask & ?) = ?")
+            params.extend([exigida, exigida])
+        if proibida:
+            clauses.append(f"({alias}.tag_mask & ?) = 0")
+            params.append(proibida)
+    template = (
+        "{neg}EXISTS (SELECT 1 FROM " + schema + ".linha_tags lt JOIN " + schema + ".tags t ON t.id = lt.tag_id "
+        "WHERE lt.linha_id = {alias}.id AND t.chave = ?)"
+    )
+    for tag in required:
+        clauses.append(template.format(neg="", alias=alias))
+        params.append(tag.strip().casefold())
+    for tag in excluded:
+        clauses.append(template.format(neg="NOT ", alias=alias))
+        params.append(tag.strip().casefold())
+    return clauses, params
+
+
+def ensure_column(conn, table, column, definition):
+    """Adiciona a coluna se ela ainda não existir (bancos antigos não têm todas)."""
+    # table_xinfo também lista colunas geradas (table_info as esconde)
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# ============================================================
+# Máscara de bits das tags canônicas (linhas.tag_mask)
+# ============================================================
+
+# Espelho de cli.TAG_CATEGORIES (e de corretor.py / static/tagsSystem.js), na ordem
+# em que os bits foram distribuídos. Só acrescente no fim: o bit de cada tag fica
+# gravado em tag_bits e nunca muda.
+TAGS_CANONICAS = (
+    "Romance", "Beijo", "Namoro", "Casamento", "Noivado",
+    "Romance do bom", "Fez Filho(s)", "Gravidez",
+    "Ação", "Poder", "Aventura", "Overpower", "Dungeon", "Mecha", "Demônio", "Monstros",
+    "Magia", "Fantasia", "Sobrenatural", "Deuses", "Reencarnar", "Kemonomimi", "Medieval",
+    "Goat", "Isekai", "MC Vilão",
+    "Drama", "Tristeza", "Vergonhoso", "Fofo",
+    "Slice of Life", "Vida Escolar", "Dormitorios", "Morar Juntos",
+    "Esporte", "Musical", "Terror", "Gore", "Comédia", "SciFi", "VR/Jogo", "System",
+    "Shounen", "Shoujo-ai", "Mahou Shoujo", "Yuri", "Gender bender",
+    "Ecchi", "Nudez", "Sexo", "Incesto", "NTR", "Harem", "Nudez Nippleless",
+)
+
+# INTEGER do SQLite tem 64 bits com sinal: o bit 63 deixaria a máscara negativa
+TAG_BITS_MAX = 63
+
+
+def _criar_mascara_tags(conn):
+    """Coluna linhas.tag_mask mantida por triggers em linha_tags, a partir de tag_bits."""
+    ensure_column(conn, "linhas", "tag_mask", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tag_bits (
+            chave TEXT PRIMARY KEY,
+            nome TEXT NOT NULL,
+            bit INTEGER NOT NULL UNIQUE CHECK (bit >= 0 AND bit < 63)
+        )
+    """)
+    # Inserção só liga o bit; remoção recalcula (pode haver "Ação" e "ação" na mesma linha)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linha_tags_mask_insert
+        AFTER INSERT ON linha_tags
+        BEGIN
+            UPDATE linhas
+               SET tag_mask = tag_mask | COALESCE((
+                   SELECT 1 << b.bit FROM tags t JOIN tag_bits b ON b.chave = t.chave
+                    WHERE t.id = NEW.tag_id
+               ), 0)
+             WHERE id = NEW.linha_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linha_tags_mask_delete
+        AFTER DELETE ON linha_tags
+        BEGIN
+            UPDATE linhas
+               SET tag_mask = (
+                   SELECT COALESCE(SUM(DISTINCT 1 << b.bit), 0)
+                     FROM linha_tags lt
+                     JOIN tags t ON t.id = lt.tag_id
+                     JOIN tag_bits b ON b.chave = t.chave
+                    WHERE lt.linha_id = OLD.linha_id
+               )
+             WHERE id = OLD.linha_id;
+        END
+    """)
+    sincronizar_tag_bits(conn)
+
+
+def sincronizar_tag_bits(conn, schema=MAIN_SCHEMA):
+    """
+    Dá um bit para cada tag de TAGS_CANONICAS que ainda não tem e recalcula as
+    máscaras se algo mudou. Retorna quantos bits novos foram distribuídos.
+    """
+    atuais = {row[0] for row in conn.execute(f"SELECT chave FROM {schema}.tag_bits")}
+    proximo = conn.execute(f"SELECT COALESCE(MAX(bit) + 1, 0) FROM {schema}.tag_bits").fetchone()[0]
+    novas = []
+    for nome in TAGS_CANONICAS:
+        chave = nome.casefold()
+        if chave in atuais:
+            continue
+        if proximo >= TAG_BITS_MAX:
+            break
+        novas.append((chave, nome, proximo))
+        atuais.add(chave)
+        proximo += 1
+    if not novas:
+        return 0
+    conn.executemany(f"INSERT INTO {schema}.tag_bits (chave, nome, bit) VALUES (?, ?, ?)", novas)
+    conn.execute(f"""
+        UPDATE {schema}.linhas
+           SET tag_mask = COALESCE((
+               SELECT SUM(DISTINCT 1 << b.bit)
+                 FROM {schema}.linha_tags lt
+                 JOIN {schema}.tags t ON t.id = lt.tag_id
+                 JOIN {schema}.tag_bits b ON b.chave = t.chave
+                WHERE lt.linha_id = linhas.id
+           ), 0)
+    """)
+    return len(novas)
+
+
+def tag_bits(conn, schema=MAIN_SCHEMA):
+    """{chave (casefold): bit} das tags canônicas."""
+    return dict(conn.execute(f"SELECT chave, bit FROM {schema}.tag_bits").fetchall())
+
+
+def mascara_de_tags(tags, bits):
+    """Separa as tags em (máscara das canônicas, lista das que não têm bit)."""
+    mascara = 0
+    restantes = []
+    for tag in tags:
+        bit = bits.get(tag.strip().casefold())
+        if bit is None:
+            restantes.append(tag)
+        else:
+            mascara |= 1 << bit
+    return mascara, restantes
+
+
+# ============================================================
+# Códigos de status, opinião e conteúdo (tabelas de dimensão)
+# ============================================================
+
+# coluna de linhas -> tabela de códigos. linhas guarda o rótulo (o que a API devolve)
+# e o código inteiro em <coluna>_id; os dois são mantidos por triggers.
+DIMENSOES = {
+    "status": "status_codigos",
+    "opiniao": "opiniao_codigos",
+    "conteudo": "conteudo_codigos",
+}
+
+# (rótulo, mídia acompanhada) — "Vendo"/"Lendo" marcam o que aparece nos highlights
+STATUS_PADRAO = (
+    ("Assistir", None), ("Ler", None), ("Vendo", "ANIME"), ("Lendo", "MANGA"),
+    ("Dropado", None), ("Cancelado", None), ("Concluido", None), ("Conheço", None),
+)
+
+# (rótulo, rank) — rank menor = opinião melhor (mesma escala do OPINIAO_PRIORIDADES do CLI)
+OPINIAO_PADRAO = (
+    ("Favorito", 0), ("Muito Bom", 1), ("Recomendo", 2), ("Bom", 3),
+    ("Mediano", 4), ("Ruim", 5), ("Horrivel", 6), ("Não Vi", 7),
+)
+
+# (rótulo, mídia)
+CONTEUDO_PADRAO = (
+    ("Anime", "ANIME"), ("Filme", "FILME"), ("Manga", "MANGA"),
+    ("Manhwa", "MANGA"), ("Webtoon", "MANGA"), ("Novel", "NOVEL"),
+)
+
+# Grafias alternativas aceitas na escrita (chave = lower(trim(rótulo)))
+ALIASES_PADRAO = {
+    "status": {"concluído": "Concluido", "finished": "Concluido", "assistindo": "Vendo",
+               "lido": "Concluido", "conheco": "Conheço"},
+    "opiniao": {"horrível": "Horrivel", "nao vi": "Não Vi"},
+    "conteudo": {"mangá": "Manga", "movie": "Filme"},
+}
+
+
+def _trigger_codigo(coluna, tabela):
+    """Statements de trigger que resolvem NEW.<coluna> para código + rótulo canônico."""
+    chave = f"lower(trim(NEW.{coluna}))"
+    return f"""
+            INSERT OR IGNORE INTO {tabela} (rotulo)
+            SELECT trim(NEW.{coluna})
+             WHERE NEW.{coluna} IS NOT NULL AND trim(NEW.{coluna}) != ''
+               AND NOT EXISTS (SELECT 1 FROM rotulo_aliases
+                                WHERE dimensao = '{coluna}' AND chave = {chave});
+            INSERT OR IGNORE INTO rotulo_aliases (dimensao, chave, codigo)
+            SELECT '{coluna}', {chave}, id FROM {tabela} WHERE rotulo = trim(NEW.{coluna});
+            UPDATE linhas
+               SET {coluna}_id = (SELECT codigo FROM rotulo_aliases
+                                   WHERE dimensao = '{coluna}' AND chave = {chave}),
+                   {coluna} = COALESCE((SELECT d.rotulo FROM rotulo_aliases a
+                                          JOIN {tabela} d ON d.id = a.codigo
+                                         WHERE a.dimensao = '{coluna}' AND a.chave = {chave}),
+                                       NEW.{coluna})
+             WHERE id = NEW.id;"""
+
+
+def _criar_codigos(conn):
+    """Tabelas de dimensão, colunas <coluna>_id em linhas e triggers de resolução na escrita."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS status_codigos (
+            id INTEGER PRIMARY KEY,
+            rotulo TEXT NOT NULL UNIQUE,
+            midia TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS opiniao_codigos (
+            id INTEGER PRIMARY KEY,
+            rotulo TEXT NOT NULL UNIQUE,
+            rank INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conteudo_codigos (
+            id INTEGER PRIMARY KEY,
+            rotulo TEXT NOT NULL UNIQUE,
+            midia TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rotulo_aliases (
+            dimensao TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            codigo INTEGER NOT NULL,
+            PRIMARY KEY (dimensao, chave)
+        ) WITHOUT ROWID
+    """)
+    conn.executemany("INSERT OR IGNORE INTO status_codigos (rotulo, midia) VALUES (?, ?)", STATUS_PADRAO)
+    conn.executemany("INSERT OR IGNORE INTO opiniao_codigos (rotulo, rank) VALUES (?, ?)", OPINIAO_PADRAO)
+    conn.executemany("INSERT OR IGNORE INTO conteudo_codigos (rotulo, midia) VALUES (?, ?)", CONTEUDO_PADRAO)
+    for coluna, tabela in DIMENSOES.items():
+        conn.execute(f"""
+            INSERT OR IGNORE INTO rotulo_aliases (dimensao, chave, codigo)
+            SELECT ?, lower(rotulo), id FROM {tabela}
+        """, (coluna,))
+        conn.executemany(f"""
+            INSERT OR IGNORE INTO rotulo_aliases (dimensao, chave, codigo)
+            SELECT ?, ?, id FROM {tabela} WHERE rotulo = ?
+        """, [(coluna, alias, rotulo) for alias, rotulo in ALIASES_PADRAO[coluna].items()])
+        ensure_column(conn, "linhas", f"{coluna}_id", f"INTEGER REFERENCES {tabela}(id)")
+
+    corpo = "".join(_trigger_codigo(coluna, tabela) for coluna, tabela in DIMENSOES.items())
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_codigos_insert
+        AFTER INSERT ON linhas
+        BEGIN{corpo}
+        END
+    """)
+    for coluna, tabela in DIMENSOES.items():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_linhas_{coluna}_codigo_update
+            AFTER UPDATE OF {coluna} ON linhas
+            WHEN NEW.{coluna} IS NOT OLD.{coluna}
+            BEGIN{_trigger_codigo(coluna, tabela)}
+            END
+        """)
+        # Preenche as linhas existentes (rótulos novos viram códigos novos)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {tabela} (rotulo)
+            SELECT DISTINCT trim({coluna}) FROM linhas
+             WHERE {coluna} IS NOT NULL AND trim({coluna}) != ''
+               AND lower(trim({coluna})) NOT IN (SELECT chave FROM rotulo_aliases WHERE dimensao = ?)
+        """, (coluna,))
+        conn.execute(f"""
+            INSERT OR IGNORE INTO rotulo_aliases (dimensao, chave, codigo)
+            SELECT ?, lower(rotulo), id FROM {tabela}
+        """, (coluna,))
+        conn.execute(f"""
+            UPDATE linhas
+               SET {coluna}_id = a.codigo, {coluna} = d.rotulo
+              FROM rotulo_aliases a JOIN {tabela} d ON d.id = a.codigo
+             WHERE a.dimensao = ? AND a.chave = lower(trim(linhas.{coluna}))
+        """, (coluna,))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista_status_id ON linhas(lista_id, status_id)")
+
+
+def codigo(conn, dimensao, rotulo, schema=MAIN_SCHEMA):
+    """Código do rótulo (ou de um alias dele) na dimensão; None se não existir."""
+    row = conn.execute(
+        f"SELECT codigo FROM {schema}.rotulo_aliases WHERE dimensao = ? AND chave = lower(trim(?))",
+        (dimensao, rotulo)
+    ).fetchone()
+    return row[0] if row else None
+
+
+OPERADORES_OPINIAO = (">=", "<=", ">", "<", "=")
+
+# rank cresce de Favorito para Não Vi, então "opinião melhor" é "rank menor"
+OPERADOR_NO_RANK = {">=": "<=", "<=": ">=", ">": "<", "<": ">", "=": "="}
+
+
+def separar_opiniao(expressao):
+    """'>=Bom' -> ('>=', 'Bom'); sem operador vale '='."""
+    expressao = (expressao or "").strip()
+    for op in OPERADORES_OPINIAO:
+        if expressao.startswith(op):
+            return op, expressao[len(op):].strip()
+    return "=", expressao
+
+
+def opiniao_filter_sql(expressao, alias="linhas", schema=MAIN_SCHEMA):
+    """
+    Converte '>=Bom', '<Mediano', 'Favorito' em cláusula sobre opiniao_id usando o rank.
+    "Maior" é opinião melhor, ou seja, rank menor. Retorna (cláusula, params).
+    """
+    operador, expressao = separar_opiniao(expressao)
+    invertido = OPERADOR_NO_RANK[operador]
+    clausula = (
+        f"{alias}.opiniao_id IN (SELECT o.id FROM {schema}.opiniao_codigos o "
+        f"WHERE o.rank {invertido} (SELECT r.rank FROM {schema}.opiniao_codigos r "
+        f"JOIN {schema}.rotulo_aliases a ON a.codigo = r.id "
+        f"WHERE a.dimensao = 'opiniao' AND a.chave = lower(trim(?))))"
+    )
+    return clausula, [expressao]
+
+
+# ============================================================
+# Nome normalizado (linhas.nome_norm) e colação PT_BR
+# ============================================================
+
+def nome_norm(texto):
+    """NFKD sem acentos, casefold e pontuação/espaços colapsados: "Shingeki no Kyojin: Final" -> "shingeki no kyojin final"."""
+    if not isinstance(texto, str):
+        return None
+    decomposto = unicodedata.normalize("NFKD", texto)
+    sem_acento = "".join(ch for ch in decomposto if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", sem_acento.casefold()))
+
+
+def colacao_pt(a, b):
+    """Ordem alfabética sem acentos/maiúsculas; empates desfeitos pelo texto original."""
+    chave_a = (nome_norm(a), a.casefold(), a)
+    chave_b = (nome_norm(b), b.casefold(), b)
+    return (chave_a > chave_b) - (chave_a < chave_b)
+
+
+def registrar_funcoes(conn):
+    """
+    nome_norm(), as funções de sinopse, hlc_agora() e registro_pausado() são
+    usadas pelos triggers de linhas; PT_BR fica disponível para ORDER BY.
+    """
+    conn.create_function("nome_norm", 1, nome_norm, deterministic=True)
+    conn.create_function("sinopse_limpa", 1, limpar_sinopse, deterministic=True)
+    conn.create_function("sinopse_comprimir", 1, comprimir_sinopse, deterministic=True)
+    conn.create_function("sinopse_texto", 1, sinopse_texto, deterministic=True)
+    # Usadas pelos triggers do registro de alterações (não determinísticas)
+    conn.create_function("hlc_agora", 0, relogio.relogio.agora)
+    conn.create_function("registro_pausado", 0, registro_pausado)
+    conn.create_collation("PT_BR", colacao_pt)
+
+
+def _criar_nome_norm(conn):
+    """Coluna nome_norm mantida por triggers e indexada (busca exata e ordenação por nome)."""
+    ensure_column(conn, "linhas", "nome_norm", "TEXT")
+    conn.execute("UPDATE linhas SET nome_norm = nome_norm(nome)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_nome_norm_insert
+        AFTER INSERT ON linhas
+        BEGIN
+            UPDATE linhas SET nome_norm = nome_norm(NEW.nome) WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_nome_norm_update
+        AFTER UPDATE OF nome ON linhas
+        BEGIN
+            UPDATE linhas SET nome_norm = nome_norm(NEW.nome) WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_nome_norm ON linhas(nome_norm)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista_nome_norm ON linhas(lista_id, nome_norm, id)")
+
+
+# ============================================================
+# Busca textual (FTS5) sobre nome, sinônimos, alias e sinopse
+# ============================================================
+
+def init_search_index(conn):
+    """Cria a tabela FTS5 linhas_fts (conteúdo externo = linhas) e os triggers de sincronia."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'linhas_fts'"
+    ).fetchone()
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS linhas_fts USING fts5(
+            nome, sinonimos, alias, sinopse,
+            content = 'linhas',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_fts_insert
+        AFTER INSERT ON linhas
+        BEGIN
+            INSERT INTO linhas_fts (rowid, nome, sinonimos, alias, sinopse)
+            VALUES (NEW.id, NEW.nome, NEW.sinonimos, NEW.alias, NEW.sinopse);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_fts_delete
+        AFTER DELETE ON linhas
+        BEGIN
+            INSERT INTO linhas_fts (linhas_fts, rowid, nome, sinonimos, alias, sinopse)
+            VALUES ('delete', OLD.id, OLD.nome, OLD.sinonimos, OLD.alias, OLD.sinopse);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_fts_update
+        AFTER UPDATE OF nome, sinonimos, alias, sinopse ON linhas
+        BEGIN
+            INSERT INTO linhas_fts (linhas_fts, rowid, nome, sinonimos, alias, sinopse)
+            VALUES ('delete', OLD.id, OLD.nome, OLD.sinonimos, OLD.alias, OLD.sinopse);
+            INSERT INTO linhas_fts (rowid, nome, sinonimos, alias, sinopse)
+            VALUES (NEW.id, NEW.nome, NEW.sinonimos, NEW.alias, NEW.sinopse);
+        END
+    """)
+    if not exists:
+        conn.execute("INSERT INTO linhas_fts (linhas_fts) VALUES ('rebuild')")
+
+
+def fts_query(texto):
+    """Converte o texto digitado em uma expressão MATCH segura (AND + prefixo no último termo)."""
+    termos = re.findall(r"\w+", texto or "")
+    if not termos:
+        return None
+    partes = [f'"{t}"' for t in termos[:-1]]
+    partes.append(f'"{termos[-1]}"*')
+    return " ".join(partes)
+
+
+def search_linhas(conn, texto, limit=20, offset=0, lista_id=None, schema=MAIN_SCHEMA):
+    """Busca ranqueada (bm25, nome pesa mais que sinopse). Retorna (linhas, total)."""
+    match = fts_query(texto)
+    if not match:
+        return [], 0
+    # f.linhas_fts é a coluna oculta da tabela FTS (funciona também no schema anexado)
+    where = "f.linhas_fts MATCH ?"
+    params = [match]
+    if lista_id is not None:
+        where += " AND l.lista_id = ?"
+        params.append(lista_id)
+    total = conn.execute(f"""
+        SELECT COUNT(*)
+          FROM {schema}.linhas_fts f
+          JOIN {schema}.linhas l ON l.id = f.rowid
+         WHERE {where}
+    """, params).fetchone()[0]
+    rows = conn.execute(f"""
+        SELECT l.id, l.lista_id, ls.nome AS lista_nome, l.nome, l.conteudo,
+               l.status, l.opiniao, l.imagem_url,
+               snippet(f.linhas_fts, 3, '[', ']', '…', 12) AS trecho,
+               bm25(f.linhas_fts, 10.0, 5.0, 5.0, 1.0) AS rank
+          FROM {schema}.linhas_fts f
+          JOIN {schema}.linhas l ON l.id = f.rowid
+          LEFT JOIN {schema}.listas ls ON ls.id = l.lista_id
+         WHERE {where}
+         ORDER BY rank
+         LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
+    return [dict(row) for row in rows], total
+
+
+# ============================================================
+# Sinopses: texto puro, comprimido com zlib na tabela lateral sinopses
+# ============================================================
+
+# A AniList devolve a descrição em HTML (<br>, <i>, entidades)
+_QUEBRA_HTML = re.compile(r"<\s*br\s*/?\s*>|<\s*/\s*p\s*>", re.IGNORECASE)
+_TAG_HTML = re.compile(r"<[^>]*>")
+SINOPSE_ZLIB_NIVEL = 9
+
+
+def limpar_sinopse(texto):
+    """HTML da AniList -> texto puro: <br> vira quebra de linha, demais tags somem, entidades são decodificadas."""
+    if not isinstance(texto, str) or texto.strip() in ("", "[]"):
+        return ""
+    texto = html.unescape(_TAG_HTML.sub("", _QUEBRA_HTML.sub("\n", texto)))
+    linhas = [" ".join(linha.split()) for linha in texto.replace("\r", "").split("\n")]
+    # No máximo uma linha em branco entre parágrafos
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(linhas)).strip()
+
+
+def comprimir_sinopse(texto):
+    """Texto limpo e comprimido (BLOB) ou None se não sobrar nada."""
+    limpo = limpar_sinopse(texto)
+    return zlib.compress(limpo.encode("utf-8"), SINOPSE_ZLIB_NIVEL) if limpo else None
+
+
+def sinopse_texto(blob):
+    return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+
+def sinopse_sql(alias="linhas", schema=MAIN_SCHEMA):
+    """Subconsulta que devolve a sinopse (descomprimida) da linha `alias`."""
+    return f"(SELECT sinopse_texto(s.texto) FROM {schema}.sinopses s WHERE s.linha_id = {alias}.id)"
+
+
+# O trigger de UPDATE esvazia linhas.sinopse depois de guardar o texto; esse UPDATE
+# interno não conta como edição (version) nem reindexa a busca.
+_ESVAZIANDO_SINOPSE = "(OLD.sinopse IS NOT NULL AND NEW.sinopse IS NULL)"
+_SINOPSE_ATUAL = "(SELECT sinopse_texto(texto) FROM sinopses WHERE linha_id = {}.id)"
+
+
+def _criar_sinopses(conn):
+    """
+    linhas.sinopse vira só porta de entrada: quem grava nela (INSERT/UPDATE de
+    qualquer rota) tem o texto limpo e comprimido em sinopses pelos triggers, e a
+    coluna volta a NULL. A busca FTS passa a ler do view linhas_busca, que
+    descomprime só as linhas pedidas (snippet). falta_detalhes usa tem_sinopse.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sinopses (
+            linha_id INTEGER PRIMARY KEY,
+            texto BLOB NOT NULL
+        )
+    """)
+    ensure_column(conn, "linhas", "tem_sinopse", "INTEGER NOT NULL DEFAULT 0")
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_linhas_version")
+    conn.execute(f"""
+        CREATE TRIGGER trg_linhas_version
+        AFTER UPDATE OF {', '.join(COLUNAS_VERSIONADAS)} ON linhas
+        WHEN NEW.version IS OLD.version AND NOT {_ESVAZIANDO_SINOPSE}
+        BEGIN
+            UPDATE linhas SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+    """)
+
+    for trigger in ("trg_linhas_fts_insert", "trg_linhas_fts_delete", "trg_linhas_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS linhas_fts")
+
+    conn.execute("""
+        INSERT OR REPLACE INTO sinopses (linha_id, texto)
+        SELECT id, sinopse_comprimir(sinopse) FROM linhas WHERE sinopse_limpa(sinopse) != ''
+    """)
+    conn.execute("UPDATE linhas SET tem_sinopse = id IN (SELECT linha_id FROM sinopses)")
+    conn.execute("UPDATE linhas SET sinopse = NULL WHERE sinopse IS NOT NULL")
+
+    # Coluna gerada não pode olhar outra tabela: falta_detalhes é recriada sobre tem_sinopse
+    conn.execute("DROP INDEX IF EXISTS idx_linhas_sem_detalhes")
+    conn.execute("ALTER TABLE linhas DROP COLUMN falta_detalhes")
+    ensure_column(conn, "linhas", "falta_detalhes",
+                  "INTEGER GENERATED ALWAYS AS (NOT tem_sinopse OR n_sinonimos < 3) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_sem_detalhes ON linhas(lista_id) WHERE falta_detalhes = 1")
+
+    conn.execute("""
+        CREATE VIEW IF NOT EXISTS linhas_busca AS
+        SELECT l.id, l.nome, l.sinonimos, l.alias, sinopse_texto(s.texto) AS sinopse
+          FROM linhas l
+          LEFT JOIN sinopses s ON s.linha_id = l.id
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE linhas_fts USING fts5(
+            nome, sinonimos, alias, sinopse,
+            content = 'linhas_busca',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    # Cada trigger faz tudo na ordem certa (a ordem entre triggers diferentes não é garantida):
+    # o 'delete' do FTS precisa do texto antigo, então sai antes de mexer em sinopses.
+    novo_doc = ("INSERT INTO linhas_fts (rowid, nome, sinonimos, alias, sinopse) "
+                f"VALUES (NEW.id, NEW.nome, NEW.sinonimos, NEW.alias, {_SINOPSE_ATUAL.format('NEW')});")
+    doc_antigo = ("INSERT INTO linhas_fts (linhas_fts, rowid, nome, sinonimos, alias, sinopse) "
+                  f"VALUES ('delete', OLD.id, OLD.nome, OLD.sinonimos, OLD.alias, {_SINOPSE_ATUAL.format('OLD')});")
+    gravar = """
+            INSERT OR REPLACE INTO sinopses (linha_id, texto)
+            SELECT NEW.id, sinopse_comprimir(NEW.sinopse) WHERE sinopse_limpa(NEW.sinopse) != '';
+    """
+    esvaziar = """
+            UPDATE linhas SET tem_sinopse = EXISTS (SELECT 1 FROM sinopses WHERE linha_id = NEW.id)
+             WHERE id = NEW.id;
+            UPDATE linhas SET sinopse = NULL WHERE id = NEW.id AND sinopse IS NOT NULL;
+    """
+    conn.execute(f"""
+        CREATE TRIGGER trg_linhas_sinopse_insert
+        AFTER INSERT ON linhas
+        BEGIN
+            {gravar}
+            {novo_doc}
+            {esvaziar}
+        END
+    """)
+    # sinopse NULL no UPDATE é ignorada (rotas que mandam a linha inteira); '' apaga a sinopse
+    conn.execute(f"""
+        CREATE TRIGGER trg_linhas_sinopse_update
+        AFTER UPDATE OF nome, sinonimos, alias, sinopse ON linhas
+        WHEN NOT {_ESVAZIANDO_SINOPSE}
+        BEGIN
+            {doc_antigo}
+            DELETE FROM sinopses
+             WHERE linha_id = NEW.id AND NEW.sinopse IS NOT NULL AND sinopse_limpa(NEW.sinopse) = '';
+            {gravar}
+            {novo_doc}
+            {esvaziar}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_linhas_sinopse_delete
+        AFTER DELETE ON linhas
+        BEGIN
+            {doc_antigo}
+            DELETE FROM sinopses WHERE linha_id = OLD.id;
+        END
+    """)
+    conn.execute("INSERT INTO linhas_fts (linhas_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO linhas_fts (linhas_fts) VALUES ('optimize')")
+
+
+# ============================================================
+# Ordem das sequências (chaves esparsas)
+# ============================================================
+
+# Distância entre chaves de ordem: inserir/mover no meio usa o ponto médio entre
+# os vizinhos e só quando não sobra espaço a sequência é renumerada.
+SEQUENCIA_GAP = 1024
+
+
+def rebalance_sequencia(conn, sequencia_id):
+    """Renumera a sequência em múltiplos de SEQUENCIA_GAP mantendo a ordem atual."""
+    conn.execute("""
+        UPDATE sequencia_itens
+           SET ordem = r.posicao * ?
+          FROM (SELECT linha_id,
+                       ROW_NUMBER() OVER (ORDER BY ordem, linha_id) AS posicao
+                  FROM sequencia_itens
+                 WHERE sequencia_id = ?) AS r
+         WHERE sequencia_itens.sequencia_id = ?
+           AND sequencia_itens.linha_id = r.linha_id
+    """, (SEQUENCIA_GAP, sequencia_id, sequencia_id))
+
+
+def _vizinhos(conn, sequencia_id, posicao, ignorar=None):
+    """Chaves de ordem antes e depois da posição (1-based), ignorando a linha que está sendo movida."""
+    rows = conn.execute("""
+        SELECT ordem FROM sequencia_itens
+         WHERE sequencia_id = ? AND linha_id IS NOT ?
+         ORDER BY ordem, linha_id
+         LIMIT 2 OFFSET ?
+    """, (sequencia_id, ignorar, max(posicao - 2, 0))).fetchall()
+    if posicao <= 1:
+        return None, rows[0][0] if rows else None
+    anterior = rows[0][0] if rows else None
+    proxima = rows[1][0] if len(rows) > 1 else None
+    return anterior, proxima
+
+
+def chaves_de_ordem(conn, sequencia_id, quantidade=1, posicao=None, ignorar=None):
+    """
+    Gera `quantidade` chaves de ordem para inserir na posição (1-based) da sequência.
+    Sem posição, as chaves vão para o fim. Rebalanceia a sequência se faltar espaço.
+    """
+    for tentativa in range(2):
+        anterior, proxima = (None, None) if posicao is None else _vizinhos(conn, sequencia_id, posicao, ignorar)
+        if posicao is None or (posicao > 1 and anterior is None):
+            # Fim da sequência (ou posição além do último item)
+            ultima = conn.execute(
+                "SELECT MAX(ordem) FROM sequencia_itens WHERE sequencia_id = ? AND linha_id IS NOT ?",
+                (sequencia_id, ignorar)
+            ).fetchone()[0] or 0
+            return [ultima + SEQUENCIA_GAP * i for i in range(1, quantidade + 1)]
+        base = anterior or 0
+        if proxima is None:
+            return [base + SEQUENCIA_GAP * i for i in range(1, quantidade + 1)]
+        passo = (proxima - base) // (quantidade + 1)
+        if passo >= 1:
+            return [base + passo * i for i in range(1, quantidade + 1)]
+        if tentativa == 0:
+            rebalance_sequencia(conn, sequencia_id)
+    # Muitas chaves de uma vez no mesmo ponto: empurra o restante da sequência para abrir espaço
+    conn.execute("""
+        UPDATE sequencia_itens SET ordem = ordem + ?
+         WHERE sequencia_id = ? AND ordem >= ? AND linha_id IS NOT ?
+    """, (SEQUENCIA_GAP * quantidade, sequencia_id, proxima, ignorar))
+    return [base + SEQUENCIA_GAP * i for i in range(1, quantidade + 1)]
+
+
+# ============================================================
+# Migrações versionadas (schema_version)
+# ============================================================
+
+def _criar_tabelas_base(conn, espera=False):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS listas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL
+        )
+    """)
+    coluna_migrated = "migrated INTEGER DEFAULT 0," if espera else ""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS linhas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lista_id INTEGER NOT NULL,
+            nome TEXT NOT NULL,
+            alias TEXT,
+            tags TEXT,
+            conteudo TEXT NOT NULL,
+            status TEXT NOT NULL,
+            episodio INTEGER,
+            opiniao TEXT NOT NULL,
+            imagem_url TEXT,
+            last_highlight TEXT,
+            sinonimos TEXT,
+            sinopse TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            {coluna_migrated}
+            FOREIGN KEY (lista_id) REFERENCES listas(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sequencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            descricao TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sequencia_itens (
+            sequencia_id INTEGER NOT NULL,
+            linha_id INTEGER NOT NULL,
+            ordem INTEGER NOT NULL,
+            PRIMARY KEY (sequencia_id, linha_id),
+            FOREIGN KEY (sequencia_id) REFERENCES sequencias(id) ON DELETE CASCADE,
+            FOREIGN KEY (linha_id) REFERENCES linhas(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _adicionar_colunas_faltantes(conn, espera=False):
+    ensure_column(conn, "linhas", "alias", "TEXT")
+    # ALTER TABLE não aceita DEFAULT CURRENT_TIMESTAMP; o trigger preenche nas novas linhas
+    ensure_column(conn, "linhas", "created_at", "TIMESTAMP")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_created_at
+        AFTER INSERT ON linhas
+        WHEN NEW.created_at IS NULL
+        BEGIN
+            UPDATE linhas SET created_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    """)
+    if espera:
+        ensure_column(conn, "linhas", "migrated", "INTEGER DEFAULT 0")
+
+
+def _criar_indices(conn):
+    # (lista_id, status) também atende consultas só por lista_id (prefixo do índice)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista_status ON linhas(lista_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_nome_nocase ON linhas(nome COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sequencia_itens_linha ON sequencia_itens(linha_id)")
+
+
+def _criar_indices_paginacao(conn):
+    # Paginação por cursor: (lista_id, rowid) para ordem por id e (lista_id, nome) para ordem alfabética
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista ON linhas(lista_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista_nome ON linhas(lista_id, nome COLLATE NOCASE)")
+
+
+def _espacar_sequencias(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sequencia_itens_ordem ON sequencia_itens(sequencia_id, ordem)")
+    for (sequencia_id,) in conn.execute("SELECT DISTINCT sequencia_id FROM sequencia_itens").fetchall():
+        rebalance_sequencia(conn, sequencia_id)
+
+
+# Flags de "item incompleto" calculadas pelo próprio SQLite (colunas geradas VIRTUAL;
+# ALTER TABLE não aceita STORED). Os índices parciais guardam só as linhas incompletas.
+COLUNAS_COMPLETUDE = (
+    ("falta_imagem", "INTEGER GENERATED ALWAYS AS ("
+                     "imagem_url IS NULL OR imagem_url = '' OR instr(imagem_url, 'placeholder.com') > 0) VIRTUAL"),
+    ("n_sinonimos", "INTEGER GENERATED ALWAYS AS ("
+                    "CASE WHEN json_valid(sinonimos) THEN json_array_length(sinonimos) ELSE 0 END) VIRTUAL"),
+    ("falta_detalhes", "INTEGER GENERATED ALWAYS AS ("
+                       "sinopse IS NULL OR trim(sinopse) IN ('', '[]') OR n_sinonimos < 3) VIRTUAL"),
+)
+
+
+def _colunas_de_completude(conn):
+    for coluna, definicao in COLUNAS_COMPLETUDE:
+        ensure_column(conn, "linhas", coluna, definicao)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_sem_imagem ON linhas(lista_id) WHERE falta_imagem = 1")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_sem_detalhes ON linhas(lista_id) WHERE falta_detalhes = 1")
+
+
+# Colunas editadas pelo usuário: mudar qualquer uma delas incrementa linhas.version
+COLUNAS_VERSIONADAS = ("lista_id", "nome", "alias", "tags", "conteudo", "status", "episodio",
+                       "opiniao", "imagem_url", "sinopse", "sinonimos")
+
+
+def _criar_versao(conn):
+    """
+    linhas.version para concorrência otimista (PATCH /linhas/<id> com version).
+    Quem não mexe em version (PUT, /batch, rotas antigas) ganha o +1 pelo trigger;
+    PATCH e /progress já gravam version + 1 e o trigger não repete.
+    """
+    ensure_column(conn, "linhas", "version", "INTEGER NOT NULL DEFAULT 1")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_version
+        AFTER UPDATE OF {', '.join(COLUNAS_VERSIONADAS)} ON linhas
+        WHEN NEW.version IS OLD.version
+        BEGIN
+            UPDATE linhas SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+    """)
+
+
+def _criar_updated_at(conn):
+    """
+    linhas.updated_at: data da última edição, gravada sempre que version muda
+    (pelo trigger de versão ou pelo PATCH). É a idade usada para arquivar.
+    """
+    ensure_column(conn, "linhas", "updated_at", "TEXT")
+    # Linhas antigas: o mais recente entre criação e último destaque
+    conn.execute("""
+        UPDATE linhas
+           SET updated_at = NULLIF(MAX(COALESCE(created_at, ''), COALESCE(last_highlight, '')), '')
+         WHERE updated_at IS NULL
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_linhas_updated_at
+        AFTER UPDATE OF version ON linhas
+        WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE linhas SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = NEW.id;
+        END
+    """)
+
+
+def _coluna_mudou(coluna):
+    """Condição de trigger: a escrita mudou de fato a coluna (não é uma regravação feita por outro trigger)."""
+    if coluna == "sinopse":
+        # NULL no UPDATE é ignorado; qualquer texto gravado conta (o anterior já foi para sinopses)
+        return "NEW.sinopse IS NOT NULL"
+    if coluna in DIMENSOES:
+        # Compara pelo código: o trigger de códigos regrava o alias com o rótulo canônico
+        resolver = (f"COALESCE((SELECT codigo FROM rotulo_aliases WHERE dimensao = '{coluna}'"
+                    f" AND chave = lower(trim({{0}}.{coluna}))), lower(trim({{0}}.{coluna})))")
+        return f"{resolver.format('NEW')} IS NOT {resolver.format('OLD')}"
+    return f"NEW.{coluna} IS NOT OLD.{coluna}"
+
+
+def _criar_versao_por_mudanca(conn):
+    """
+    trg_linhas_version só soma 1 quando uma coluna versionada muda de fato.
+    Antes, cada UPDATE aninhado dos triggers (código + rótulo canônico, nos
+    três _codigo_update e no INSERT) também contava: uma linha nascia com
+    version 5 e um PUT com alias de status somava 2.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS trg_linhas_version")
+    conn.execute(f"""
+        CREATE TRIGGER trg_linhas_version
+        AFTER UPDATE OF {', '.join(COLUNAS_VERSIONADAS)} ON linhas
+        WHEN NEW.version IS OLD.version AND NOT {_ESVAZIANDO_SINOPSE}
+         AND ({' OR '.join(_coluna_mudou(c) for c in COLUNAS_VERSIONADAS)})
+        BEGIN
+            UPDATE linhas SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+    """)
+
+
+def _trocar_indice_status(conn):
+    """
+    O índice de _criar_codigos usava o nome do (lista_id, status) de
+    _criar_indices e o IF NOT EXISTS o pulava. Os filtros de status comparam
+    status_id, então o índice do texto sai e o de código entra com nome
+    próprio (também atende consultas só por lista_id, prefixo do índice).
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_linhas_lista_status")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista_status_id ON linhas(lista_id, status_id)")
+
+
+def _criar_arquivo(conn):
+    """Tabela de linhas arquivadas. As demais colunas de linhas são espelhadas ao arquivar."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS linhas (
+            id INTEGER PRIMARY KEY,
+            lista_id INTEGER NOT NULL,
+            arquivado_em TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_linhas_lista ON linhas(lista_id, id)")
+
+
+# ============================================================
+# Registro de alterações (sincronização entre máquinas; ver alteracoes.py)
+# ============================================================
+
+# Colunas de linhas trocadas entre máquinas (lista_id viaja como o uid da lista)
+COLUNAS_SINCRONIZADAS = COLUNAS_VERSIONADAS
+COLUNAS_SINCRONIZADAS_LISTAS = ("nome",)
+
+# Coluna fictícia do registro que marca a linha/lista como apagada
+COLUNA_APAGADA = "_apagada"
+
+_registro = threading.local()
+
+
+def registro_pausado():
+    return int(getattr(_registro, "pausas", 0) > 0)
+
+
+@contextmanager
+def sem_registro():
+    """
+    Escritas feitas dentro do bloco (nesta thread) não entram em alteracoes:
+    aplicar um changeset e arquivar/desarquivar linhas não são edições do usuário.
+    """
+    _registro.pausas = getattr(_registro, "pausas", 0) + 1
+    try:
+        yield
+    finally:
+        _registro.pausas -= 1
+
+
+def _valor_registrado(tabela, coluna, ref):
+    """Expressão SQL do valor guardado em alteracoes para `coluna` da linha `ref` (NEW/OLD/alias)."""
+    if tabela == "linhas" and coluna == "lista_id":
+        return f"(SELECT uid FROM listas WHERE id = {ref}.lista_id)"
+    if tabela == "linhas" and coluna == "sinopse":
+        # Guardada comprimida, como em sinopses; NULL = sem sinopse
+        return f"sinopse_comprimir({ref}.sinopse)"
+    return f"{ref}.{coluna}"
+
+
+def _registrar_sql(tabela, colunas, valores, uid):
+    """INSERT em alteracoes de várias colunas da mesma linha, com um só carimbo, se o registro não estiver pausado."""
+    selects = " UNION ALL ".join(
+        f"SELECT {i} AS n, '{coluna}' AS coluna, {valor} AS valor"
+        for i, (coluna, valor) in enumerate(zip(colunas, valores))
+    )
+    return f"""
+            INSERT OR REPLACE INTO alteracoes (tabela, uid, coluna, valor, hlc, seq)
+            SELECT '{tabela}', {uid}, c.coluna, c.valor, h.hlc, s.seq + c.n
+              FROM ({selects}) c,
+                   (SELECT hlc_agora() AS hlc) h,
+                   (SELECT COALESCE(MAX(seq), 0) + 1 AS seq FROM alteracoes) s
+             WHERE NOT registro_pausado();"""
+
+
+def _criar_registro_alteracoes(conn):
+    """
+    Registro por campo das edições em listas e linhas, para trocar changesets
+    entre máquinas em vez do banco inteiro:
+
+      - listas.uid / linhas.uid identificam o registro entre máquinas (os ids são
+        locais). Registros que já existiam recebem 'base-<id>', igual em toda
+        cópia do mesmo banco; os novos, um uid aleatório no INSERT;
+      - alteracoes guarda, para cada (tabela, uid, coluna), o último valor com o
+        carimbo HLC de quem o escreveu e seq, a ordem local de gravação (o
+        cursor do export). Remoções gravam a coluna COLUNA_APAGADA;
+      - o que já existia entra com relogio.CARIMBO_BASE e seq 0: nunca vence uma
+        edição, mas permite recriar a linha inteira em outra máquina.
+    """
+    for tabela in ("listas", "linhas"):
+        ensure_column(conn, tabela, "uid", "TEXT")
+        conn.execute(f"UPDATE {tabela} SET uid = 'base-' || id WHERE uid IS NULL")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabela}_uid ON {tabela}(uid)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes (
+            tabela TEXT NOT NULL,
+            uid TEXT NOT NULL,
+            coluna TEXT NOT NULL,
+            valor,
+            hlc TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (tabela, uid, coluna)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alteracoes_seq ON alteracoes(seq)")
+
+    sincronizadas = {"listas": COLUNAS_SINCRONIZADAS_LISTAS, "linhas": COLUNAS_SINCRONIZADAS}
+    for tabela, colunas in sincronizadas.items():
+        for coluna in colunas:
+            valor = ("(SELECT texto FROM sinopses WHERE linha_id = t.id)"
+                     if (tabela, coluna) == ("linhas", "sinopse") else _valor_registrado(tabela, coluna, "t"))
+            conn.execute(f"""
+                INSERT OR IGNORE INTO alteracoes (tabela, uid, coluna, valor, hlc, seq)
+                SELECT '{tabela}', t.uid, '{coluna}', {valor}, ?, 0 FROM {tabela} t
+            """, (relogio.CARIMBO_BASE,))
+
+        # O uid sai no mesmo trigger que registra: a ordem entre triggers não é garantida
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabela}_alteracoes_insert
+            AFTER INSERT ON {tabela}
+            BEGIN
+                UPDATE {tabela} SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id AND uid IS NULL;
+                {_registrar_sql(tabela, colunas, [_valor_registrado(tabela, c, "NEW") for c in colunas],
+                                f"(SELECT uid FROM {tabela} WHERE id = NEW.id)")}
+            END
+        """)
+        for coluna in colunas:
+            # sinopse NULL no UPDATE é ignorada (e é o próprio trigger esvaziando a coluna)
+            condicao = ("NEW.sinopse IS NOT NULL" if (tabela, coluna) == ("linhas", "sinopse")
+                        else f"OLD.{coluna} IS NOT NEW.{coluna}")
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{tabela}_alteracoes_{coluna}
+                AFTER UPDATE OF {coluna} ON {tabela}
+                WHEN {condicao}
+                BEGIN
+                    {_registrar_sql(tabela, [coluna], [_valor_registrado(tabela, coluna, "NEW")], "NEW.uid")}
+                END
+            """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabela}_alteracoes_delete
+            AFTER DELETE ON {tabela}
+            WHEN OLD.uid IS NOT NULL
+            BEGIN
+                {_registrar_sql(tabela, [COLUNA_APAGADA], ["1"], "OLD.uid")}
+            END
+        """)
+
+
+MAIN_MIGRATIONS = [
+    (1, "tabelas base", _criar_tabelas_base),
+    (2, "colunas alias/created_at", _adicionar_colunas_faltantes),
+    (3, "índices de consulta", _criar_indices),
+    (4, "índice de tags", init_tag_index),
+    (5, "busca fts5", init_search_index),
+    (6, "índices de paginação", _criar_indices_paginacao),
+    (7, "ordem esparsa das sequências", _espacar_sequencias),
+    (8, "flags de completude", _colunas_de_completude),
+    (9, "máscara de tags", _criar_mascara_tags),
+    (10, "códigos de status/opinião/conteúdo", _criar_codigos),
+    (11, "nome normalizado", _criar_nome_norm),
+    (12, "versão das linhas", _criar_versao),
+    (13, "data de atualização", _criar_updated_at),
+    (14, "sinopses comprimidas", _criar_sinopses),
+    (15, "registro de alterações", _criar_registro_alteracoes),
+    (16, "versão só em mudanças reais", _criar_versao_por_mudanca),
+    (17, "índice (lista_id, status_id)", _trocar_indice_status),
+]
+
+WAITING_MIGRATIONS = [
+    (1, "tabelas base", lambda conn: _criar_tabelas_base(conn, espera=True)),
+    (2, "colunas alias/created_at/migrated", lambda conn: _adicionar_colunas_faltantes(conn, espera=True)),
+    (3, "índices de consulta", _criar_indices),
+    (4, "índice de tags", init_tag_index),
+    (5, "busca fts5", init_search_index),
+    (6, "índices de paginação", _criar_indices_paginacao),
+    (7, "ordem esparsa das sequências", _espacar_sequencias),
+    (8, "flags de completude", _colunas_de_completude),
+    (9, "máscara de tags", _criar_mascara_tags),
+    (10, "códigos de status/opinião/conteúdo", _criar_codigos),
+    (11, "nome normalizado", _criar_nome_norm),
+    (12, "versão das linhas", _criar_versao),
+    (13, "data de atualização", _criar_updated_at),
+    (14, "sinopses comprimidas", _criar_sinopses),
+    (15, "versão só em mudanças reais", _criar_versao_por_mudanca),
+    (16, "índice (lista_id, status_id)", _trocar_indice_status),
+]
+
+
+ARQUIVO_MIGRATIONS = [
+    (1, "tabela do arquivo", _criar_arquivo),
+    (2, "sinopse comprimida no arquivo", lambda conn: ensure_column(conn, "linhas", "sinopse_z", "BLOB")),
+]
+
+
+def _criar_historico(conn):
+    """
+    commits: os commits já indexados, na ordem em que foram lidos (ordem);
+    historico: o que cada commit mudou em cada linha (criada, alterada com
+    coluna/antes/depois, arquivada, desarquivada, removida); mensagens: as
+    mensagens do commit que citam a linha ("Atualizando Linha: X id: N").
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS commits (
+            sha TEXT PRIMARY KEY,
+            ordem INTEGER NOT NULL UNIQUE,
+            quando TEXT NOT NULL,
+            assunto TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS historico (
+            linha_id INTEGER NOT NULL,
+            ordem INTEGER NOT NULL,
+            evento TEXT NOT NULL,
+            coluna TEXT,
+            antes,
+            depois
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_historico_linha ON historico(linha_id, ordem)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mensagens (
+            linha_id INTEGER NOT NULL,
+            ordem INTEGER NOT NULL,
+            texto TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_linha ON mensagens(linha_id, ordem)")
+
+
+HISTORICO_MIGRATIONS = [
+    (1, "histórico do git", _criar_historico),
+]
+
+
+def schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(path, migrations):
+    """Aplica, em ordem, as migrações com versão maior que a atual.
+
+    Cada passo roda na sua própria transação junto com o registro em
+    schema_version: ou o passo inteiro é aplicado, ou nada muda.
+    Retorna a lista de (versão, nome) aplicadas.
+    """
+    conn = get_connection(path)
+    aplicadas = []
+    try:
+        atual = schema_version(conn)
+        conn.commit()
+        for version, nome, step in migrations:
+            if version <= atual:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                step(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, nome) VALUES (?, ?)",
+                    (version, nome)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            aplicadas.append((version, nome))
+    finally:
+        conn.close()
+    return aplicadas
@@ -0,0 +1,282 @@
+"""
+exportacao.py — Exportação textual e determinística dos bancos para o git.
+
+Em vez do .db binário (uma cópia inteira a cada commit), o git guarda
+EXPORT_DIR/<banco>/:
+
+  - manifesto.json: SQL de criação de tabelas, índices, views e triggers (na
+    ordem do sqlite_master), colunas exportadas, contagem e sha256 de cada tabela;
+  - <tabela>.ndjson: uma linha JSON por registro, ordenada pela chave primária.
+
+A mesma base sempre gera os mesmos bytes, então o diff de um commit tem só os
+registros que mudaram. Colunas geradas, tabelas internas do FTS e estatísticas
+do ANALYZE ficam de fora (são recalculadas na importação e na manutenção).
+Sinopses comprimidas (zlib) vão como texto legível.
+
+importar() reconstrói o .db a partir do texto: cria as tabelas, copia os
+registros sem disparar triggers (eles só são criados depois) e reconstrói o
+índice de busca. O app chama restaurar_desatualizados() ao subir: o .db é
+refeito quando o manifesto é mais novo que ele (ex.: depois de um git pull).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+import database
+
+EXPORT_DIR = os.environ.get("LISTIT_EXPORT_DIR", "dados")
+MANIFESTO = "manifesto.json"
+VERSAO_FORMATO = 1
+
+# Bancos versionados no git
+BANCOS = (database.MAIN_DB, database.WAITING_DB, database.ARQUIVO_DB)
+
+# BLOBs que guardam texto comprimido com zlib: exportados como texto
+TEXTO_COMPRIMIDO = {("sinopses", "texto"), ("linhas", "sinopse_z")}
+
+# Tabelas criadas pelo próprio SQLite: sqlite_sequence só tem os dados exportados
+TABELAS_INTERNAS = ("sqlite_sequence",)
+
+
+class ExportacaoError(Exception):
+    """Exportação ausente, de formato desconhecido ou que não pôde ser importada."""
+
+
+def diretorio(banco):
+    return os.path.join(EXPORT_DIR, os.path.splitext(os.path.basename(banco))[0])
+
+
+def _mtime_banco(banco):
+    """Última alteração do banco, contando o -wal (em WAL o .db só muda no checkpoint)."""
+    return max((os.path.getmtime(p) for p in (banco, banco + "-wal") if os.path.exists(p)), default=0)
+
+
+def _gravar_se_mudou(caminho, texto):
+    """Grava só se o conteúdo mudou (mantém mtime e não acorda o git à toa). Retorna True se gravou."""
+    dados = texto.encode("utf-8")
+    if os.path.exists(caminho):
+        with open(caminho, "rb") as f:
+            if f.read() == dados:
+                return False
+    with open(caminho + ".tmp", "wb") as f:
+        f.write(dados)
+    os.replace(caminho + ".tmp", caminho)
+    return True
+
+
+# ============================================================
+# Exportação
+# ============================================================
+
+def _valor_para_texto(tabela, coluna, valor):
+    if not isinstance(valor, bytes):
+        return valor
+    if (tabela, coluna) in TEXTO_COMPRIMIDO:
+        return zlib.decompress(valor).decode("utf-8")
+    return {"$blob": base64.b64encode(valor).decode("ascii")}
+
+
+def _texto_para_valor(tabela, coluna, valor):
+    if isinstance(valor, dict) and "$blob" in valor:
+        return base64.b64decode(valor["$blob"])
+    if (tabela, coluna) in TEXTO_COMPRIMIDO and isinstance(valor, str):
+        return zlib.compress(valor.encode("utf-8"), database.SINOPSE_ZLIB_NIVEL)
+    return valor
+
+
+def _colunas(conn, tabela):
+    """Colunas gravadas (hidden 0); as geradas (2 e 3) o SQLite recalcula."""
+    return [row[1] for row in conn.execute(f'PRAGMA table_xinfo("{tabela}")') if row[6] == 0]
+
+
+def _ordem(conn, tabela, colunas):
+    """Chave primária (na ordem da PK) seguida das demais colunas: ordem total e estável."""
+    pk = [row[1] for row in sorted(conn.execute(f'PRAGMA table_info("{tabela}")'), key=lambda r: r[5]) if row[5]]
+    return ", ".join(f'"{c}"' for c in pk + [c for c in colunas if c not in pk])
+
+
+def _ndjson(conn, tabela, colunas):
+    linhas = []
+    cursor = conn.execute(
+        f'SELECT {", ".join(chr(34) + c + chr(34) for c in colunas)} FROM "{tabela}" '
+        f"ORDER BY {_ordem(conn, tabela, colunas)}"
+    )
+    for row in cursor:
+        registro = {c: _valor_para_texto(tabela, c, v) for c, v in zip(colunas, row)}
+        linhas.append(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+    return "".join(linhas), len(linhas)
+
+
+def exportar(banco=database.MAIN_DB):
+    """
+    Escreve a exportação de `banco` em diretorio(banco) a partir de um único
+    snapshot de leitura. Retorna os arquivos que mudaram.
+    """
+    if not os.path.exists(banco):
+        return []
+    destino = diretorio(banco)
+    os.makedirs(destino, exist_ok=True)
+    conn = sqlite3.connect(f"file:{banco}?mode=ro", uri=True,
+                           timeout=database.PRAGMAS["busy_timeout"] / 1000)
+    try:
+        conn.execute("BEGIN")
+        sombra = {row[1] for row in conn.execute("PRAGMA main.table_list") if row[2] == "shadow"}
+        objetos = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY rowid"
+        ).fetchall()
+        tabelas, outros, conteudos = [], [], {}
+        for tipo, nome, sql in objetos:
+            if nome in sombra or nome.startswith("sqlite_stat"):
+                continue
+            if tipo != "table" or sql.upper().startswith("CREATE VIRTUAL"):
+                outros.append({"tipo": tipo, "nome": nome, "sql": sql})
+                continue
+            colunas = _colunas(conn, nome)
+            texto, total = _ndjson(conn, nome, colunas)
+            conteudos[nome] = texto
+            tabelas.append({
+                "nome": nome,
+                "sql": None if nome in TABELAS_INTERNAS else sql,
+                "colunas": colunas,
+                "linhas": total,
+                "sha256": hashlib.sha256(texto.encode("utf-8")).hexdigest(),
+            })
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    alterados = []
+    for nome, texto in conteudos.items():
+        caminho = os.path.join(destino, f"{nome}.ndjson")
+        if _gravar_se_mudou(caminho, texto):
+            alterados.append(caminho)
+    # Tabelas que deixaram de existir (migração que removeu a tabela)
+    for arquivo in sorted(os.listdir(destino)):
+        if arquivo.endswith(".ndjson") and arquivo[:-len(".ndjson")] not in conteudos:
+            os.remove(os.path.join(destino, arquivo))
+            alterados.append(os.path.join(destino, arquivo))
+
+    manifesto = {
+        "formato": VERSAO_FORMATO,
+        "banco": os.path.basename(banco),
+        "auto_vacuum": auto_vacuum,
+        "tabelas": tabelas,
+        "objetos": outros,
+    }
+    caminho = os.path.join(destino, MANIFESTO)
+    if _gravar_se_mudou(caminho, json.dumps(manifesto, ensure_ascii=False, indent=1) + "\n"):
+        alterados.append(caminho)
+    # O manifesto fica com a "idade" do banco: só um manifesto vindo de fora é mais novo
+    quando = _mtime_banco(banco)
+    os.utime(caminho, (quando, quando))
+    return alterados
+
+
+def exportar_todos():
+    alterados = []
+    for banco in BANCOS:
+        alterados += exportar(banco)
+    return alterados
+
+
+# ============================================================
+# Importação
+# ============================================================
+
+def ler_manifesto(banco):
+    caminho = os.path.join(diretorio(banco), MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        manifesto = json.load(f)
+    if manifesto.get("formato") != VERSAO_FORMATO:
+        raise ExportacaoError(f"{caminho}: formato {manifesto.get('formato')} desconhecido")
+    return manifesto
+
+
+def desatualizado(banco):
+    """True se existe exportação e ela é mais nova que o banco (ou o banco não existe)."""
+    caminho = os.path.join(diretorio(banco), MANIFESTO)
+    if not os.path.exists(caminho):
+        return False
+    return not os.path.exists(banco) or os.path.getmtime(caminho) > _mtime_banco(banco)
+
+
+def importar(banco=database.MAIN_DB):
+    """
+    Reconstrói `banco` a partir da exportação. O banco novo é montado num
+    arquivo temporário e só substitui o atual no fim; use antes de abrir
+    conexões com ele (o app chama na inicialização). Retorna o total de registros.
+    """
+    manifesto = ler_manifesto(banco)
+    if manifesto is None:
+        raise ExportacaoError(f"Sem exportação de {banco} em {diretorio(banco)}")
+    origem = diretorio(banco)
+    temporario = banco + ".importando"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    total = 0
+    conn = sqlite3.connect(temporario)
+    try:
+        # O 'rebuild' do FTS lê a view de busca, que usa sinopse_texto()
+        database.registrar_funcoes(conn)
+        conn.execute(f"PRAGMA auto_vacuum = {int(manifesto.get('auto_vacuum', 0))}")
+        conn.execute("BEGIN")
+        for tabela in manifesto["tabelas"]:
+            if tabela["sql"]:
+                conn.execute(tabela["sql"])
+        for tabela in manifesto["tabelas"]:
+            nome, colunas = tabela["nome"], tabela["colunas"]
+            caminho = os.path.join(origem, f"{nome}.ndjson")
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            if hashlib.sha256(conteudo).hexdigest() != tabela["sha256"]:
+                raise ExportacaoError(f"{caminho} não confere com o manifesto (sha256)")
+            registros = [json.loads(linha) for linha in conteudo.decode("utf-8").splitlines() if linha.strip()]
+            if nome == "sqlite_sequence":
+                # Já preenchida pelos INSERTs com id explícito; os contadores exportados valem mais
+                conn.execute("DELETE FROM sqlite_sequence")
+            conn.executemany(
+                f'INSERT INTO "{nome}" ({", ".join(chr(34) + c + chr(34) for c in colunas)}) '
+                f"VALUES ({', '.join('?' for _ in colunas)})",
+                ([_texto_para_valor(nome, c, r.get(c)) for c in colunas] for r in registros)
+            )
+            total += len(registros)
+        # Índices, views, triggers e tabelas virtuais só depois dos dados: nada dispara na cópia
+        for objeto in manifesto["objetos"]:
+            conn.execute(objeto["sql"])
+            if objeto["tipo"] == "table" and "USING FTS5" in objeto["sql"].upper():
+                conn.execute(f'INSERT INTO "{objeto["nome"]}" ("{objeto["nome"]}") VALUES (\'rebuild\')')
+        conn.commit()
+        resultado = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if resultado != "ok":
+            raise ExportacaoError(f"Banco importado não passou no integrity_check: {resultado}")
+    except (sqlite3.Error, OSError, ValueError, KeyError, ExportacaoError) as e:
+        conn.close()
+        os.remove(temporario)
+        if isinstance(e, ExportacaoError):
+            raise
+        raise ExportacaoError(f"Falha ao importar {origem}: {e}") from e
+    conn.close()
+
+    # Um -wal antigo aplicado sobre o banco novo o corromperia
+    for resto in (banco + "-wal", banco + "-shm"):
+        if os.path.exists(resto):
+            os.remove(resto)
+    os.replace(temporario, banco)
+    return total
+
+
+def restaurar_desatualizados():
+    """Reimporta os bancos cuja exportação é mais nova. Retorna [(banco, registros)]."""
+    restaurados = []
+    for banco in BANCOS:
+        if desatualizado(banco):
+            restaurados.append((banco, importar(banco)))
+    return restaurados
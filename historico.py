@@ -0,0 +1,281 @@
+"""
+historico.py — Índice do histórico do git para consultar estados passados das linhas.
+
+Cada escrita vira um commit (sincronia_git.py), então o git já guarda toda a
+história das listas. atualizar() percorre só os commits novos desde a última
+vez e grava em historico.db (local, fora do git; pode ser apagado e refeito):
+
+  - o que mudou em cada linha, comparando o commit com o pai: a exportação
+    textual (EXPORT_DIR/list_it e EXPORT_DIR/arquivo, linhas.ndjson) ou, nos
+    commits antigos, o list_it.db binário;
+  - as mensagens do commit que citam a linha ("Atualizando Linha: X id: N",
+    inclusive as listadas no corpo dos commits agrupados).
+
+linha(linha_id) responde "quando terminei X" com uma consulta indexada, sem
+abrir blobs antigos. O commit em si é lido uma vez só, na indexação.
+"""
+
+import json
+import os
+import posixpath
+import re
+import sqlite3
+import tempfile
+import threading
+
+import database
+import exportacao
+import repositorio
+import sincronia_git
+
+HISTORICO_DB = database.HISTORICO_DB
+
+# Colunas acompanhadas (a sinopse fica de fora: texto longo e quase sempre da AniList)
+COLUNAS = ("lista_id", "nome", "alias", "tags", "conteudo", "status", "episodio",
+           "opiniao", "imagem_url", "sinonimos", "last_highlight")
+
+
+def _caminho_git(banco, arquivo):
+    return posixpath.join(exportacao.diretorio(banco).replace(os.sep, "/"), arquivo)
+
+
+# Onde as linhas estão em cada commit: exportação textual ou, antes dela, os .db
+LINHAS_EXPORTADAS = {
+    False: _caminho_git(database.MAIN_DB, "linhas.ndjson"),
+    True: _caminho_git(database.ARQUIVO_DB, "linhas.ndjson"),
+}
+BANCOS_ANTIGOS = {False: database.MAIN_DB, True: database.ARQUIVO_DB}
+CAMINHOS = tuple(LINHAS_EXPORTADAS.values()) + tuple(BANCOS_ANTIGOS.values())
+
+# "Atualizando Linha: Nome id: 12", "Marcando highlight na Linha: ...", "Atualizando URL da Imagem: ..."
+_MENSAGEM_DE_LINHA = re.compile(r"^(?:- )?(?P<acao>.*?(?:Linha|URL da Imagem)): (?P<nome>.*) id: (?P<id>\d+)")
+
+
+class HistoricoError(Exception):
+    """Repositório git indisponível para indexar."""
+
+
+# ============================================================
+# Estado das linhas num commit
+# ============================================================
+
+def _linhas_do_ndjson(conteudo):
+    linhas = {}
+    for texto in conteudo.decode("utf-8").splitlines():
+        if texto.strip():
+            registro = json.loads(texto)
+            linhas[registro["id"]] = {c: registro[c] for c in COLUNAS if c in registro}
+    return linhas
+
+
+def _linhas_do_banco(conteudo):
+    """Linhas de um .db commitado (precisa ir para um arquivo temporário para o sqlite abrir)."""
+    descritor, caminho = tempfile.mkstemp(suffix=".db")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            f.write(conteudo)
+        conn = sqlite3.connect(f"file:{caminho}?mode=ro&immutable=1", uri=True)
+        try:
+            existentes = {row[1] for row in conn.execute("PRAGMA table_info(linhas)")}
+            colunas = [c for c in COLUNAS if c in existentes]
+            if not colunas:
+                return {}
+            return {
+                row[0]: dict(zip(colunas, row[1:]))
+                for row in conn.execute(f"SELECT id, {', '.join(colunas)} FROM linhas")
+            }
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        # Blob que não é um banco válido (commit no meio de uma escrita antiga)
+        return {}
+    finally:
+        os.remove(caminho)
+
+
+def estado(repo, sha):
+    """{linha_id: (arquivada, {coluna: valor})} no commit `sha` (vazio se sha é None)."""
+    resultado = {}
+    if sha is None:
+        return resultado
+    for arquivada in (False, True):
+        conteudo = repo.ler(sha, LINHAS_EXPORTADAS[arquivada])
+        if conteudo is not None:
+            linhas = _linhas_do_ndjson(conteudo)
+        else:
+            conteudo = repo.ler(sha, BANCOS_ANTIGOS[arquivada])
+            linhas = _linhas_do_banco(conteudo) if conteudo is not None else {}
+        for linha_id, valores in linhas.items():
+            resultado[linha_id] = (arquivada, valores)
+    return resultado
+
+
+def diferencas(antes, depois):
+    """[(linha_id, evento, coluna, antes, depois)] entre dois estados."""
+    eventos = []
+    for linha_id in sorted(antes.keys() | depois.keys()):
+        if linha_id not in antes:
+            eventos.append((linha_id, "criada", None, None, None))
+            continue
+        if linha_id not in depois:
+            eventos.append((linha_id, "removida", None, None, None))
+            continue
+        (arquivada_antes, valores_antes), (arquivada_depois, valores_depois) = antes[linha_id], depois[linha_id]
+        if arquivada_antes != arquivada_depois:
+            eventos.append((linha_id, "arquivada" if arquivada_depois else "desarquivada", None, None, None))
+        # Só colunas presentes nos dois lados: uma migração nova não é edição
+        for coluna in COLUNAS:
+            if coluna in valores_antes and coluna in valores_depois and valores_antes[coluna] != valores_depois[coluna]:
+                eventos.append((linha_id, "alterada", coluna, valores_antes[coluna], valores_depois[coluna]))
+    return eventos
+
+
+def mensagens_de_linha(mensagem):
+    """[(linha_id, texto)] das linhas citadas no assunto e no corpo de um commit."""
+    return [(int(m.group("id")), texto.removeprefix("- "))
+            for texto in mensagem.splitlines()
+            for m in [_MENSAGEM_DE_LINHA.match(texto)] if m]
+
+
+# ============================================================
+# Indexação incremental
+# ============================================================
+
+_indexando = threading.Lock()
+_iniciar_lock = threading.Lock()
+_iniciado = False
+
+
+def _ultimo_commit(conn):
+    row = conn.execute("SELECT sha, ordem FROM commits ORDER BY ordem DESC LIMIT 1").fetchone()
+    return (row[0], row[1]) if row else (None, 0)
+
+
+def _limpar(conn):
+    with repositorio.transacao(conn):
+        for tabela in ("historico", "mensagens", "commits"):
+            conn.execute(f"DELETE FROM {tabela}")
+
+
+def atualizar():
+    """
+    Indexa os commits novos (cada um na sua transação: uma interrupção não
+    perde o que já foi feito). Retorna quantos foram indexados, ou None se
+    outra indexação está em andamento.
+    """
+    if not _indexando.acquire(blocking=False):
+        return None
+    try:
+        try:
+            repo = sincronia_git.repositorio()
+        except sincronia_git.GitError as e:
+            raise HistoricoError(str(e)) from e
+        conn = database.get_connection(HISTORICO_DB)
+        try:
+            ultimo, ordem = _ultimo_commit(conn)
+            if ultimo is not None and not repo.no_historico(ultimo):
+                # O último commit indexado saiu do histórico (rebase, amend, clone novo): refaz do zero
+                _limpar(conn)
+                ultimo, ordem = None, 0
+            commits = repo.commits(ultimo, CAMINHOS)
+
+            anterior = (None, {})
+            for sha, quando, mensagem, pai in commits:
+                estado_pai = anterior[1] if anterior[0] == pai else estado(repo, pai)
+                estado_novo = estado(repo, sha)
+                ordem += 1
+                with repositorio.transacao(conn):
+                    conn.execute("INSERT INTO commits (sha, ordem, quando, assunto) VALUES (?, ?, ?, ?)",
+                                 (sha, ordem, quando, mensagem.splitlines()[0] if mensagem else ""))
+                    conn.executemany(
+                        "INSERT INTO historico (linha_id, ordem, evento, coluna, antes, depois) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(linha_id, ordem, evento, coluna, a, d)
+                         for linha_id, evento, coluna, a, d in diferencas(estado_pai, estado_novo)]
+                    )
+                    conn.executemany(
+                        "INSERT INTO mensagens (linha_id, ordem, texto) VALUES (?, ?, ?)",
+                        [(linha_id, ordem, texto) for linha_id, texto in mensagens_de_linha(mensagem)]
+                    )
+                anterior = (sha, estado_novo)
+            return len(commits)
+        except sincronia_git.GitError as e:
+            raise HistoricoError(str(e)) from e
+        finally:
+            conn.close()
+    finally:
+        _indexando.release()
+
+
+def iniciar():
+    """Indexa em segundo plano ao subir, uma vez por processo (a primeira vez pode ler muitos commits)."""
+    global _iniciado
+    with _iniciar_lock:
+        if _iniciado:
+            return
+        _iniciado = True
+
+    def indexar():
+        try:
+            atualizar()
+        except HistoricoError:
+            pass
+    threading.Thread(target=indexar, name="historico", daemon=True).start()
+
+
+# ============================================================
+# Consultas
+# ============================================================
+
+def linha(linha_id, coluna=None, limite=None):
+    """
+    Commits que mexeram na linha, do mais recente ao mais antigo:
+    [{sha, quando, assunto, mensagens: [...], eventos: [{evento, coluna, antes, depois}]}].
+    Com `coluna`, só os commits que a alteraram (ex.: status -> quando terminei).
+    """
+    conn = database.get_connection(HISTORICO_DB)
+    try:
+        filtro, params = ("AND h.coluna = ?", [coluna]) if coluna else ("", [])
+        eventos = conn.execute(f"""
+            SELECT h.ordem, h.evento, h.coluna, h.antes, h.depois
+              FROM historico h
+             WHERE h.linha_id = ? {filtro}
+             ORDER BY h.ordem DESC, h.rowid
+        """, [linha_id] + params).fetchall()
+        ordens = {row[0] for row in eventos}
+        if not coluna:
+            ordens |= {row[0] for row in conn.execute("SELECT ordem FROM mensagens WHERE linha_id = ?", (linha_id,))}
+        ordens = sorted(ordens, reverse=True)[:limite] if limite else sorted(ordens, reverse=True)
+        if not ordens:
+            return []
+        commits = {
+            row[0]: {"sha": row[1], "quando": row[2], "assunto": row[3], "mensagens": [], "eventos": []}
+            for row in conn.execute(
+                "SELECT ordem, sha, quando, assunto FROM commits WHERE ordem IN (SELECT value FROM json_each(?))",
+                (json.dumps(ordens),)
+            )
+        }
+        for ordem, evento, col, antes, depois in eventos:
+            if ordem in commits:
+                commits[ordem]["eventos"].append({"evento": evento, "coluna": col, "antes": antes, "depois": depois})
+        for ordem, texto in conn.execute(
+            "SELECT ordem, texto FROM mensagens WHERE linha_id = ? ORDER BY ordem, rowid", (linha_id,)
+        ):
+            if ordem in commits:
+                commits[ordem]["mensagens"].append(texto)
+        return [commits[o] for o in ordens if o in commits]
+    finally:
+        conn.close()
+
+
+def status():
+    conn = database.get_connection(HISTORICO_DB)
+    try:
+        ultimo = conn.execute("SELECT sha, quando FROM commits ORDER BY ordem DESC LIMIT 1").fetchone()
+        return {
+            "commits_indexados": conn.execute("SELECT COUNT(*) FROM commits").fetchone()[0],
+            "ultimo_commit": ultimo[0] if ultimo else None,
+            "ultimo_commit_em": ultimo[1] if ultimo else None,
+            "indexando": _indexando.locked(),
+        }
+    finally:
+        conn.close()
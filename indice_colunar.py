@@ -0,0 +1,344 @@
+"""
+indice_colunar.py — Índice em memória das linhas do principal, em colunas NumPy.
+
+O /query filtra e ordena sobre arrays (um por coluna) em vez de montar um dict
+por linha: lista, status e conteúdo viram comparações de inteiros, a opinião
+vira o rank de opiniao_codigos, as tags canônicas um teste de bits sobre
+tag_mask e o nome um código no vocabulário de nome_norm. As tags sem bit ficam
+num índice invertido (chave -> ids).
+
+O índice se atualiza sozinho: cada consulta confere PRAGMA data_version (muda
+quando qualquer outra conexão grava no banco, inclusive scripts de fora do
+servidor) e, se mudou, compara (id, version) com o banco e relê só as linhas
+novas ou alteradas. Linhas que sumiram (removidas ou arquivadas) saem do índice.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import database
+
+# Linha sem opinião/código: rank depois de "Não Vi"; código 0 (ids das tabelas de códigos começam em 1)
+SEM_RANK = np.iinfo(np.int16).max
+SEM_CODIGO = 0
+
+ORDENS = ("id", "-id", "nome", "-nome", "opiniao", "-opiniao")
+
+# Trechos de nome com resultado guardado (zerados quando o vocabulário cresce)
+TRECHOS_MAX = 256
+
+# Colunas do índice; a posição de uma linha é a mesma em todas
+COLUNAS = {
+    "id": np.int64,
+    "version": np.int64,
+    "lista_id": np.int64,
+    "status_id": np.int32,
+    "conteudo_id": np.int32,
+    "opiniao_rank": np.int16,
+    "tag_mask": np.int64,
+    "nome_id": np.int32,
+    "viva": np.bool_,
+}
+
+# Opinião melhor = rank menor (ver database.OPERADOR_NO_RANK)
+_COMPARA_RANK = {
+    "<=": np.less_equal, ">=": np.greater_equal, "<": np.less, ">": np.greater, "=": np.equal,
+}
+
+_SQL_LINHAS = """
+    SELECT l.id, l.version, l.lista_id, l.status_id, l.conteudo_id, o.rank AS opiniao_rank,
+           l.tag_mask, l.nome_norm, l.tags
+      FROM linhas l
+      LEFT JOIN opiniao_codigos o ON o.id = l.opiniao_id
+     WHERE l.id IN (SELECT value FROM json_each(?))
+"""
+
+
+class IndiceColunar:
+    """Colunas NumPy de main.linhas, sincronizadas sob demanda. Seguro entre threads."""
+
+    def __init__(self, banco=database.MAIN_DB):
+        self.banco = banco
+        self._lock = threading.Lock()
+        self._conn = None
+        self._zerar()
+
+    def _zerar(self):
+        self._data_version = None
+        self._n = 0                    # posições ocupadas (vivas ou não)
+        self._colunas = {nome: np.zeros(0, tipo) for nome, tipo in COLUNAS.items()}
+        self._posicao = {}             # id -> posição
+        self._vocabulario = []         # nome_id -> nome_norm
+        self._nome_ids = {}            # nome_norm -> nome_id
+        self._ordem_nomes = None       # nome_id -> posição alfabética (refeita quando o vocabulário cresce)
+        self._vocabulario_np = np.zeros(0, np.str_)  # _vocabulario como array (estendido quando cresce)
+        self._trechos = {}             # trecho de nome -> nome_id casa? (idem)
+        self._permutacoes = {}         # ordem -> posições de todas as linhas já ordenadas (None = já estão)
+        self._tags_extras = {}         # id -> chaves das tags sem bit
+        self._postagens = {}           # chave -> {ids}
+        self._bits = {}
+        self._codigos = {}
+        self._estado = {"sincronizacoes": 0, "linhas_relidas": 0, "ultima_sincronizacao_ms": None}
+
+    def _conexao(self):
+        # Conexão própria e só de leitura: data_version só enxerga escritas das outras conexões
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.banco, check_same_thread=False,
+                                         timeout=database.PRAGMAS["busy_timeout"] / 1000)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA query_only = ON")
+        return self._conn
+
+    def invalidar(self):
+        """Descarta tudo; a próxima consulta recarrega do zero (ex.: depois de restaurar um snapshot)."""
+        with self._lock:
+            self._zerar()
+
+    # ============================================================
+    # Sincronização
+    # ============================================================
+
+    def _sincronizar(self):
+        conn = self._conexao()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        inicio = time.perf_counter()
+        bits = database.tag_bits(conn)
+        if bits != self._bits:
+            # Bits novos recalculam tag_mask sem mexer em version: recarrega tudo
+            self._zerar()
+            self._bits = bits
+        self._codigos = {}
+
+        banco = conn.execute("SELECT id, version FROM linhas").fetchall()
+        ids = np.fromiter((row[0] for row in banco), np.int64, len(banco))
+        versoes = np.fromiter((row[1] for row in banco), np.int64, len(banco))
+
+        viva = self._colunas["viva"][:self._n]
+        for linha_id in np.setdiff1d(self._colunas["id"][:self._n][viva], ids, assume_unique=True).tolist():
+            self._remover(linha_id)
+
+        posicoes = np.fromiter((self._posicao.get(i, -1) for i in ids.tolist()), np.int64, len(ids))
+        mudou = posicoes < 0
+        conhecidas = ~mudou
+        mudou[conhecidas] = self._colunas["version"][posicoes[conhecidas]] != versoes[conhecidas]
+        relidas = ids[mudou].tolist()
+        if relidas:
+            self._gravar(conn.execute(_SQL_LINHAS, (json.dumps(relidas),)).fetchall())
+        if self._n > 1024 and len(self._posicao) < self._n // 2:
+            self._compactar()
+        self._permutacoes = {}
+
+        self._data_version = data_version
+        self._estado["sincronizacoes"] += 1
+        self._estado["linhas_relidas"] += len(relidas)
+        self._estado["ultima_sincronizacao_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+
+    def _reservar(self, extra):
+        capacidade = len(self._colunas["id"])
+        if self._n + extra <= capacidade:
+            return
+        nova = max(self._n + extra, capacidade * 2, 1024)
+        for nome, coluna in self._colunas.items():
+            maior = np.zeros(nova, coluna.dtype)
+            maior[:self._n] = coluna[:self._n]
+            self._colunas[nome] = maior
+
+    def _nome_id(self, nome_norm):
+        nome_norm = nome_norm or ""
+        nome_id = self._nome_ids.get(nome_norm)
+        if nome_id is None:
+            nome_id = self._nome_ids[nome_norm] = len(self._vocabulario)
+            self._vocabulario.append(nome_norm)
+            self._ordem_nomes = None
+            self._trechos = {}
+        return nome_id
+
+    def _gravar(self, rows):
+        """Insere ou sobrescreve as linhas lidas do banco (uma atribuição vetorizada por coluna)."""
+        self._reservar(len(rows))
+        posicoes = []
+        for row in rows:
+            posicao = self._posicao.get(row["id"])
+            if posicao is None:
+                posicao = self._posicao[row["id"]] = self._n
+                self._n += 1
+            posicoes.append(posicao)
+            self._indexar_tags(row["id"], row["tags"])
+        posicoes = np.array(posicoes, np.int64)
+        valores = {
+            "id": [row["id"] for row in rows],
+            "version": [row["version"] for row in rows],
+            "lista_id": [row["lista_id"] for row in rows],
+            "status_id": [SEM_CODIGO if row["status_id"] is None else row["status_id"] for row in rows],
+            "conteudo_id": [SEM_CODIGO if row["conteudo_id"] is None else row["conteudo_id"] for row in rows],
+            "opiniao_rank": [SEM_RANK if row["opiniao_rank"] is None else row["opiniao_rank"] for row in rows],
+            "tag_mask": [row["tag_mask"] or 0 for row in rows],
+            "nome_id": [self._nome_id(row["nome_norm"]) for row in rows],
+            "viva": [True] * len(rows),
+        }
+        for nome, lista in valores.items():
+            self._colunas[nome][posicoes] = np.array(lista, COLUNAS[nome])
+
+    def _indexar_tags(self, linha_id, tags_field):
+        for chave in self._tags_extras.pop(linha_id, ()):
+            self._postagens[chave].discard(linha_id)
+        chaves = frozenset(t.casefold() for t in database.split_tags(tags_field)) - self._bits.keys()
+        if chaves:
+            self._tags_extras[linha_id] = chaves
+            for chave in chaves:
+                self._postagens.setdefault(chave, set()).add(linha_id)
+
+    def _remover(self, linha_id):
+        posicao = self._posicao.pop(linha_id)
+        self._colunas["viva"][posicao] = False
+        self._indexar_tags(linha_id, "")
+
+    def _compactar(self):
+        viva = self._colunas["viva"][:self._n]
+        for nome, coluna in self._colunas.items():
+            self._colunas[nome] = coluna[:self._n][viva].copy()
+        self._n = len(self._colunas["id"])
+        self._posicao = {linha_id: posicao for posicao, linha_id in enumerate(self._colunas["id"].tolist())}
+
+    # ============================================================
+    # Consulta
+    # ============================================================
+
+    def _codigos_de(self, dimensao, rotulos):
+        codigos = []
+        for rotulo in rotulos:
+            chave = (dimensao, rotulo.strip().casefold())
+            if chave not in self._codigos:
+                self._codigos[chave] = database.codigo(self._conexao(), dimensao, rotulo)
+            if self._codigos[chave] is not None:
+                codigos.append(self._codigos[chave])
+        return np.array(codigos, np.int32)
+
+    def _rank_de(self, rotulo):
+        row = self._conexao().execute("""
+            SELECT r.rank FROM opiniao_codigos r
+              JOIN rotulo_aliases a ON a.codigo = r.id
+             WHERE a.dimensao = 'opiniao' AND a.chave = lower(trim(?))
+        """, (rotulo,)).fetchone()
+        return row[0] if row else None
+
+    def _permutacao(self, ordem):
+        """
+        Posições de todas as linhas na ordem pedida, calculada uma vez por versão dos
+        dados: cada consulta só aplica o filtro sobre ela, sem ordenar de novo.
+        """
+        if ordem not in self._permutacoes:
+            c = {nome: coluna[:self._n] for nome, coluna in self._colunas.items()}
+            if ordem == "id":
+                chaves = (c["id"],)
+            elif ordem == "nome":
+                chaves = (c["id"], self._ordem_alfabetica()[c["nome_id"]])
+            else:
+                chaves = (c["id"], self._ordem_alfabetica()[c["nome_id"]], c["opiniao_rank"])
+            permutacao = np.lexsort(chaves)
+            # Sem arquivamentos desfeitos as posições já estão em ordem de id
+            identidade = np.array_equal(permutacao, np.arange(self._n))
+            self._permutacoes[ordem] = None if identidade else permutacao
+        return self._permutacoes[ordem]
+
+    @staticmethod
+    def _pertence(coluna, valores):
+        """coluna IN valores. Filtros têm poucos valores: comparações diretas saem mais baratas que np.isin."""
+        valores = list(dict.fromkeys(int(v) for v in valores))
+        if len(valores) > 16:
+            return np.isin(coluna, valores)
+        resultado = np.zeros(len(coluna), np.bool_)
+        for valor in valores:
+            resultado |= coluna == valor
+        return resultado
+
+    def _com_tag(self, ids, chave):
+        postados = self._postagens.get(chave.strip().casefold())
+        if not postados:
+            return np.zeros(len(ids), np.bool_)
+        return np.isin(ids, np.fromiter(postados, np.int64, len(postados)))
+
+    def _ordem_alfabetica(self):
+        if self._ordem_nomes is None or len(self._ordem_nomes) != len(self._vocabulario):
+            ordem = np.empty(len(self._vocabulario), np.int32)
+            ordem[sorted(range(len(self._vocabulario)), key=self._vocabulario.__getitem__)] = \
+                np.arange(len(self._vocabulario), dtype=np.int32)
+            self._ordem_nomes = ordem
+        return self._ordem_nomes
+
+    def _nomes_com(self, trecho):
+        """Máscara por nome_id dos nomes que contêm `trecho` (busca vetorizada, guardada por trecho)."""
+        casa = self._trechos.get(trecho)
+        if casa is None:
+            novos = self._vocabulario[len(self._vocabulario_np):]
+            if novos:
+                self._vocabulario_np = np.concatenate([self._vocabulario_np, np.array(novos, np.str_)])
+            if len(self._trechos) >= TRECHOS_MAX:
+                self._trechos.clear()
+            casa = self._trechos[trecho] = np.char.find(self._vocabulario_np, trecho) >= 0
+        return casa
+
+    def consultar(self, listas=(), status=(), sem_status=(), conteudo=(), sem_conteudo=(),
+                  opiniao=None, tags=(), sem_tags=(), nome=None, ordem="id"):
+        """
+        Ids das linhas que passam em todos os filtros, na ordem pedida.
+        Rótulos aceitam aliases; rótulo desconhecido num filtro de inclusão não casa com nada.
+        """
+        if ordem not in ORDENS:
+            raise ValueError(f"ordem deve ser uma de: {', '.join(ORDENS)}")
+        with self._lock:
+            self._sincronizar()
+            c = {nome_coluna: coluna[:self._n] for nome_coluna, coluna in self._colunas.items()}
+            filtro = c["viva"].copy()
+            if listas:
+                filtro &= self._pertence(c["lista_id"], listas)
+            for coluna, incluir, excluir in (("status", status, sem_status), ("conteudo", conteudo, sem_conteudo)):
+                if incluir:
+                    filtro &= self._pertence(c[f"{coluna}_id"], self._codigos_de(coluna, incluir))
+                if excluir:
+                    filtro &= ~self._pertence(c[f"{coluna}_id"], self._codigos_de(coluna, excluir))
+            if opiniao:
+                operador, rotulo = database.separar_opiniao(opiniao)
+                rank = self._rank_de(rotulo)
+                if rank is None:
+                    filtro[:] = False
+                else:
+                    compara = _COMPARA_RANK[database.OPERADOR_NO_RANK[operador]]
+                    filtro &= compara(c["opiniao_rank"], rank) & (c["opiniao_rank"] != SEM_RANK)
+            exigida, exigidas_sem_bit = database.mascara_de_tags(tags, self._bits)
+            proibida, proibidas_sem_bit = database.mascara_de_tags(sem_tags, self._bits)
+            if exigida:
+                filtro &= (c["tag_mask"] & exigida) == exigida
+            if proibida:
+                filtro &= (c["tag_mask"] & proibida) == 0
+            for chave in exigidas_sem_bit:
+                filtro &= self._com_tag(c["id"], chave)
+            for chave in proibidas_sem_bit:
+                filtro &= ~self._com_tag(c["id"], chave)
+            if nome:
+                trecho = database.nome_norm(nome)
+                filtro &= self._nomes_com(trecho)[c["nome_id"]]
+
+            permutacao = self._permutacao(ordem.lstrip("-"))
+            if permutacao is None:
+                ids = c["id"][filtro]
+            else:
+                ids = c["id"][permutacao[filtro[permutacao]]]
+            return ids[::-1] if ordem.startswith("-") else ids
+
+    def status(self):
+        with self._lock:
+            return {
+                **self._estado,
+                "linhas": len(self._posicao),
+                "posicoes": self._n,
+                "nomes": len(self._vocabulario),
+                "tags_sem_bit": len(self._postagens),
+                "memoria_bytes": sum(coluna.nbytes for coluna in self._colunas.values()),
+            }
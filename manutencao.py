@@ -0,0 +1,293 @@
+"""
+manutencao.py — Manutenção periódica dos bancos SQLite.
+
+Uma thread em segundo plano roda, a cada MANUTENCAO_INTERVALO segundos, as
+tarefas abaixo em todos os schemas da conexão principal (main = list_it.db,
+espera = waiting_list.db, arquivo = arquivo.db):
+
+  - "orfaos":       apaga linhas de tabelas derivadas (sequencia_itens, linha_tags,
+                    sinopses, tags sem uso) que apontam para linhas/sequências que
+                    não existem mais — as foreign keys nunca estão ligadas;
+  - "fts":          junta os segmentos do índice de busca (linhas_fts 'optimize');
+  - "vacuum":       devolve ao disco as páginas livres (auto_vacuum = INCREMENTAL,
+                    ligado uma única vez com um VACUUM completo);
+  - "estatisticas": ANALYZE na primeira vez, depois PRAGMA optimize;
+  - "integridade":  PRAGMA quick_check e integrity-check do FTS.
+
+Linhas do usuário (linhas sem lista, arquivadas de listas removidas) nunca
+são apagadas aqui: só aparecem contadas no resultado de "orfaos".
+
+A primeira execução acontece MANUTENCAO_ESPERA segundos depois de iniciar().
+Rotas que apagam muito (delete_lista, clear_waiting_db) chamam agendar() e a
+manutenção roda MANUTENCAO_ESPERA segundos depois, juntando rajadas.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import database
+import repositorio
+
+MANUTENCAO_INTERVALO = int(os.environ.get("LISTIT_MANUTENCAO_INTERVALO", 24 * 60 * 60))
+MANUTENCAO_ESPERA = int(os.environ.get("LISTIT_MANUTENCAO_ESPERA", 60))
+
+# Linhas lidas por índice no ANALYZE (0 = todas); mantém o ANALYZE rápido em bancos grandes
+ANALYSIS_LIMIT = 1000
+
+# Páginas devolvidas por chamada de incremental_vacuum (segura o lock de escrita pouco tempo)
+PAGINAS_POR_VACUUM = 2000
+
+SCHEMAS = (database.MAIN_SCHEMA, database.ESPERA_SCHEMA, database.ARQUIVO_SCHEMA)
+
+# auto_vacuum: 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Apagados em "orfaos", na ordem: tabela -> condição de órfão
+ORFAOS = (
+    ("sequencia_itens", "sequencia_id NOT IN (SELECT id FROM {s}.sequencias)"),
+    ("sequencia_itens", "linha_id NOT IN (SELECT id FROM {s}.linhas)"),
+    ("linha_tags", "linha_id NOT IN (SELECT id FROM {s}.linhas)"),
+    ("sinopses", "linha_id NOT IN (SELECT id FROM {s}.linhas)"),
+    ("tags", "id NOT IN (SELECT tag_id FROM {s}.linha_tags)"),
+)
+
+
+class ManutencaoError(Exception):
+    """Tarefa desconhecida ou problema encontrado na verificação de integridade."""
+
+
+class ManutencaoEmAndamento(ManutencaoError):
+    """Outra execução (agendada ou manual) ainda não terminou."""
+
+
+def _tabelas(conn, schema):
+    return {row[0] for row in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type IN ('table', 'view')"
+    )}
+
+
+def _pragma(conn, schema, nome):
+    return conn.execute(f"PRAGMA {schema}.{nome}").fetchone()[0]
+
+
+# ============================================================
+# Tarefas (cada uma recebe a conexão e devolve um dict por schema)
+# ============================================================
+
+def limpar_orfaos(conn):
+    resultado = {}
+    for schema in SCHEMAS:
+        tabelas = _tabelas(conn, schema)
+        apagados = {}
+        with repositorio.transacao(conn):
+            for tabela, condicao in ORFAOS:
+                if tabela not in tabelas:
+                    continue
+                cur = conn.execute(f"DELETE FROM {schema}.{tabela} WHERE {condicao.format(s=schema)}")
+                if cur.rowcount:
+                    apagados[tabela] = apagados.get(tabela, 0) + cur.rowcount
+        info = {"apagados": apagados}
+        if "linhas" in tabelas:
+            listas = database.MAIN_SCHEMA if schema == database.ARQUIVO_SCHEMA else schema
+            info["linhas_sem_lista"] = conn.execute(
+                f"SELECT COUNT(*) FROM {schema}.linhas WHERE lista_id NOT IN (SELECT id FROM {listas}.listas)"
+            ).fetchone()[0]
+        resultado[schema] = info
+    return resultado
+
+
+def otimizar_fts(conn):
+    resultado = {}
+    for schema in SCHEMAS:
+        if "linhas_fts" not in _tabelas(conn, schema):
+            continue
+        with repositorio.transacao(conn):
+            conn.execute(f"INSERT INTO {schema}.linhas_fts (linhas_fts) VALUES ('optimize')")
+        resultado[schema] = "ok"
+    return resultado
+
+
+def vacuum_incremental(conn):
+    """
+    Devolve as páginas livres ao sistema de arquivos. Bancos criados sem
+    auto_vacuum passam para INCREMENTAL na primeira vez (exige um VACUUM
+    completo, que reescreve o arquivo); dali em diante basta incremental_vacuum.
+    """
+    resultado = {}
+    for schema in SCHEMAS:
+        antes = _pragma(conn, schema, "page_count")
+        convertido = False
+        if _pragma(conn, schema, "auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+            conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+            conn.execute(f"VACUUM {schema}")
+            convertido = True
+        while _pragma(conn, schema, "freelist_count"):
+            conn.execute(f"PRAGMA {schema}.incremental_vacuum({PAGINAS_POR_VACUUM})").fetchall()
+        # No modo WAL o arquivo só encolhe depois do checkpoint
+        conn.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)").fetchall()
+        resultado[schema] = {
+            "paginas_antes": antes,
+            "paginas_depois": _pragma(conn, schema, "page_count"),
+            "convertido_para_incremental": convertido,
+        }
+    return resultado
+
+
+def atualizar_estatisticas(conn):
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    resultado = {}
+    for schema in SCHEMAS:
+        if "sqlite_stat1" not in _tabelas(conn, schema):
+            conn.execute(f"ANALYZE {schema}")
+            resultado[schema] = "analyze"
+        else:
+            # 0x10002: analisa toda tabela com estatística desatualizada, não só as
+            # consultadas nesta conexão (o bit 0x10000 é ignorado antes do SQLite 3.46)
+            conn.execute(f"PRAGMA {schema}.optimize(0x10002)").fetchall()
+            resultado[schema] = "optimize"
+    return resultado
+
+
+def verificar_integridade(conn):
+    resultado = {}
+    problemas = []
+    for schema in SCHEMAS:
+        mensagens = [row[0] for row in conn.execute(f"PRAGMA {schema}.quick_check")]
+        if "linhas_fts" in _tabelas(conn, schema):
+            try:
+                conn.execute(f"INSERT INTO {schema}.linhas_fts (linhas_fts, rank) VALUES ('integrity-check', 1)")
+            except repositorio.ErroDeBanco as e:
+                mensagens.append(f"linhas_fts: {e}")
+        resultado[schema] = mensagens
+        problemas += [f"{schema}: {m}" for m in mensagens if m != "ok"]
+    if problemas:
+        raise ManutencaoError("; ".join(problemas))
+    return resultado
+
+
+# Ordem de execução: os órfãos saem antes do vacuum, que vem antes das estatísticas
+TAREFAS = {
+    "orfaos": limpar_orfaos,
+    "fts": otimizar_fts,
+    "vacuum": vacuum_incremental,
+    "estatisticas": atualizar_estatisticas,
+    "integridade": verificar_integridade,
+}
+
+
+def tamanhos(conn=None):
+    """Páginas, páginas livres e bytes de cada schema."""
+    propria = conn is None
+    conn = conn or database.get_connection()
+    try:
+        bancos = {}
+        for schema in SCHEMAS:
+            paginas = _pragma(conn, schema, "page_count")
+            bancos[schema] = {
+                "paginas": paginas,
+                "paginas_livres": _pragma(conn, schema, "freelist_count"),
+                "bytes": paginas * _pragma(conn, schema, "page_size"),
+                "auto_vacuum": _pragma(conn, schema, "auto_vacuum"),
+            }
+        return bancos
+    finally:
+        if propria:
+            conn.close()
+
+
+# ============================================================
+# Execução e agendamento em segundo plano
+# ============================================================
+
+_executando = threading.Lock()
+_acordar = threading.Event()
+_estado_lock = threading.Lock()
+_estado = {
+    "ativo": False,
+    "ultima_execucao": None,
+    "duracao_ms": None,
+    "tarefas": {},
+}
+
+
+def executar(tarefas=None):
+    """
+    Roda as tarefas pedidas (todas, por padrão) na ordem de TAREFAS. Uma falha
+    fica registrada na tarefa e não impede as seguintes. Retorna o estado de cada uma.
+    """
+    pedidas = list(TAREFAS) if not tarefas else list(tarefas)
+    desconhecidas = [t for t in pedidas if t not in TAREFAS]
+    if desconhecidas:
+        raise ManutencaoError(f"Tarefas desconhecidas: {', '.join(desconhecidas)} (use {', '.join(TAREFAS)})")
+    if not _executando.acquire(blocking=False):
+        raise ManutencaoEmAndamento("Manutenção já em andamento")
+    try:
+        inicio = time.perf_counter()
+        relatorio = {}
+        conn = database.get_connection()
+        try:
+            for nome, tarefa in TAREFAS.items():
+                if nome not in pedidas:
+                    continue
+                t0 = time.perf_counter()
+                item = {"ultima_execucao": datetime.now(timezone.utc).isoformat()}
+                try:
+                    item.update(ok=True, resultado=tarefa(conn), erro=None)
+                except (ManutencaoError, repositorio.ErroDeBanco) as e:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    item.update(ok=False, resultado=None, erro=str(e))
+                item["duracao_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                relatorio[nome] = item
+        finally:
+            conn.close()
+        with _estado_lock:
+            _estado["ultima_execucao"] = datetime.now(timezone.utc).isoformat()
+            _estado["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            _estado["tarefas"].update(relatorio)
+        return relatorio
+    finally:
+        _executando.release()
+
+
+def agendar():
+    """Pede uma manutenção daqui a MANUTENCAO_ESPERA segundos (não bloqueia a requisição)."""
+    _acordar.set()
+
+
+def _loop():
+    while True:
+        if _acordar.wait(timeout=MANUTENCAO_INTERVALO):
+            # Junta as rajadas de remoções numa execução só
+            time.sleep(MANUTENCAO_ESPERA)
+        _acordar.clear()
+        try:
+            executar()
+        except ManutencaoEmAndamento:
+            # Já havia uma execução manual em andamento
+            time.sleep(1)
+
+
+def iniciar():
+    """Sobe a thread de manutenção (uma vez por processo)."""
+    with _estado_lock:
+        if _estado["ativo"]:
+            return
+        _estado["ativo"] = True
+    # Primeira execução logo depois de subir: o servidor costuma reiniciar antes de INTERVALO
+    _acordar.set()
+    threading.Thread(target=_loop, name="manutencao", daemon=True).start()
+
+
+def status():
+    with _estado_lock:
+        estado = dict(_estado, tarefas=dict(_estado["tarefas"]))
+    estado.update({
+        "intervalo_segundos": MANUTENCAO_INTERVALO,
+        "espera_segundos": MANUTENCAO_ESPERA,
+        "pendente": _acordar.is_set(),
+        "bancos": tamanhos(),
+    })
+    return estado
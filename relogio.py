@@ -0,0 +1,97 @@
+"""
+relogio.py — Relógio lógico híbrido (HLC) e identidade desta máquina.
+
+Cada alteração registrada em alteracoes (ver alteracoes.py) recebe um carimbo
+"<milissegundos>-<contador>-<nó>", comparável como texto:
+
+  - milissegundos: o maior entre o relógio de parede e o último carimbo visto
+    (local ou recebido de outra máquina), então a ordem nunca anda para trás
+    mesmo com o relógio do sistema atrasado;
+  - contador: desempata carimbos no mesmo milissegundo;
+  - nó: identifica a máquina e desempata carimbos iguais de máquinas diferentes.
+
+O nó vem de LISTIT_NO ou de NO_ARQUIVO (criado na primeira vez, fora do git):
+ele não pode morar no banco, que é copiado entre as máquinas.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+
+NO_ARQUIVO = os.environ.get("LISTIT_NO_ARQUIVO", ".listit_no")
+
+# Carimbo das linhas que já existiam antes do registro: perde para qualquer edição
+CARIMBO_BASE = "0000000000000-0000-0"
+
+_FORMATO = re.compile(r"^(\d{13})-(\d{4})-([0-9A-Za-z_.]+)$")
+_CONTADOR_MAX = 9999
+
+
+class RelogioError(ValueError):
+    """Carimbo em formato desconhecido."""
+
+
+def _ler_no():
+    no = os.environ.get("LISTIT_NO")
+    if no:
+        return no
+    if os.path.exists(NO_ARQUIVO):
+        with open(NO_ARQUIVO, encoding="utf-8") as f:
+            no = f.read().strip()
+        if no:
+            return no
+    no = uuid.uuid4().hex[:12]
+    with open(NO_ARQUIVO, "w", encoding="utf-8") as f:
+        f.write(no + "\n")
+    return no
+
+
+def separar(carimbo):
+    """(milissegundos, contador, nó) de um carimbo."""
+    m = _FORMATO.match(carimbo or "")
+    if not m:
+        raise RelogioError(f"Carimbo inválido: {carimbo!r}")
+    return int(m.group(1)), int(m.group(2)), m.group(3)
+
+
+class RelogioHLC:
+    """Relógio do processo; seguro entre threads (as conexões do pool o compartilham)."""
+
+    def __init__(self, no=None):
+        self._no = no
+        self._ms = 0
+        self._contador = 0
+        self._lock = threading.Lock()
+
+    @property
+    def no(self):
+        if self._no is None:
+            self._no = _ler_no()
+        return self._no
+
+    def _avancar(self, ms, contador):
+        if contador > _CONTADOR_MAX:
+            ms, contador = ms + 1, 0
+        self._ms, self._contador = ms, contador
+
+    def agora(self):
+        """Carimbo novo, maior que todos os já emitidos ou observados."""
+        parede = int(time.time() * 1000)
+        with self._lock:
+            if parede > self._ms:
+                self._avancar(parede, 0)
+            else:
+                self._avancar(self._ms, self._contador + 1)
+            return f"{self._ms:013d}-{self._contador:04d}-{self.no}"
+
+    def observar(self, carimbo):
+        """Avança o relógio para depois de um carimbo recebido (ou lido do banco ao subir)."""
+        ms, contador, _ = separar(carimbo)
+        with self._lock:
+            if (ms, contador) > (self._ms, self._contador):
+                self._avancar(ms, contador)
+
+
+relogio = RelogioHLC()
@@ -0,0 +1,603 @@
+"""
+repositorio.py — Acesso a dados compartilhado pelas rotas da lista principal e da espera.
+
+Toda função recebe a conexão do banco principal (que já tem o banco de espera
+anexado como o schema "espera") e o schema em que deve operar. Assim as rotas
+/linhas e /wait/linhas usam o mesmo código, e mover, migrar ou deduplicar entre
+os dois bancos vira INSERT ... SELECT / DELETE dentro de uma única transação.
+
+As funções não fazem commit: quem chama decide o escopo com transacao().
+"""
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import database
+
+MAIN = database.MAIN_SCHEMA
+ESPERA = database.ESPERA_SCHEMA
+SCHEMAS = (MAIN, ESPERA)
+
+# Erros do banco que as rotas tratam (cada backend expõe o seu; ver armazenamento.py)
+ErroDeBanco = sqlite3.Error
+
+# Colunas copiadas quando a linha muda de banco (principal <-> espera)
+COLUNAS_COPIADAS = ("nome", "alias", "tags", "conteudo", "status", "episodio", "opiniao",
+                    "imagem_url", "last_highlight", "sinonimos", "sinopse", "created_at")
+
+# Colunas que podem ser alteradas por atualizar_linha
+COLUNAS_EDITAVEIS = ("lista_id", "nome", "tags", "conteudo", "status", "episodio", "opiniao",
+                     "imagem_url", "sinopse", "sinonimos", "last_highlight")
+
+
+class NaoEncontrado(LookupError):
+    """Lista ou linha inexistente no schema pedido."""
+
+
+class ConflitoDeVersao(Exception):
+    """A linha mudou desde a versão que o cliente leu (concorrência otimista)."""
+
+    def __init__(self, versao_atual):
+        super().__init__(f"Linha alterada por outra escrita (versão atual: {versao_atual})")
+        self.versao_atual = versao_atual
+
+
+def _schema(schema):
+    if schema not in SCHEMAS:
+        raise ValueError(f"Schema inválido: {schema}")
+    return schema
+
+
+def conectar():
+    """Conexão do pool com a espera e o arquivo anexados."""
+    return database.get_connection(database.MAIN_DB)
+
+
+@contextmanager
+def transacao(conn):
+    """BEGIN IMMEDIATE ... COMMIT (ou ROLLBACK se algo falhar)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def agora():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ============================================================
+# Listas
+# ============================================================
+
+def listar_listas(conn, schema=MAIN):
+    rows = conn.execute(f"SELECT id, nome FROM {_schema(schema)}.listas").fetchall()
+    return [{"id": row["id"], "nome": row["nome"]} for row in rows]
+
+
+def nome_lista(conn, schema, lista_id):
+    row = conn.execute(f"SELECT nome FROM {_schema(schema)}.listas WHERE id = ?", (lista_id,)).fetchone()
+    return row["nome"] if row else None
+
+
+def criar_lista(conn, schema, nome):
+    cursor = conn.execute(f"INSERT INTO {_schema(schema)}.listas (nome) VALUES (?)", (nome,))
+    return cursor.lastrowid
+
+
+def remover_lista(conn, schema, lista_id):
+    """Remove a lista e suas linhas. Retorna o nome da lista removida (ou None)."""
+    nome = nome_lista(conn, schema, lista_id)
+    if nome is None:
+        return None
+    conn.execute(f"""
+        DELETE FROM {schema}.sequencia_itens
+         WHERE linha_id IN (SELECT id FROM {schema}.linhas WHERE lista_id = ?)
+    """, (lista_id,))
+    conn.execute(f"DELETE FROM {schema}.linhas WHERE lista_id = ?", (lista_id,))
+    if schema == MAIN:
+        conn.execute(f"DELETE FROM {ARQUIVO}.linhas WHERE lista_id = ?", (lista_id,))
+    conn.execute(f"DELETE FROM {schema}.listas WHERE id = ?", (lista_id,))
+    return nome
+
+
+def limpar(conn, schema):
+    """Apaga todo o conteúdo do schema (usado para esvaziar a espera)."""
+    for tabela in ("sequencia_itens", "sequencias", "linha_tags", "linhas", "listas", "tags"):
+        conn.execute(f"DELETE FROM {_schema(schema)}.{tabela}")
+
+
+# ============================================================
+# Linhas
+# ============================================================
+
+def _select_colunas(schema, colunas):
+    """Lista de colunas do SELECT; a sinopse sai descomprimida de sinopses."""
+    if not colunas:
+        return "*"
+    return ", ".join(f"{database.sinopse_sql('linhas', schema)} AS sinopse" if c == "sinopse" else c
+                     for c in colunas)
+
+
+def listar_linhas(conn, schema, lista_id, colunas=None):
+    """Linhas da lista, por id. `colunas` é uma sequência de nomes (None = todas as físicas)."""
+    return conn.execute(
+        f"SELECT {_select_colunas(_schema(schema), colunas)} FROM {schema}.linhas WHERE lista_id = ? ORDER BY id",
+        (lista_id,)
+    ).fetchall()
+
+
+def obter_linha(conn, schema, linha_id, colunas=None):
+    row = conn.execute(
+        f"SELECT {_select_colunas(_schema(schema), colunas)} FROM {schema}.linhas WHERE id = ?", (linha_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def nome_linha(conn, schema, linha_id):
+    row = conn.execute(f"SELECT nome FROM {_schema(schema)}.linhas WHERE id = ?", (linha_id,)).fetchone()
+    return row["nome"] if row else None
+
+
+def _normalizar(dados):
+    """Converte tags em lista para 'a, b' e sinonimos para JSON, como gravado no banco."""
+    dados = dict(dados)
+    if isinstance(dados.get("tags"), (list, tuple)):
+        dados["tags"] = ", ".join(str(x).strip() for x in dados["tags"] if x is not None)
+    if "sinonimos" in dados and not isinstance(dados["sinonimos"], str):
+        dados["sinonimos"] = json.dumps(dados["sinonimos"] or [], ensure_ascii=False)
+    return dados
+
+
+def inserir_linha(conn, schema, dados):
+    """Insere a linha (campos ausentes ficam com o padrão) e sincroniza as tags. Retorna (id, last_highlight)."""
+    dados = _normalizar(dados)
+    dados.setdefault("tags", "")
+    dados.setdefault("sinonimos", "[]")
+    dados.setdefault("last_highlight", agora())
+    colunas = [c for c in COLUNAS_EDITAVEIS if c in dados]
+    cursor = conn.execute(f"""
+        INSERT INTO {_schema(schema)}.linhas ({', '.join(colunas)})
+        VALUES ({', '.join('?' for _ in colunas)})
+    """, [dados[c] for c in colunas])
+    linha_id = cursor.lastrowid
+    database.sync_linha_tags(conn, linha_id, dados["tags"], schema)
+    return linha_id, dados["last_highlight"]
+
+
+def versao_linha(conn, schema, linha_id):
+    row = conn.execute(f"SELECT version FROM {_schema(schema)}.linhas WHERE id = ?", (linha_id,)).fetchone()
+    return row["version"] if row else None
+
+
+def atualizar_linha(conn, schema, linha_id, dados, versao=None):
+    """
+    Atualiza só os campos informados. Retorna quantos campos mudaram (NaoEncontrado se a linha não existe).
+    Com `versao`, o UPDATE só acontece se a linha ainda estiver nela (senão ConflitoDeVersao).
+    """
+    dados = {k: v for k, v in _normalizar(dados).items() if k in COLUNAS_EDITAVEIS}
+    if versao is None:
+        if nome_linha(conn, schema, linha_id) is None:
+            raise NaoEncontrado("Linha não encontrada")
+        if not dados:
+            return 0
+        sets = ", ".join(f"{coluna} = ?" for coluna in dados)
+        conn.execute(f"UPDATE {schema}.linhas SET {sets} WHERE id = ?", list(dados.values()) + [linha_id])
+    else:
+        # Sem leitura prévia: a condição na versão decide; só no erro descobrimos o motivo
+        sets = ", ".join([f"{coluna} = ?" for coluna in dados] + ["version = version + 1"])
+        cursor = conn.execute(
+            f"UPDATE {_schema(schema)}.linhas SET {sets} WHERE id = ? AND version = ?",
+            list(dados.values()) + [linha_id, versao]
+        )
+        if cursor.rowcount == 0:
+            atual = versao_linha(conn, schema, linha_id)
+            if atual is None:
+                raise NaoEncontrado("Linha não encontrada")
+            raise ConflitoDeVersao(atual)
+    if "tags" in dados:
+        database.sync_linha_tags(conn, linha_id, dados["tags"], schema)
+    return len(dados)
+
+
+def avancar_progresso(conn, schema, linha_id, delta=1):
+    """Soma `delta` ao episódio num único UPDATE (nunca abaixo de 0). Retorna a linha com nome/episodio/version."""
+    rows = conn.execute(f"""
+        UPDATE {_schema(schema)}.linhas
+           SET episodio = MAX(COALESCE(episodio, 0) + ?, 0),
+               version = version + 1
+         WHERE id = ?
+        RETURNING id, nome, episodio, version
+    """, (delta, linha_id)).fetchall()
+    if not rows:
+        raise NaoEncontrado("Linha não encontrada")
+    return dict(rows[0])
+
+
+def _remover_linhas(conn, schema, ids):
+    ids_json = json.dumps(list(ids))
+    conn.execute(f"""
+        DELETE FROM {schema}.sequencia_itens
+         WHERE linha_id IN (SELECT value FROM json_each(?))
+    """, (ids_json,))
+    conn.execute(f"DELETE FROM {schema}.linhas WHERE id IN (SELECT value FROM json_each(?))", (ids_json,))
+
+
+def remover_linha(conn, schema, linha_id):
+    """Remove a linha. Retorna o nome dela (ou None se não existia)."""
+    nome = nome_linha(conn, schema, linha_id)
+    if nome is not None:
+        _remover_linhas(conn, _schema(schema), [linha_id])
+    return nome
+
+
+def linhas_incompletas(conn, ids):
+    """Linhas do principal entre `ids` ainda sem imagem ou sem sinopse/sinônimos."""
+    return [dict(row) for row in conn.execute("""
+        SELECT id, nome, conteudo FROM main.linhas
+         WHERE id IN (SELECT value FROM json_each(?))
+           AND (falta_imagem = 1 OR falta_detalhes = 1)
+    """, (json.dumps(list(ids)),))]
+
+
+def tags_em_uso(conn, schema=MAIN, lista_id=None):
+    """Tags usadas por pelo menos uma linha (via índice linha_tags)."""
+    sql = f"""
+        SELECT DISTINCT t.nome
+          FROM {_schema(schema)}.tags t
+          JOIN {schema}.linha_tags lt ON lt.tag_id = t.id
+    """
+    params = ()
+    if lista_id is not None:
+        sql += f" JOIN {schema}.linhas l ON l.id = lt.linha_id WHERE l.lista_id = ?"
+        params = (lista_id,)
+    sql += " ORDER BY t.nome COLLATE PT_BR"
+    return [row["nome"] for row in conn.execute(sql, params).fetchall()]
+
+
+# ============================================================
+# Operações entre principal e espera
+# ============================================================
+
+def _copiar_linhas(conn, origem, destino, lista_destino_sql, lista_params, where_sql, params):
+    """
+    INSERT ... SELECT de origem.linhas (alias l) para destino.linhas.
+    Retorna [(id_antigo, id_novo)] na ordem dos ids de origem.
+    """
+    antigos = [row[0] for row in conn.execute(
+        f"SELECT l.id FROM {origem}.linhas l WHERE {where_sql} ORDER BY l.id", params
+    )]
+    if not antigos:
+        return []
+    ultimo_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {destino}.linhas").fetchone()[0]
+    colunas = ", ".join(COLUNAS_COPIADAS)
+    # A sinopse sai descomprimida da origem; o trigger do destino comprime de novo
+    valores = ", ".join(database.sinopse_sql("l", origem) if c == "sinopse" else f"l.{c}"
+                        for c in COLUNAS_COPIADAS)
+    conn.execute(f"""
+        INSERT INTO {destino}.linhas (lista_id, {colunas})
+        SELECT {lista_destino_sql}, {valores}
+          FROM {origem}.linhas l
+         WHERE {where_sql}
+         ORDER BY l.id
+    """, list(lista_params) + list(params))
+    # Os ids novos saem na mesma ordem dos antigos (ORDER BY l.id no INSERT ... SELECT)
+    novas = conn.execute(
+        f"SELECT id, tags FROM {destino}.linhas WHERE id > ? ORDER BY id", (ultimo_id,)
+    ).fetchall()
+    for row in novas:
+        database.sync_linha_tags(conn, row["id"], row["tags"], destino)
+    return list(zip(antigos, (row["id"] for row in novas)))
+
+
+def mover_linhas(conn, origem, origem_lista_id, destino, destino_lista_id, ids):
+    """
+    Move as linhas `ids` da lista de origem para a de destino (mesmo schema ou não).
+    Retorna {id_antigo: id_novo} só com os ids que pertenciam à lista de origem.
+    """
+    for schema in (origem, destino):
+        _schema(schema)
+    if nome_lista(conn, origem, origem_lista_id) is None:
+        raise NaoEncontrado("Lista de origem não encontrada")
+    if nome_lista(conn, destino, destino_lista_id) is None:
+        raise NaoEncontrado("Lista de destino não encontrada")
+    ids_json = json.dumps(list(ids))
+    if origem == destino:
+        encontrados = [row[0] for row in conn.execute(f"""
+            SELECT id FROM {origem}.linhas
+             WHERE lista_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (origem_lista_id, ids_json))]
+        conn.execute(f"""
+            UPDATE {origem}.linhas SET lista_id = ?
+             WHERE lista_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (destino_lista_id, origem_lista_id, ids_json))
+        return {i: i for i in encontrados}
+    pares = _copiar_linhas(
+        conn, origem, destino, "?", [destino_lista_id],
+        "l.lista_id = ? AND l.id IN (SELECT value FROM json_each(?))", [origem_lista_id, ids_json]
+    )
+    _remover_linhas(conn, origem, [antigo for antigo, _ in pares])
+    return dict(pares)
+
+
+def migrar_espera(conn, lista_espera_id=None):
+    """
+    Migra a espera (ou uma lista dela) para o principal.
+    Listas são casadas pelo nome (criadas se não existirem); as linhas migradas e as
+    listas que ficarem vazias saem da espera. Retorna estatísticas e os pares de ids.
+    """
+    filtro_lista = "e.id = ?" if lista_espera_id is not None else "1 = 1"
+    params_lista = [lista_espera_id] if lista_espera_id is not None else []
+
+    criadas = conn.execute(f"""
+        INSERT INTO main.listas (nome)
+        SELECT e.nome FROM espera.listas e
+         WHERE {filtro_lista}
+           AND NOT EXISTS (SELECT 1 FROM main.listas m WHERE m.nome = e.nome)
+         ORDER BY e.id
+    """, params_lista).rowcount
+
+    filtro_linhas = f"l.lista_id IN (SELECT e.id FROM espera.listas e WHERE {filtro_lista})"
+    pares = _copiar_linhas(
+        conn, ESPERA, MAIN,
+        """(SELECT m.id FROM main.listas m
+             WHERE m.nome = (SELECT e.nome FROM espera.listas e WHERE e.id = l.lista_id)
+             ORDER BY m.id LIMIT 1)""", [],
+        f"{filtro_linhas} AND COALESCE(l.migrated, 0) = 0", params_lista
+    )
+    # Sai da espera tudo o que estava nessas listas, inclusive o que a migração seletiva já copiou
+    da_espera = [row[0] for row in conn.execute(
+        f"SELECT l.id FROM espera.linhas l WHERE {filtro_linhas}", params_lista
+    )]
+    _remover_linhas(conn, ESPERA, da_espera)
+    esvaziadas = conn.execute(f"""
+        DELETE FROM espera.listas
+         WHERE id IN (SELECT e.id FROM espera.listas e WHERE {filtro_lista})
+           AND NOT EXISTS (SELECT 1 FROM espera.linhas l WHERE l.lista_id = espera.listas.id)
+    """, params_lista).rowcount
+    return {"listas_criadas": criadas, "listas_migradas": esvaziadas, "pares": pares}
+
+
+def migrar_selecionadas(conn, lista_espera_id, linha_ids, destino_lista_id):
+    """
+    Copia as linhas escolhidas da espera para uma lista principal e as marca como migradas.
+    Retorna (pares [(id_espera, id_principal)], erros por id).
+    """
+    if nome_lista(conn, MAIN, destino_lista_id) is None:
+        raise NaoEncontrado("Lista principal não encontrada")
+    ids_json = json.dumps(list(linha_ids))
+    estado = {row["id"]: row["migrated"] for row in conn.execute("""
+        SELECT id, COALESCE(migrated, 0) AS migrated FROM espera.linhas
+         WHERE lista_id = ? AND id IN (SELECT value FROM json_each(?))
+    """, (lista_espera_id, ids_json))}
+    erros = []
+    for linha_id in linha_ids:
+        if linha_id not in estado:
+            erros.append(f"Linha {linha_id} não encontrada na lista de espera")
+        elif estado[linha_id]:
+            erros.append(f"Linha {linha_id} já foi migrada anteriormente")
+    pares = _copiar_linhas(
+        conn, ESPERA, MAIN, "?", [destino_lista_id],
+        "l.lista_id = ? AND l.id IN (SELECT value FROM json_each(?)) AND COALESCE(l.migrated, 0) = 0",
+        [lista_espera_id, ids_json]
+    )
+    conn.execute(
+        "UPDATE espera.linhas SET migrated = 1 WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps([antigo for antigo, _ in pares]),)
+    )
+    return pares, erros
+
+
+def deduplicar_espera(conn, remover=True):
+    """
+    Linhas da espera que já existem no principal (mesmo nome_norm: sem acentos, maiúsculas
+    nem pontuação) ou repetidas dentro da mesma lista de espera. Com remover=True elas são apagadas.
+    """
+    duplicadas = [dict(row) for row in conn.execute("""
+        SELECT l.id, l.lista_id, l.nome, 'já está na lista principal' AS motivo
+          FROM espera.linhas l
+         WHERE EXISTS (SELECT 1 FROM main.linhas m WHERE m.nome_norm = l.nome_norm)
+        UNION ALL
+        SELECT l.id, l.lista_id, l.nome, 'repetida na espera' AS motivo
+          FROM espera.linhas l
+         WHERE NOT EXISTS (SELECT 1 FROM main.linhas m WHERE m.nome_norm = l.nome_norm)
+           AND EXISTS (SELECT 1 FROM espera.linhas o
+                        WHERE o.lista_id = l.lista_id AND o.nome_norm = l.nome_norm AND o.id < l.id)
+         ORDER BY 1
+    """)]
+    if remover and duplicadas:
+        _remover_linhas(conn, ESPERA, [d["id"] for d in duplicadas])
+    return duplicadas
+
+
+# ============================================================
+# Arquivo: linhas terminadas e paradas há muito tempo (arquivo.db)
+# ============================================================
+
+ARQUIVO = database.ARQUIVO_SCHEMA
+
+# Política padrão: status terminados, sem edição há ARQUIVO_MESES meses
+STATUS_ARQUIVAVEIS = ("Concluido", "Dropado", "Cancelado")
+ARQUIVO_MESES = 12
+
+# Linhas arquivadas antes das sinopses comprimidas guardam o texto em sinopse
+# (coluna que só existe depois do primeiro arquivamento; ver _sinopse_arquivada)
+_SINOPSE_ARQUIVADA = "COALESCE(sinopse_texto(a.sinopse_z), a.sinopse)"
+
+
+def _sinopse_arquivada(arquivadas):
+    return _SINOPSE_ARQUIVADA if "sinopse" in arquivadas else "sinopse_texto(a.sinopse_z)"
+
+
+def _colunas_linhas(conn, schema):
+    """[(nome, tipo, oculta)] de schema.linhas; oculta != 0 são colunas geradas."""
+    return [(row[1], row[2], row[6]) for row in conn.execute(f"PRAGMA {schema}.table_xinfo(linhas)")]
+
+
+def _espelhar_colunas_arquivo(conn):
+    """
+    arquivo.linhas acompanha as colunas de main.linhas (migrações novas aparecem
+    no próximo arquivamento). Colunas geradas viram colunas comuns com o valor da
+    hora em que a linha foi arquivada, então filtros como falta_detalhes seguem valendo.
+    """
+    existentes = {nome for nome, _, _ in _colunas_linhas(conn, ARQUIVO)}
+    for nome, tipo, _ in _colunas_linhas(conn, MAIN):
+        if nome not in existentes:
+            conn.execute(f"ALTER TABLE {ARQUIVO}.linhas ADD COLUMN {nome} {tipo}")
+
+
+def candidatas_ao_arquivo(conn, meses=ARQUIVO_MESES, status=STATUS_ARQUIVAVEIS):
+    """
+    Linhas do principal com status terminado e sem edição há `meses` meses.
+    Linhas que fazem parte de alguma sequência ficam de fora.
+    """
+    codigos = [c for c in (database.codigo(conn, "status", s) for s in status) if c is not None]
+    if not codigos:
+        return []
+    return [dict(row) for row in conn.execute(f"""
+        SELECT l.id, l.lista_id, l.nome, l.status, COALESCE(l.updated_at, l.created_at) AS atualizada_em
+          FROM main.linhas l
+         WHERE l.status_id IN ({', '.join('?' * len(codigos))})
+           AND COALESCE(l.updated_at, l.created_at) < strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)
+           AND NOT EXISTS (SELECT 1 FROM main.sequencia_itens si WHERE si.linha_id = l.id)
+         ORDER BY l.id
+    """, codigos + [f"-{int(meses)} months"])]
+
+
+def arquivar_linhas(conn, ids):
+    """Copia as linhas `ids` para arquivo.linhas (mesmo id) e apaga do principal. Retorna quantas."""
+    if not ids:
+        return 0
+    ids_json = json.dumps(list(ids))
+    _espelhar_colunas_arquivo(conn)
+    colunas = ", ".join(nome for nome, _, _ in _colunas_linhas(conn, MAIN))
+    # A sinopse vai comprimida como está em main.sinopses
+    cursor = conn.execute(f"""
+        INSERT OR REPLACE INTO {ARQUIVO}.linhas (arquivado_em, sinopse_z, {colunas})
+        SELECT ?, (SELECT s.texto FROM main.sinopses s WHERE s.linha_id = l.id), {colunas}
+          FROM main.linhas l
+         WHERE l.id IN (SELECT value FROM json_each(?))
+    """, (agora(), ids_json))
+    # Arquivar é só onde a linha mora, não uma remoção para as outras máquinas
+    with database.sem_registro():
+        _remover_linhas(conn, MAIN, ids)
+    return cursor.rowcount
+
+
+def desarquivar_linhas(conn, ids):
+    """
+    Devolve as linhas arquivadas `ids` ao principal, com o mesmo id (linhas usa
+    AUTOINCREMENT, então o id nunca foi reaproveitado). Retorna os ids devolvidos.
+    """
+    ids_json = json.dumps(list(ids))
+    arquivadas = {nome for nome, _, _ in _colunas_linhas(conn, ARQUIVO)}
+    # Só colunas físicas: as geradas são recalculadas e os códigos/nome_norm vêm dos triggers
+    colunas = [nome for nome, _, oculta in _colunas_linhas(conn, MAIN) if oculta == 0 and nome in arquivadas]
+    # Gravar em sinopse passa pelo trigger que comprime de volta em main.sinopses
+    valores = [_SINOPSE_ARQUIVADA if nome == "sinopse" else f"a.{nome}" for nome in colunas]
+    # Linhas arquivadas antes do registro de alterações voltam com o uid 'base-<id>'
+    # que as outras cópias do banco também dão a elas
+    uid_base = "'base-' || a.id"
+    if "uid" in colunas:
+        valores[colunas.index("uid")] = f"COALESCE(a.uid, {uid_base})"
+    else:
+        colunas, valores = colunas + ["uid"], valores + [uid_base]
+    # Desarquivar não é uma edição para as outras máquinas
+    with database.sem_registro():
+        rows = conn.execute(f"""
+            INSERT INTO main.linhas ({', '.join(colunas)})
+            SELECT {', '.join(valores)} FROM {ARQUIVO}.linhas a
+             WHERE a.id IN (SELECT value FROM json_each(?))
+               AND a.lista_id IN (SELECT id FROM main.listas)
+            RETURNING id, tags
+        """, (ids_json,)).fetchall()
+        for row in rows:
+            database.sync_linha_tags(conn, row["id"], row["tags"], MAIN)
+        devolvidos = [row["id"] for row in rows]
+        # Os triggers de INSERT mexem em colunas versionadas; desarquivar conta como uma edição só
+        conn.execute(f"""
+            UPDATE main.linhas
+               SET version = a.version + 1, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+              FROM {ARQUIVO}.linhas a
+             WHERE a.id = main.linhas.id AND main.linhas.id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(devolvidos),))
+    conn.execute(f"DELETE FROM {ARQUIVO}.linhas WHERE id IN (SELECT value FROM json_each(?))",
+                 (json.dumps(devolvidos),))
+    return devolvidos
+
+
+def cte_linhas_com_arquivo(conn, colunas):
+    """
+    WITH linhas AS (...) que junta main.linhas e arquivo.linhas (coluna extra
+    `arquivado`). Prefixado a um SELECT ... FROM linhas, faz as mesmas cláusulas
+    (filtros e cursores) valerem para as linhas arquivadas. Colunas que o arquivo
+    ainda não tem saem como NULL.
+    """
+    arquivadas = {nome for nome, _, _ in _colunas_linhas(conn, ARQUIVO)}
+    principal = ", ".join(f"{database.sinopse_sql('main.linhas')} AS sinopse" if c == "sinopse" else c
+                          for c in colunas)
+    arquivo = ", ".join(f"{_sinopse_arquivada(arquivadas)} AS sinopse" if c == "sinopse"
+                        else c if c in arquivadas else f"NULL AS {c}" for c in colunas)
+    return f"""
+        WITH linhas AS (
+            SELECT {principal}, 0 AS arquivado FROM main.linhas
+            UNION ALL
+            SELECT {arquivo}, 1 AS arquivado FROM {ARQUIVO}.linhas a
+        )
+    """
+
+
+def linha_arquivada(conn, linha_id, colunas="*"):
+    row = conn.execute(f"SELECT {colunas} FROM {ARQUIVO}.linhas WHERE id = ?", (linha_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def buscar_arquivadas(conn, texto, limit=20, lista_id=None):
+    """
+    Busca do /search nas linhas arquivadas (o arquivo não tem índice FTS): os
+    mesmos termos de database.fts_query (todos; o último vale como prefixo) no
+    nome, alias e sinônimos normalizados. Sem bm25, o rank é 0: ficam depois
+    dos resultados ranqueados. Retorna (linhas, total).
+    """
+    termos = (database.nome_norm(texto) or "").split()
+    arquivadas = {nome for nome, _, _ in _colunas_linhas(conn, ARQUIVO)}
+    campos = [f"COALESCE(a.{c}, '')" for c in ("nome", "alias", "sinonimos") if c in arquivadas]
+    if not termos or not campos:
+        return [], 0
+    juntos = " || ' ' || ".join(campos)
+    normalizado = f"' ' || nome_norm({juntos}) || ' '"
+    clauses = [f"instr({normalizado}, ?) > 0" for _ in termos]
+    params = [f" {t} " for t in termos[:-1]] + [f" {termos[-1]}"]
+    if lista_id is not None:
+        clauses.append("a.lista_id = ?")
+        params.append(lista_id)
+    where = " AND ".join(clauses)
+    total = conn.execute(f"SELECT COUNT(*) FROM {ARQUIVO}.linhas a WHERE {where}", params).fetchone()[0]
+    colunas = ", ".join(f"a.{c}" if c in arquivadas else f"NULL AS {c}"
+                        for c in ("nome", "conteudo", "status", "opiniao", "imagem_url"))
+    rows = conn.execute(f"""
+        SELECT a.id, a.lista_id, ls.nome AS lista_nome, {colunas}, NULL AS trecho, 0.0 AS rank
+          FROM {ARQUIVO}.linhas a
+          LEFT JOIN main.listas ls ON ls.id = a.lista_id
+         WHERE {where}
+         ORDER BY a.id
+         LIMIT ?
+    """, params + [limit]).fetchall()
+    return [dict(row) for row in rows], total
+
+
+def resumo_arquivo(conn):
+    """Quantas linhas arquivadas por lista."""
+    rows = conn.execute(f"""
+        SELECT a.lista_id, l.nome AS lista, COUNT(*) AS linhas, MAX(a.arquivado_em) AS ultimo
+          FROM {ARQUIVO}.linhas a
+          LEFT JOIN main.listas l ON l.id = a.lista_id
+         GROUP BY a.lista_id
+         ORDER BY a.lista_id
+    """).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,501 @@
+"""
+repositorio_pg.py — O repositório sobre PostgreSQL (LISTIT_BACKEND=postgres).
+
+Mesmas funções, argumentos e retornos de repositorio.py, sobre os schemas
+"main" e "espera" de um único banco PostgreSQL (LISTIT_PG_DSN). Principal e
+espera ficam no mesmo banco, então mover, migrar e deduplicar continuam sendo
+INSERT ... SELECT / DELETE numa transação só.
+
+O que no SQLite vem de triggers e colunas geradas virtuais aqui é calculado em
+Python antes da escrita (_derivadas): nome_norm, n_sinonimos, tag_mask e o
+rótulo canônico de status/opinião/conteúdo, além de version/updated_at a cada
+UPDATE. A sinopse fica como texto já limpo (database.limpar_sinopse); textos
+longos o próprio PostgreSQL comprime (TOAST).
+
+Precisa do psycopg 3 (pip install "psycopg[binary]"), que só este módulo importa.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import cmp_to_key
+
+import database
+import repositorio
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except ImportError:  # backend opcional
+    psycopg = None
+
+PG_DSN = os.environ.get("LISTIT_PG_DSN", "dbname=list_it")
+
+MAIN = repositorio.MAIN
+ESPERA = repositorio.ESPERA
+SCHEMAS = repositorio.SCHEMAS
+COLUNAS_COPIADAS = repositorio.COLUNAS_COPIADAS
+COLUNAS_EDITAVEIS = repositorio.COLUNAS_EDITAVEIS
+NaoEncontrado = repositorio.NaoEncontrado
+ConflitoDeVersao = repositorio.ConflitoDeVersao
+ErroDeBanco = psycopg.Error if psycopg else Exception
+agora = repositorio.agora
+_schema = repositorio._schema
+
+# Colunas que o SQLite calcula sozinho e aqui são gravadas junto com a linha
+_COLUNAS_DERIVADAS = ("nome_norm", "n_sinonimos", "tag_mask")
+
+# O mesmo bit que o SQLite dá a cada tag canônica (a posição em TAGS_CANONICAS)
+_TAG_BITS = {nome.casefold(): bit for bit, nome in enumerate(database.TAGS_CANONICAS[:database.TAG_BITS_MAX])}
+
+# Rótulo canônico por lower(rótulo) ou alias, como os triggers _codigo do SQLite
+_ROTULOS = {
+    dimensao: {**{rotulo.lower(): rotulo for rotulo, _ in padrao}, **database.ALIASES_PADRAO[dimensao]}
+    for dimensao, padrao in (("status", database.STATUS_PADRAO), ("opiniao", database.OPINIAO_PADRAO),
+                             ("conteudo", database.CONTEUDO_PADRAO))
+}
+
+
+def _ddl(schema):
+    return f"""
+        CREATE SCHEMA IF NOT EXISTS {schema};
+
+        CREATE TABLE IF NOT EXISTS {schema}.listas (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            nome TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS {schema}.linhas (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            lista_id BIGINT NOT NULL REFERENCES {schema}.listas (id),
+            nome TEXT NOT NULL,
+            nome_norm TEXT,
+            alias TEXT,
+            tags TEXT NOT NULL DEFAULT '',
+            conteudo TEXT NOT NULL,
+            status TEXT NOT NULL,
+            episodio INTEGER,
+            opiniao TEXT NOT NULL,
+            imagem_url TEXT,
+            last_highlight TEXT,
+            sinopse TEXT,
+            sinonimos TEXT NOT NULL DEFAULT '[]',
+            n_sinonimos INTEGER NOT NULL DEFAULT 0,
+            tag_mask BIGINT NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 1,
+            created_at TEXT,
+            updated_at TEXT,
+            falta_imagem BOOLEAN GENERATED ALWAYS AS (
+                COALESCE(imagem_url, '') = '' OR strpos(imagem_url, 'placeholder.com') > 0) STORED,
+            falta_detalhes BOOLEAN GENERATED ALWAYS AS (
+                COALESCE(btrim(sinopse), '') IN ('', '[]') OR n_sinonimos < 3) STORED
+        );
+        CREATE INDEX IF NOT EXISTS idx_linhas_lista_nome ON {schema}.linhas (lista_id, nome_norm, id);
+        CREATE INDEX IF NOT EXISTS idx_linhas_nome_norm ON {schema}.linhas (nome_norm);
+
+        -- Como no SQLite: uma tag por grafia (nome único); chave agrupa as grafias nos filtros
+        CREATE TABLE IF NOT EXISTS {schema}.tags (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            nome TEXT NOT NULL,
+            chave TEXT NOT NULL
+        );
+        ALTER TABLE {schema}.tags DROP CONSTRAINT IF EXISTS tags_chave_key;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tags_nome ON {schema}.tags (nome);
+        CREATE INDEX IF NOT EXISTS idx_tags_chave ON {schema}.tags (chave);
+
+        CREATE TABLE IF NOT EXISTS {schema}.linha_tags (
+            linha_id BIGINT NOT NULL REFERENCES {schema}.linhas (id) ON DELETE CASCADE,
+            tag_id BIGINT NOT NULL REFERENCES {schema}.tags (id) ON DELETE CASCADE,
+            PRIMARY KEY (linha_id, tag_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_linha_tags_tag ON {schema}.linha_tags (tag_id);
+    """
+
+
+def conectar():
+    """Conexão nova em autocommit: leituras soltas não deixam transação aberta, escritas usam transacao()."""
+    if psycopg is None:
+        raise RuntimeError('LISTIT_BACKEND=postgres precisa do psycopg 3: pip install "psycopg[binary]"')
+    return psycopg.connect(PG_DSN, autocommit=True, row_factory=dict_row)
+
+
+@contextmanager
+def transacao(conn):
+    """BEGIN ... COMMIT (ou ROLLBACK se algo falhar)."""
+    with conn.transaction():
+        yield conn
+
+
+def preparar():
+    """Cria os schemas main/espera (idempotente). Equivale às migrações do SQLite."""
+    conn = conectar()
+    try:
+        with transacao(conn):
+            for schema in SCHEMAS:
+                conn.execute(_ddl(schema))
+            for schema in SCHEMAS:
+                conn.execute(f"ALTER TABLE {schema}.linhas ADD COLUMN IF NOT EXISTS alias TEXT")
+            conn.execute("ALTER TABLE espera.linhas ADD COLUMN IF NOT EXISTS migrated INTEGER NOT NULL DEFAULT 0")
+    finally:
+        conn.close()
+
+
+def _carimbo():
+    """Mesmo formato do updated_at gravado pelo trigger do SQLite."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _n_sinonimos(valor):
+    try:
+        sinonimos = json.loads(valor) if valor else []
+    except ValueError:
+        return 0
+    return len(sinonimos) if isinstance(sinonimos, list) else 0
+
+
+def _derivadas(dados):
+    """Acrescenta a `dados` (já normalizado) as colunas que dependem dos campos informados."""
+    dados = dict(dados)
+    if "sinopse" in dados:
+        # Como no SQLite: NULL não mexe na sinopse, '' apaga
+        if dados["sinopse"] is None:
+            del dados["sinopse"]
+        else:
+            dados["sinopse"] = database.limpar_sinopse(dados["sinopse"]) or None
+    for dimensao, rotulos in _ROTULOS.items():
+        if isinstance(dados.get(dimensao), str):
+            valor = dados[dimensao].strip()
+            dados[dimensao] = rotulos.get(valor.lower(), valor)
+    if "nome" in dados:
+        dados["nome_norm"] = database.nome_norm(dados["nome"])
+    if "sinonimos" in dados:
+        dados["n_sinonimos"] = _n_sinonimos(dados["sinonimos"])
+    if "tags" in dados:
+        dados["tag_mask"], _ = database.mascara_de_tags(database.split_tags(dados["tags"]), _TAG_BITS)
+    return dados
+
+
+def _sync_tags(conn, schema, linha_id, tags_field):
+    """linha_tags da linha a partir do campo livre de tags (mesma transação da escrita)."""
+    conn.execute(f"DELETE FROM {schema}.linha_tags WHERE linha_id = %s", (linha_id,))
+    for nome in database.split_tags(tags_field):
+        tag_id = conn.execute(f"""
+            INSERT INTO {schema}.tags (nome, chave) VALUES (%s, %s)
+            ON CONFLICT (nome) DO UPDATE SET nome = EXCLUDED.nome
+            RETURNING id
+        """, (nome, nome.casefold())).fetchone()["id"]
+        conn.execute(
+            f"INSERT INTO {schema}.linha_tags (linha_id, tag_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            (linha_id, tag_id)
+        )
+
+
+# ============================================================
+# Listas
+# ============================================================
+
+def listar_listas(conn, schema=MAIN):
+    rows = conn.execute(f"SELECT id, nome FROM {_schema(schema)}.listas ORDER BY id").fetchall()
+    return [{"id": row["id"], "nome": row["nome"]} for row in rows]
+
+
+def nome_lista(conn, schema, lista_id):
+    row = conn.execute(f"SELECT nome FROM {_schema(schema)}.listas WHERE id = %s", (lista_id,)).fetchone()
+    return row["nome"] if row else None
+
+
+def criar_lista(conn, schema, nome):
+    return conn.execute(
+        f"INSERT INTO {_schema(schema)}.listas (nome) VALUES (%s) RETURNING id", (nome,)
+    ).fetchone()["id"]
+
+
+def remover_lista(conn, schema, lista_id):
+    """Remove a lista e suas linhas. Retorna o nome da lista removida (ou None)."""
+    nome = nome_lista(conn, schema, lista_id)
+    if nome is None:
+        return None
+    conn.execute(f"DELETE FROM {schema}.linhas WHERE lista_id = %s", (lista_id,))
+    conn.execute(f"DELETE FROM {schema}.listas WHERE id = %s", (lista_id,))
+    return nome
+
+
+def limpar(conn, schema):
+    """Apaga todo o conteúdo do schema (usado para esvaziar a espera)."""
+    for tabela in ("linha_tags", "linhas", "listas", "tags"):
+        conn.execute(f"DELETE FROM {_schema(schema)}.{tabela}")
+
+
+# ============================================================
+# Linhas
+# ============================================================
+
+def listar_linhas(conn, schema, lista_id, colunas=None):
+    """Linhas da lista, por id. `colunas` é uma sequência de nomes (None = todas)."""
+    return conn.execute(
+        f"SELECT {', '.join(colunas) if colunas else '*'} FROM {_schema(schema)}.linhas"
+        f" WHERE lista_id = %s ORDER BY id",
+        (lista_id,)
+    ).fetchall()
+
+
+def obter_linha(conn, schema, linha_id, colunas=None):
+    row = conn.execute(
+        f"SELECT {', '.join(colunas) if colunas else '*'} FROM {_schema(schema)}.linhas WHERE id = %s",
+        (linha_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def nome_linha(conn, schema, linha_id):
+    row = conn.execute(f"SELECT nome FROM {_schema(schema)}.linhas WHERE id = %s", (linha_id,)).fetchone()
+    return row["nome"] if row else None
+
+
+def inserir_linha(conn, schema, dados):
+    """Insere a linha (campos ausentes ficam com o padrão) e sincroniza as tags. Retorna (id, last_highlight)."""
+    dados = repositorio._normalizar(dados)
+    dados.setdefault("tags", "")
+    dados.setdefault("sinonimos", "[]")
+    dados.setdefault("last_highlight", agora())
+    dados = _derivadas({c: dados[c] for c in COLUNAS_EDITAVEIS if c in dados})
+    dados["created_at"] = agora()
+    dados["updated_at"] = _carimbo()
+    linha_id = conn.execute(f"""
+        INSERT INTO {_schema(schema)}.linhas ({', '.join(dados)})
+        VALUES ({', '.join('%s' for _ in dados)})
+        RETURNING id
+    """, list(dados.values())).fetchone()["id"]
+    _sync_tags(conn, schema, linha_id, dados["tags"])
+    return linha_id, dados["last_highlight"]
+
+
+def versao_linha(conn, schema, linha_id):
+    row = conn.execute(f"SELECT version FROM {_schema(schema)}.linhas WHERE id = %s", (linha_id,)).fetchone()
+    return row["version"] if row else None
+
+
+def atualizar_linha(conn, schema, linha_id, dados, versao=None):
+    """
+    Atualiza só os campos informados. Retorna quantos campos mudaram (NaoEncontrado se a linha não existe).
+    Com `versao`, o UPDATE só acontece se a linha ainda estiver nela (senão ConflitoDeVersao).
+    """
+    dados = {k: v for k, v in repositorio._normalizar(dados).items() if k in COLUNAS_EDITAVEIS}
+    if versao is None and not dados:
+        if nome_linha(conn, schema, linha_id) is None:
+            raise NaoEncontrado("Linha não encontrada")
+        return 0
+    colunas = _derivadas(dados)
+    sets = ", ".join([f"{coluna} = %s" for coluna in colunas] + ["version = version + 1", "updated_at = %s"])
+    where, params = "id = %s", [linha_id]
+    if versao is not None:
+        where, params = "id = %s AND version = %s", [linha_id, versao]
+    cursor = conn.execute(
+        f"UPDATE {_schema(schema)}.linhas SET {sets} WHERE {where}",
+        list(colunas.values()) + [_carimbo()] + params
+    )
+    if cursor.rowcount == 0:
+        atual = versao_linha(conn, schema, linha_id)
+        if atual is None:
+            raise NaoEncontrado("Linha não encontrada")
+        raise ConflitoDeVersao(atual)
+    if "tags" in dados:
+        _sync_tags(conn, schema, linha_id, dados["tags"])
+    return len(dados)
+
+
+def avancar_progresso(conn, schema, linha_id, delta=1):
+    """Soma `delta` ao episódio num único UPDATE (nunca abaixo de 0). Retorna a linha com nome/episodio/version."""
+    row = conn.execute(f"""
+        UPDATE {_schema(schema)}.linhas
+           SET episodio = GREATEST(COALESCE(episodio, 0) + %s, 0),
+               version = version + 1,
+               updated_at = %s
+         WHERE id = %s
+        RETURNING id, nome, episodio, version
+    """, (delta, _carimbo(), linha_id)).fetchone()
+    if row is None:
+        raise NaoEncontrado("Linha não encontrada")
+    return dict(row)
+
+
+def _remover_linhas(conn, schema, ids):
+    # linha_tags sai junto (ON DELETE CASCADE)
+    conn.execute(f"DELETE FROM {schema}.linhas WHERE id = ANY(%s)", (list(ids),))
+
+
+def remover_linha(conn, schema, linha_id):
+    """Remove a linha. Retorna o nome dela (ou None se não existia)."""
+    nome = nome_linha(conn, schema, linha_id)
+    if nome is not None:
+        _remover_linhas(conn, _schema(schema), [linha_id])
+    return nome
+
+
+def linhas_incompletas(conn, ids):
+    """Linhas do principal entre `ids` ainda sem imagem ou sem sinopse/sinônimos."""
+    return [dict(row) for row in conn.execute("""
+        SELECT id, nome, conteudo FROM main.linhas
+         WHERE id = ANY(%s) AND (falta_imagem OR falta_detalhes)
+    """, (list(ids),))]
+
+
+def tags_em_uso(conn, schema=MAIN, lista_id=None):
+    """Tags usadas por pelo menos uma linha (via índice linha_tags), na ordem da colação PT_BR."""
+    sql = f"""
+        SELECT DISTINCT t.nome
+          FROM {_schema(schema)}.tags t
+          JOIN {schema}.linha_tags lt ON lt.tag_id = t.id
+    """
+    params = ()
+    if lista_id is not None:
+        sql += f" JOIN {schema}.linhas l ON l.id = lt.linha_id WHERE l.lista_id = %s"
+        params = (lista_id,)
+    nomes = [row["nome"] for row in conn.execute(sql, params).fetchall()]
+    return sorted(nomes, key=cmp_to_key(database.colacao_pt))
+
+
+# ============================================================
+# Operações entre principal e espera
+# ============================================================
+
+def _copiar_linhas(conn, origem, destino, lista_destino_sql, lista_params, where_sql, params):
+    """
+    INSERT ... SELECT de origem.linhas (alias l) para destino.linhas.
+    Retorna [(id_antigo, id_novo)] na ordem dos ids de origem.
+    """
+    # Os ids novos são reservados no SELECT (nextval), então o par antigo -> novo
+    # sai da própria consulta, sem depender da ordem em que o INSERT grava
+    colunas = ", ".join(COLUNAS_COPIADAS + _COLUNAS_DERIVADAS)
+    rows = conn.execute(f"""
+        WITH copia AS MATERIALIZED (
+            SELECT l.*, {lista_destino_sql} AS destino_lista_id,
+                   nextval(pg_get_serial_sequence('{destino}.linhas', 'id')) AS novo_id
+              FROM {origem}.linhas l
+             WHERE {where_sql}
+        ), inseridas AS (
+            INSERT INTO {destino}.linhas (id, lista_id, updated_at, {colunas})
+            SELECT novo_id, destino_lista_id, %s, {colunas} FROM copia
+        )
+        SELECT id, novo_id, tags FROM copia ORDER BY id
+    """, list(lista_params) + list(params) + [_carimbo()]).fetchall()
+    for row in rows:
+        _sync_tags(conn, destino, row["novo_id"], row["tags"])
+    return [(row["id"], row["novo_id"]) for row in rows]
+
+
+def mover_linhas(conn, origem, origem_lista_id, destino, destino_lista_id, ids):
+    """
+    Move as linhas `ids` da lista de origem para a de destino (mesmo schema ou não).
+    Retorna {id_antigo: id_novo} só com os ids que pertenciam à lista de origem.
+    """
+    for schema in (origem, destino):
+        _schema(schema)
+    if nome_lista(conn, origem, origem_lista_id) is None:
+        raise NaoEncontrado("Lista de origem não encontrada")
+    if nome_lista(conn, destino, destino_lista_id) is None:
+        raise NaoEncontrado("Lista de destino não encontrada")
+    ids = list(ids)
+    if origem == destino:
+        movidos = conn.execute(f"""
+            UPDATE {origem}.linhas SET lista_id = %s, version = version + 1, updated_at = %s
+             WHERE lista_id = %s AND id = ANY(%s)
+            RETURNING id
+        """, (destino_lista_id, _carimbo(), origem_lista_id, ids)).fetchall()
+        return {row["id"]: row["id"] for row in movidos}
+    pares = _copiar_linhas(
+        conn, origem, destino, "%s", [destino_lista_id],
+        "l.lista_id = %s AND l.id = ANY(%s)", [origem_lista_id, ids]
+    )
+    _remover_linhas(conn, origem, [antigo for antigo, _ in pares])
+    return dict(pares)
+
+
+def migrar_espera(conn, lista_espera_id=None):
+    """
+    Migra a espera (ou uma lista dela) para o principal.
+    Listas são casadas pelo nome (criadas se não existirem); as linhas migradas e as
+    listas que ficarem vazias saem da espera. Retorna estatísticas e os pares de ids.
+    """
+    filtro_lista = "e.id = %s" if lista_espera_id is not None else "TRUE"
+    params_lista = [lista_espera_id] if lista_espera_id is not None else []
+
+    criadas = conn.execute(f"""
+        INSERT INTO main.listas (nome)
+        SELECT e.nome FROM espera.listas e
+         WHERE {filtro_lista}
+           AND NOT EXISTS (SELECT 1 FROM main.listas m WHERE m.nome = e.nome)
+         ORDER BY e.id
+    """, params_lista).rowcount
+
+    filtro_linhas = f"l.lista_id IN (SELECT e.id FROM espera.listas e WHERE {filtro_lista})"
+    pares = _copiar_linhas(
+        conn, ESPERA, MAIN,
+        """(SELECT m.id FROM main.listas m
+             WHERE m.nome = (SELECT e.nome FROM espera.listas e WHERE e.id = l.lista_id)
+             ORDER BY m.id LIMIT 1)""", [],
+        f"{filtro_linhas} AND COALESCE(l.migrated, 0) = 0", params_lista
+    )
+    # Sai da espera tudo o que estava nessas listas, inclusive o que a migração seletiva já copiou
+    da_espera = [row["id"] for row in conn.execute(
+        f"SELECT l.id FROM espera.linhas l WHERE {filtro_linhas}", params_lista
+    )]
+    _remover_linhas(conn, ESPERA, da_espera)
+    esvaziadas = conn.execute(f"""
+        DELETE FROM espera.listas v
+         WHERE v.id IN (SELECT e.id FROM espera.listas e WHERE {filtro_lista})
+           AND NOT EXISTS (SELECT 1 FROM espera.linhas l WHERE l.lista_id = v.id)
+    """, params_lista).rowcount
+    return {"listas_criadas": criadas, "listas_migradas": esvaziadas, "pares": pares}
+
+
+def migrar_selecionadas(conn, lista_espera_id, linha_ids, destino_lista_id):
+    """
+    Copia as linhas escolhidas da espera para uma lista principal e as marca como migradas.
+    Retorna (pares [(id_espera, id_principal)], erros por id).
+    """
+    if nome_lista(conn, MAIN, destino_lista_id) is None:
+        raise NaoEncontrado("Lista principal não encontrada")
+    linha_ids = list(linha_ids)
+    estado = {row["id"]: row["migrated"] for row in conn.execute("""
+        SELECT id, migrated FROM espera.linhas
+         WHERE lista_id = %s AND id = ANY(%s)
+    """, (lista_espera_id, linha_ids))}
+    erros = []
+    for linha_id in linha_ids:
+        if linha_id not in estado:
+            erros.append(f"Linha {linha_id} não encontrada na lista de espera")
+        elif estado[linha_id]:
+            erros.append(f"Linha {linha_id} já foi migrada anteriormente")
+    pares = _copiar_linhas(
+        conn, ESPERA, MAIN, "%s", [destino_lista_id],
+        "l.lista_id = %s AND l.id = ANY(%s) AND l.migrated = 0", [lista_espera_id, linha_ids]
+    )
+    conn.execute(
+        "UPDATE espera.linhas SET migrated = 1, version = version + 1, updated_at = %s WHERE id = ANY(%s)",
+        (_carimbo(), [antigo for antigo, _ in pares])
+    )
+    return pares, erros
+
+
+def deduplicar_espera(conn, remover=True):
+    """
+    Linhas da espera que já existem no principal (mesmo nome_norm: sem acentos, maiúsculas
+    nem pontuação) ou repetidas dentro da mesma lista de espera. Com remover=True elas são apagadas.
+    """
+    duplicadas = [dict(row) for row in conn.execute("""
+        SELECT l.id, l.lista_id, l.nome, 'já está na lista principal' AS motivo
+          FROM espera.linhas l
+         WHERE EXISTS (SELECT 1 FROM main.linhas m WHERE m.nome_norm = l.nome_norm)
+        UNION ALL
+        SELECT l.id, l.lista_id, l.nome, 'repetida na espera' AS motivo
+          FROM espera.linhas l
+         WHERE NOT EXISTS (SELECT 1 FROM main.linhas m WHERE m.nome_norm = l.nome_norm)
+           AND EXISTS (SELECT 1 FROM espera.linhas o
+                        WHERE o.lista_id = l.lista_id AND o.nome_norm = l.nome_norm AND o.id < l.id)
+         ORDER BY 1
+    """)]
+    if remover and duplicadas:
+        _remover_linhas(conn, ESPERA, [d["id"] for d in duplicadas])
+    return duplicadas
@@ -0,0 +1,479 @@
+"""
+sincronia_git.py — Versionamento dos bancos no git em segundo plano.
+
+As rotas de escrita chamam registrar(mensagem) depois do COMMIT no SQLite e
+respondem na hora: quem roda git add/commit/push é uma thread própria.
+O que vai para o git é a exportação textual dos bancos (exportacao.py), não
+os .db binários.
+
+  - Commit: espera GIT_ESPERA segundos sem mudanças novas (no máximo
+    GIT_ESPERA_MAX desde a primeira pendente) e junta todas as mensagens
+    pendentes num commit só.
+  - Push: no máximo um a cada GIT_PUSH_INTERVALO segundos. Se falhar, tenta
+    de novo com espera exponencial (GIT_BACKOFF_MIN dobrando até GIT_BACKOFF_MAX).
+    Push rejeitado (remoto divergiu) também só espera e tenta de novo: o
+    histórico local nunca é descartado.
+
+O git roda dentro do processo com o dulwich (um Repo aberto uma vez, sem
+criar processos a cada escrita). Sem o dulwich instalado, ou com
+LISTIT_GIT=binario, cada operação chama o executável git como antes.
+
+status() mostra o que está pendente e o resultado das últimas tentativas.
+
+As mesmas implementações leem o histórico (commits(), ler(), no_historico())
+para o índice de historico.py.
+"""
+
+import atexit
+import io
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import armazenamento
+import exportacao
+
+try:
+    from dulwich import porcelain
+    from dulwich.graph import can_fast_forward
+    from dulwich.object_store import tree_lookup_path
+    from dulwich.repo import Repo
+except ImportError:
+    porcelain = None
+
+GIT_ESPERA = float(os.environ.get("LISTIT_GIT_ESPERA", 2))
+GIT_ESPERA_MAX = float(os.environ.get("LISTIT_GIT_ESPERA_MAX", 30))
+GIT_PUSH_INTERVALO = float(os.environ.get("LISTIT_GIT_PUSH_INTERVALO", 30))
+GIT_BACKOFF_MIN = 5
+GIT_BACKOFF_MAX = 15 * 60
+GIT_IMPLEMENTACAO = os.environ.get("LISTIT_GIT", "dulwich" if porcelain else "binario").strip().lower()
+
+# index.lock mais velho que isso é sobra de um git que morreu no meio
+LOCK_ABANDONADO = 10 * 60
+
+# Caminhos versionados: a exportação de exportacao.BANCOS
+ARQUIVOS = (exportacao.EXPORT_DIR,)
+
+# Mensagens listadas no corpo de um commit que junta várias alterações
+MENSAGENS_NO_CORPO = 50
+
+
+class GitError(Exception):
+    """Comando git falhou ou estourou o tempo."""
+
+
+def _liberar_index_abandonado():
+    """Apaga .git/index.lock só se for antigo; um lock recente é de outro git em andamento."""
+    lock = os.path.join(".git", "index.lock")
+    try:
+        if time.time() - os.path.getmtime(lock) > LOCK_ABANDONADO:
+            os.remove(lock)
+    except OSError:
+        pass
+
+
+class GitBinario:
+    """Cada operação é um processo `git` (caminho antigo, sem dependências)."""
+
+    nome = "binario"
+
+    def _git(self, *args, timeout=10, texto=True):
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+                text=texto
+            )
+        except subprocess.TimeoutExpired as e:
+            raise GitError(f"git {args[0]}: sem resposta em {timeout}s") from e
+        except OSError as e:
+            raise GitError(f"git {args[0]}: {e}") from e
+        if result.returncode != 0:
+            erro = result.stderr if texto else result.stderr.decode("utf-8", "replace")
+            raise GitError(f"git {args[0]}: {erro.strip()}")
+        return result.stdout
+
+    def commitar(self, arquivos, mensagem):
+        if not self._git("status", "--porcelain", *arquivos, timeout=5).strip():
+            return False
+        self._git("add", *arquivos)
+        self._git("commit", "-m", mensagem)
+        return True
+
+    def tem_remoto(self):
+        try:
+            return bool(self._git("remote", timeout=5).strip())
+        except GitError:
+            return False
+
+    def push(self):
+        self._git("push", timeout=15)
+
+    def commits(self, desde, caminhos):
+        """Commits depois de `desde` que mexeram em `caminhos`, do mais antigo ao HEAD: [(sha, quando, mensagem, pai)]."""
+        saida = self._git("log", "--reverse", "--format=%H%x00%P%x00%cI%x00%B%x1e",
+                          f"{desde}..HEAD" if desde else "HEAD", "--", *caminhos, timeout=60)
+        commits = []
+        for registro in saida.split("\x1e"):
+            registro = registro.strip("\n")
+            if registro:
+                sha, pais, quando, mensagem = registro.split("\x00", 3)
+                commits.append((sha, quando, mensagem.strip(), pais.split()[0] if pais else None))
+        return commits
+
+    def no_historico(self, sha):
+        """True se `sha` é o HEAD ou um ancestral dele (False depois de um rebase/amend ou se não existe)."""
+        try:
+            self._git("merge-base", "--is-ancestor", sha, "HEAD", timeout=30)
+        except GitError:
+            return False
+        return True
+
+    def ler(self, sha, caminho):
+        """Conteúdo (bytes) de `caminho` no commit `sha`, ou None se ele não existia ali."""
+        try:
+            return self._git("show", f"{sha}:{caminho}", timeout=30, texto=False)
+        except GitError:
+            return None
+
+
+class GitDulwich:
+    """git dentro do processo: um único Repo aberto, stage/commit/push sem criar processos."""
+
+    nome = "dulwich"
+
+    def __init__(self, caminho="."):
+        try:
+            self.repo = Repo(caminho)
+        except Exception as e:
+            raise GitError(f"Repositório git não encontrado em {os.path.abspath(caminho)}: {e}") from e
+
+    def _desindexar_apagados(self, index, arquivos):
+        """Tira do index o que sumiu do disco dentro de `arquivos` (o `git add` do binário faz isso)."""
+        prefixos = [os.path.relpath(os.path.abspath(a), self.repo.path).replace(os.sep, "/").encode()
+                    for a in arquivos]
+        for caminho in list(index):
+            if (any(caminho == p or caminho.startswith(p + b"/") for p in prefixos)
+                    and not os.path.lexists(os.path.join(self.repo.path, os.fsdecode(caminho)))):
+                del index[caminho]
+
+    @staticmethod
+    def _arquivos_no_disco(arquivos):
+        """Expande os diretórios de `arquivos` nos arquivos que existem dentro deles."""
+        encontrados = []
+        for a in arquivos:
+            if os.path.isdir(a):
+                for raiz, _, nomes in os.walk(a):
+                    encontrados.extend(os.path.abspath(os.path.join(raiz, n)) for n in sorted(nomes))
+            elif os.path.lexists(a):
+                encontrados.append(os.path.abspath(a))
+        return encontrados
+
+    def commitar(self, arquivos, mensagem):
+        try:
+            # porcelain.add só acrescenta/atualiza: no dulwich 0.22 não entra em diretórios
+            # nem registra remoções, então os arquivos vão um a um e as remoções à parte.
+            # Lista vazia não pode chegar ao add (sem paths ele adiciona o diretório todo).
+            no_disco = self._arquivos_no_disco(arquivos)
+            if no_disco:
+                porcelain.add(self.repo, paths=no_disco)
+            index = self.repo.open_index()
+            self._desindexar_apagados(index, arquivos)
+            index.write()
+            # O index inteiro vira a árvore do commit, como no `git commit`
+            arvore = index.commit(self.repo.object_store)
+            try:
+                atual = self.repo[self.repo.head()].tree
+            except KeyError:
+                atual = None
+            if arvore == atual:
+                return False
+            porcelain.commit(self.repo, message=mensagem.encode("utf-8"))
+        except Exception as e:
+            # O dulwich não tem uma exceção base: FileLocked, OSError, KeyError...
+            raise GitError(f"git commit (dulwich): {e}") from e
+        return True
+
+    def tem_remoto(self):
+        return any(secao[0] == b"remote" for secao in self.repo.get_config().sections())
+
+    def push(self):
+        saida = io.BytesIO()
+        try:
+            porcelain.push(self.repo, outstream=saida, errstream=saida)
+        except Exception as e:
+            detalhe = saida.getvalue().decode("utf-8", "replace").strip()
+            raise GitError(f"git push (dulwich): {e} {detalhe}".strip()) from e
+
+    def commits(self, desde, caminhos):
+        try:
+            walker = self.repo.get_walker(
+                include=[self.repo.head()],
+                exclude=[desde.encode()] if desde else None,
+                paths=[c.encode() for c in caminhos],
+                reverse=True,
+            )
+            commits = []
+            for entrada in walker:
+                commit = entrada.commit
+                fuso = timezone(timedelta(seconds=commit.commit_timezone))
+                commits.append((
+                    commit.id.decode(),
+                    datetime.fromtimestamp(commit.commit_time, fuso).isoformat(),
+                    commit.message.decode("utf-8", "replace").strip(),
+                    commit.parents[0].decode() if commit.parents else None,
+                ))
+        except Exception as e:
+            raise GitError(f"git log (dulwich): {e}") from e
+        return commits
+
+    def no_historico(self, sha):
+        try:
+            return can_fast_forward(self.repo, sha.encode(), self.repo.head())
+        except Exception:
+            return False
+
+    def ler(self, sha, caminho):
+        try:
+            _, blob = tree_lookup_path(self.repo.__getitem__, self.repo[sha.encode()].tree, caminho.encode())
+            return self.repo[blob].data
+        except KeyError:
+            return None
+
+
+IMPLEMENTACOES = {"dulwich": GitDulwich, "binario": GitBinario}
+
+_repositorio = None
+_repositorio_lock = threading.Lock()
+
+
+def repositorio():
+    """A implementação escolhida em LISTIT_GIT, aberta na primeira chamada e reaproveitada."""
+    global _repositorio
+    with _repositorio_lock:
+        if _repositorio is None:
+            if GIT_IMPLEMENTACAO not in IMPLEMENTACOES:
+                raise GitError(f"LISTIT_GIT inválido: {GIT_IMPLEMENTACAO} (use {' ou '.join(IMPLEMENTACOES)})")
+            if GIT_IMPLEMENTACAO == "dulwich" and porcelain is None:
+                raise GitError("LISTIT_GIT=dulwich, mas o dulwich não está instalado")
+            _repositorio = IMPLEMENTACOES[GIT_IMPLEMENTACAO]()
+        return _repositorio
+
+
+def mensagem_do_commit(mensagens):
+    """Uma alteração vira o próprio assunto; várias viram um resumo com a lista no corpo."""
+    if len(mensagens) == 1:
+        return mensagens[0]
+    corpo = [f"- {m}" for m in mensagens[:MENSAGENS_NO_CORPO]]
+    if len(mensagens) > MENSAGENS_NO_CORPO:
+        corpo.append(f"- ... e mais {len(mensagens) - MENSAGENS_NO_CORPO}")
+    return f"Sincronizando {len(mensagens)} alterações\n\n" + "\n".join(corpo)
+
+
+_commit_lock = threading.Lock()
+
+
+def commitar(mensagens):
+    """Exporta os bancos e faz stage + commit dos ARQUIVOS. Retorna False se não havia o que commitar."""
+    _liberar_index_abandonado()
+    # A thread e o descarregar() da saída do processo não commitam ao mesmo tempo
+    with _commit_lock:
+        exportacao.exportar_todos()
+        return repositorio().commitar(ARQUIVOS, mensagem_do_commit(mensagens))
+
+
+# ============================================================
+# Thread de sincronia
+# ============================================================
+
+_cond = threading.Condition()
+_pendentes = []
+_estado = {
+    "ativo": False,
+    "commits": 0,
+    "ultimo_commit": None,
+    "ultimo_push": None,
+    "push_pendente": False,
+    "falhas_commit": 0,
+    "falhas_push": 0,
+    "ultimo_erro": None,
+}
+# Instantes (time.monotonic) que controlam o agendamento
+_relogio = {
+    "primeira_pendente": None,
+    "ultima_pendente": None,
+    "proximo_commit": 0.0,
+    "proximo_push": 0.0,
+    "forcar": False,
+}
+
+
+def _agora_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def registrar(mensagem):
+    """Enfileira uma alteração para o próximo commit. Nunca bloqueia a requisição."""
+    if not armazenamento.sqlite():
+        # O git versiona a exportação dos .db; em outro backend não há o que commitar
+        return
+    agora = time.monotonic()
+    with _cond:
+        if not _pendentes:
+            _relogio["primeira_pendente"] = agora
+        _pendentes.append(mensagem)
+        _relogio["ultima_pendente"] = agora
+        _cond.notify()
+    iniciar()
+
+
+def sincronizar_agora():
+    """Commit e push sem esperar o debounce nem o backoff."""
+    with _cond:
+        _relogio["forcar"] = True
+        _estado["push_pendente"] = True
+        _relogio["proximo_commit"] = _relogio["proximo_push"] = 0.0
+        _cond.notify()
+    iniciar()
+
+
+def _quando_commitar():
+    if not _pendentes:
+        return None
+    if _relogio["forcar"]:
+        return 0.0
+    quando = min(_relogio["ultima_pendente"] + GIT_ESPERA, _relogio["primeira_pendente"] + GIT_ESPERA_MAX)
+    return max(quando, _relogio["proximo_commit"])
+
+
+def _quando_enviar():
+    return _relogio["proximo_push"] if _estado["push_pendente"] else None
+
+
+def _backoff(contador):
+    """Espera antes da próxima tentativa depois de uma falha (com o lock de _cond)."""
+    _estado[contador] += 1
+    return min(GIT_BACKOFF_MIN * 2 ** (_estado[contador] - 1), GIT_BACKOFF_MAX)
+
+
+def _proxima_tarefa():
+    """Espera até haver commit ou push vencido. Retorna (mensagens a commitar, push?)."""
+    with _cond:
+        while True:
+            agora = time.monotonic()
+            prazos = [p for p in (_quando_commitar(), _quando_enviar()) if p is not None]
+            if prazos and min(prazos) <= agora:
+                break
+            _cond.wait(timeout=min(prazos) - agora if prazos else None)
+        commit = _quando_commitar()
+        mensagens = []
+        if commit is not None and commit <= agora:
+            mensagens = list(_pendentes)
+            _pendentes.clear()
+        envio = _quando_enviar()
+        _relogio["forcar"] = False
+        return mensagens, envio is not None and envio <= agora
+
+
+def _rodar_commit(mensagens):
+    try:
+        criado = commitar(mensagens)
+    except Exception as e:
+        # Qualquer falha (git, disco, exportação de um registro corrompido) só adia o
+        # commit: a thread não pode morrer com ativo=True e a fila parada
+        with _cond:
+            # Voltam para a fila (na frente das que chegaram enquanto isso)
+            _pendentes[:0] = mensagens
+            _relogio["proximo_commit"] = time.monotonic() + _backoff("falhas_commit")
+            _estado["ultimo_erro"] = f"{_agora_iso()} {e}"
+        return
+    with _cond:
+        _relogio["proximo_commit"] = 0.0
+        _estado["falhas_commit"] = 0
+        if criado:
+            _estado["commits"] += 1
+            _estado["ultimo_commit"] = _agora_iso()
+            if not _estado["push_pendente"]:
+                _estado["push_pendente"] = True
+                _relogio["proximo_push"] = max(_relogio["proximo_push"], time.monotonic())
+
+
+def _rodar_push():
+    try:
+        git = repositorio()
+        if not git.tem_remoto():
+            with _cond:
+                _estado["push_pendente"] = False
+            return
+        git.push()
+    except Exception as e:
+        with _cond:
+            _relogio["proximo_push"] = time.monotonic() + _backoff("falhas_push")
+            _estado["ultimo_erro"] = f"{_agora_iso()} {e}"
+        return
+    with _cond:
+        # Commit e push rodam na mesma thread: nada foi commitado durante o push
+        _estado["push_pendente"] = False
+        _estado["ultimo_push"] = _agora_iso()
+        _estado["falhas_push"] = 0
+        _relogio["proximo_push"] = time.monotonic() + GIT_PUSH_INTERVALO
+
+
+def _loop():
+    while True:
+        try:
+            mensagens, enviar = _proxima_tarefa()
+            if mensagens:
+                _rodar_commit(mensagens)
+            if enviar:
+                _rodar_push()
+        except Exception as e:
+            # Rede de segurança: a thread segue viva; as tarefas já reagendaram o que falhou
+            with _cond:
+                _estado["ultimo_erro"] = f"{_agora_iso()} {e}"
+            time.sleep(GIT_BACKOFF_MIN)
+
+
+def descarregar():
+    """Commita o que estiver pendente, sem push (chamado na saída do processo)."""
+    with _cond:
+        mensagens = list(_pendentes)
+        _pendentes.clear()
+    if mensagens:
+        try:
+            commitar(mensagens)
+        except Exception as e:
+            with _cond:
+                _pendentes[:0] = mensagens
+                _estado["ultimo_erro"] = f"{_agora_iso()} {e}"
+
+
+def iniciar():
+    """Sobe a thread de sincronia (uma vez por processo)."""
+    with _cond:
+        if _estado["ativo"]:
+            return
+        _estado["ativo"] = True
+    atexit.register(descarregar)
+    threading.Thread(target=_loop, name="sincronia_git", daemon=True).start()
+
+
+def status():
+    with _cond:
+        estado = dict(_estado)
+        estado["pendentes"] = len(_pendentes)
+        estado["mensagens_pendentes"] = _pendentes[:MENSAGENS_NO_CORPO]
+        agora = time.monotonic()
+        for chave, prazo in (("commit_em_segundos", _quando_commitar()), ("push_em_segundos", _quando_enviar())):
+            estado[chave] = None if prazo is None else round(max(prazo - agora, 0), 1)
+    estado.update({
+        "espera_segundos": GIT_ESPERA,
+        "espera_max_segundos": GIT_ESPERA_MAX,
+        "push_intervalo_segundos": GIT_PUSH_INTERVALO,
+        "implementacao": GIT_IMPLEMENTACAO,
+    })
+    return estado
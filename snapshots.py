@@ -0,0 +1,232 @@
+"""
+snapshots.py — Cópias de segurança online dos bancos (API de backup do SQLite).
+
+Um snapshot é uma cópia consistente do banco tirada com Connection.backup()
+em passos pequenos, então leitores e escritores continuam trabalhando enquanto
+ela acontece. A cópia é comprimida (gzip) em SNAPSHOT_DIR e só as
+SNAPSHOT_MANTER mais recentes de cada banco ficam guardadas.
+
+Quem dispara os snapshots é uma thread em segundo plano: a cada
+SNAPSHOT_INTERVALO segundos ou depois de SNAPSHOT_A_CADA escritas
+(registrar_escrita() só incrementa um contador, nunca bloqueia a requisição).
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import database
+
+SNAPSHOT_DIR = os.environ.get("LISTIT_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_MANTER = int(os.environ.get("LISTIT_SNAPSHOT_MANTER", 10))
+SNAPSHOT_INTERVALO = int(os.environ.get("LISTIT_SNAPSHOT_INTERVALO", 6 * 60 * 60))
+SNAPSHOT_A_CADA = int(os.environ.get("LISTIT_SNAPSHOT_A_CADA", 50))
+
+# Páginas copiadas por passo do backup e pausa entre passos (libera o banco para as rotas)
+PAGINAS_POR_PASSO = 256
+PAUSA_ENTRE_PASSOS = 0.005
+
+# Bancos incluídos em cada snapshot e as migrações para atualizá-los após um restore
+BANCOS = {
+    database.MAIN_DB: database.MAIN_MIGRATIONS,
+    database.WAITING_DB: database.WAITING_MIGRATIONS,
+    database.ARQUIVO_DB: database.ARQUIVO_MIGRATIONS,
+}
+
+# list_it-20250101T120000Z-manual.db.gz
+_NOME_ARQUIVO = re.compile(r"^(?P<banco>.+)-(?P<quando>\d{8}T\d{6}Z)-(?P<motivo>[\w-]+)\.db\.gz$")
+
+
+class SnapshotError(Exception):
+    """Snapshot inexistente, corrompido ou que não pôde ser gravado."""
+
+
+def _prefixo(banco):
+    return os.path.splitext(os.path.basename(banco))[0]
+
+
+def criar_snapshot(banco=database.MAIN_DB, motivo="manual"):
+    """Copia o banco com a API de backup e grava <banco>-<quando>-<motivo>.db.gz. Retorna o caminho."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    quando = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    motivo = re.sub(r"[^\w-]+", "-", motivo).strip("-") or "manual"
+    destino = os.path.join(SNAPSHOT_DIR, f"{_prefixo(banco)}-{quando}-{motivo}.db.gz")
+
+    fd, temporario = tempfile.mkstemp(suffix=".db", dir=SNAPSHOT_DIR)
+    os.close(fd)
+    try:
+        # Conexões próprias (fora do pool): o backup não segura nenhuma conexão das rotas
+        origem = sqlite3.connect(banco, timeout=database.PRAGMAS["busy_timeout"] / 1000)
+        copia = sqlite3.connect(temporario)
+        try:
+            origem.backup(copia, pages=PAGINAS_POR_PASSO, sleep=PAUSA_ENTRE_PASSOS)
+            # A cópia fica em modo rollback journal: um único arquivo, sem -wal
+            copia.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            copia.close()
+            origem.close()
+        with open(temporario, "rb") as entrada, gzip.open(destino + ".tmp", "wb", compresslevel=6) as saida:
+            shutil.copyfileobj(entrada, saida)
+        os.replace(destino + ".tmp", destino)
+    except (sqlite3.Error, OSError) as e:
+        raise SnapshotError(f"Falha ao criar snapshot de {banco}: {e}") from e
+    finally:
+        for resto in (temporario, destino + ".tmp"):
+            if os.path.exists(resto):
+                os.remove(resto)
+    rotacionar(banco)
+    return destino
+
+
+def listar_snapshots(banco=None):
+    """Snapshots guardados (mais recentes primeiro), opcionalmente só de um banco."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    snapshots = []
+    for arquivo in os.listdir(SNAPSHOT_DIR):
+        m = _NOME_ARQUIVO.match(arquivo)
+        if not m or (banco and m["banco"] != _prefixo(banco)):
+            continue
+        caminho = os.path.join(SNAPSHOT_DIR, arquivo)
+        snapshots.append({
+            "arquivo": arquivo,
+            "banco": m["banco"],
+            "criado_em": datetime.strptime(m["quando"], "%Y%m%dT%H%M%SZ")
+                                 .replace(tzinfo=timezone.utc).isoformat(),
+            "motivo": m["motivo"],
+            "tamanho": os.path.getsize(caminho),
+        })
+    snapshots.sort(key=lambda s: s["criado_em"], reverse=True)
+    return snapshots
+
+
+def rotacionar(banco):
+    """Apaga os snapshots do banco além dos SNAPSHOT_MANTER mais recentes."""
+    for antigo in listar_snapshots(banco)[SNAPSHOT_MANTER:]:
+        os.remove(os.path.join(SNAPSHOT_DIR, antigo["arquivo"]))
+
+
+def restaurar_snapshot(arquivo):
+    """
+    Volta o banco do snapshot ao estado da cópia. Antes guarda um snapshot do
+    estado atual ("antes-restore") e confere a integridade da cópia. A escrita
+    usa a própria API de backup, então as conexões abertas do pool passam a ver
+    o conteúdo restaurado. Retorna (banco, snapshot de segurança).
+    """
+    m = _NOME_ARQUIVO.match(os.path.basename(arquivo or ""))
+    if not m:
+        raise SnapshotError(f"Nome de snapshot inválido: {arquivo}")
+    origem_gz = os.path.join(SNAPSHOT_DIR, m.group(0))
+    if not os.path.exists(origem_gz):
+        raise SnapshotError(f"Snapshot não encontrado: {arquivo}")
+    banco = next((b for b in BANCOS if _prefixo(b) == m["banco"]), None)
+    if banco is None:
+        raise SnapshotError(f"Banco desconhecido no snapshot: {m['banco']}")
+
+    fd, temporario = tempfile.mkstemp(suffix=".db", dir=SNAPSHOT_DIR)
+    os.close(fd)
+    try:
+        with gzip.open(origem_gz, "rb") as entrada, open(temporario, "wb") as saida:
+            shutil.copyfileobj(entrada, saida)
+        copia = sqlite3.connect(temporario)
+        try:
+            resultado = copia.execute("PRAGMA integrity_check").fetchone()[0]
+            if resultado != "ok":
+                raise SnapshotError(f"Snapshot corrompido ({resultado}): {arquivo}")
+            seguranca = criar_snapshot(banco, motivo="antes-restore")
+            destino = sqlite3.connect(banco, timeout=database.PRAGMAS["busy_timeout"] / 1000)
+            try:
+                copia.backup(destino)
+            finally:
+                destino.close()
+        finally:
+            copia.close()
+    except (sqlite3.Error, OSError) as e:
+        raise SnapshotError(f"Falha ao restaurar {arquivo}: {e}") from e
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    # O snapshot pode ser de antes de alguma migração
+    database.migrate(banco, BANCOS[banco])
+    return banco, os.path.basename(seguranca)
+
+
+# ============================================================
+# Agendamento em segundo plano
+# ============================================================
+
+_acordar = threading.Event()
+_estado_lock = threading.Lock()
+_estado = {
+    "ativo": False,
+    "escritas_desde_ultimo": 0,
+    "ultimo_snapshot": None,
+    "ultimo_erro": None,
+}
+
+
+def registrar_escrita():
+    """Conta uma escrita; ao chegar em SNAPSHOT_A_CADA acorda a thread de snapshots."""
+    with _estado_lock:
+        _estado["escritas_desde_ultimo"] += 1
+        if _estado["escritas_desde_ultimo"] >= SNAPSHOT_A_CADA:
+            _acordar.set()
+
+
+def snapshot_de_todos(motivo):
+    """Snapshot de todos os bancos em BANCOS. Retorna os arquivos criados."""
+    with _estado_lock:
+        _estado["escritas_desde_ultimo"] = 0
+    criados = []
+    try:
+        for banco in BANCOS:
+            if os.path.exists(banco):
+                criados.append(os.path.basename(criar_snapshot(banco, motivo)))
+        erro = None
+    except SnapshotError as e:
+        erro = str(e)
+    with _estado_lock:
+        _estado["ultimo_snapshot"] = datetime.now(timezone.utc).isoformat()
+        _estado["ultimo_erro"] = erro
+    if erro:
+        raise SnapshotError(erro)
+    return criados
+
+
+def _loop():
+    while True:
+        acordou = _acordar.wait(timeout=SNAPSHOT_INTERVALO)
+        _acordar.clear()
+        try:
+            snapshot_de_todos("escritas" if acordou else "agendado")
+        except SnapshotError:
+            # Fica registrado em status(); tenta de novo no próximo ciclo
+            time.sleep(1)
+
+
+def iniciar():
+    """Sobe a thread de snapshots (uma vez por processo)."""
+    with _estado_lock:
+        if _estado["ativo"]:
+            return
+        _estado["ativo"] = True
+    threading.Thread(target=_loop, name="snapshots", daemon=True).start()
+
+
+def status():
+    with _estado_lock:
+        estado = dict(_estado)
+    estado.update({
+        "diretorio": SNAPSHOT_DIR,
+        "manter": SNAPSHOT_MANTER,
+        "intervalo_segundos": SNAPSHOT_INTERVALO,
+        "a_cada_escritas": SNAPSHOT_A_CADA,
+    })
+    return estado
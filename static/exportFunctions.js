@@ -1,5 +1,5 @@
 import { refreshSequenceDisplay } from './sequenceManagement.js';
-import { bindSinopseButton } from './lineManagement.js';
+import { bindSinopseButton, carregarSinopse } from './lineManagement.js';
 import { getEpisodeLabel } from './utils.js';
 
 // ---------------------------- HELPERS ----------------------------
@@ -602,6 +602,9 @@ async function exportItemAsImage(item, forcedType = null) {
     if (loader) loader.style.display = 'flex';
 
     try {
+        // O card usa a sinopse, que as listagens não trazem
+        await carregarSinopse(item);
+
         // Limpar export-card antigo completamente
         const oldExportCard = document.getElementById('export-card');
         if (oldExportCard) {
@@ -40,8 +40,8 @@ async function corrigirItem(item) {
         }
     }
 
-    // 2) Verifica se precisa de detalhes (sinopse ou sinônimos)
-    const needsDetails = !item.sinopse || !Array.isArray(item.sinonimos) || item.sinonimos.length < 3;
+    // 2) Verifica se precisa de detalhes (sinopse ou sinônimos); a listagem não traz a sinopse, só needs_details
+    const needsDetails = item.needs_details ?? (!item.sinopse || !Array.isArray(item.sinonimos) || item.sinonimos.length < 3);
 
     if (needsDetails) {
         try {
@@ -454,6 +454,19 @@ async function showListDetails(lista) {
             return;
         }
 
+        // A sinopse não vem na listagem: busca só ela, de uma vez, quando for exportada
+        if (opts.sinopse && filtered.some(item => item.sinopse === undefined)) {
+            try {
+                const resp = await fetch(`/linhas/${state.currentList.id}?fields=id,sinopse`);
+                const sinopses = new Map((await resp.json()).map(l => [l.id, l.sinopse]));
+                for (const item of filtered) {
+                    if (item.sinopse === undefined) item.sinopse = sinopses.get(item.id) ?? '';
+                }
+            } catch (e) {
+                console.warn('Erro ao carregar sinopses para exportação:', e);
+            }
+        }
+
         const total = filtered.length;
         let current = 0;
 
@@ -691,6 +704,19 @@ async function fetchImageUrl(query, contentType) {
     }
 }
 
+// As listagens não trazem a sinopse: busca em /linhas/:id/details na primeira vez que for usada
+async function carregarSinopse(item) {
+    if (item.sinopse === undefined && item.id) {
+        try {
+            const resp = await fetch(`/linhas/${item.id}/details`);
+            if (resp.ok) item.sinopse = (await resp.json()).sinopse || '';
+        } catch (e) {
+            console.warn(`Erro ao carregar sinopse de ${item.nome}:`, e);
+        }
+    }
+    return item.sinopse || '';
+}
+
 function bindSinopseButton(item) {
     const btn = document.getElementById('showSynopsisBtn');
     if (!btn) return;
@@ -699,7 +725,8 @@ function bindSinopseButton(item) {
     const freshBtn = btn.cloneNode(true);
     btn.parentNode.replaceChild(freshBtn, btn);
 
-    freshBtn.addEventListener('click', () => {
+    freshBtn.addEventListener('click', async () => {
+        const sinopse = await carregarSinopse(item);
         // Cria o modal
         const synopsisModal = document.createElement('div');
         synopsisModal.id = 'synopsis-modal';
@@ -721,7 +748,7 @@ function bindSinopseButton(item) {
 
         synopsisModal.innerHTML = `
             <h3 style="margin-top: 0;">Sinopse de ${item.nome}</h3>
-            <p id="sinopse-texto" style="line-height: 1.6;">${item.sinopse || 'Sinopse não disponível'}</p>
+            <p id="sinopse-texto" style="line-height: 1.6; white-space: pre-line;"></p>
             <button id="closeSynopsis" style="
                 position: absolute;
                 top: 10px;
@@ -734,6 +761,8 @@ function bindSinopseButton(item) {
             ">&times;</button>
         `;
 
+        // Texto puro (sanitizado no servidor): textContent preserva os caracteres como estão
+        synopsisModal.querySelector('#sinopse-texto').textContent = sinopse || 'Sinopse não disponível';
         document.body.appendChild(synopsisModal);
 
         // Delegação: fecha se clicar no botão OU fora do conteúdo
@@ -1183,20 +1212,27 @@ async function showItemDetails(item, navList = null) {
                     btn.addEventListener('click', async (e) => {
                         e.stopPropagation();
                         if (btn.id === 'createSequence') {
-                            const response = await fetch('/sequencias', {
+                            // Cria a sequência e adiciona o item num único lote ("$0" = id da sequência criada)
+                            await fetch('/batch', {
                                 method: 'POST',
                                 headers: { 'Content-Type': 'application/json' },
                                 body: JSON.stringify({
-                                    nome: `${item.nome} Sequence`,
-                                    descricao: `Sequência criada automaticamente para ${item.nome}`
+                                    mensagem: `Criando Sequência: ${item.nome} Sequence`,
+                                    operacoes: [
+                                        {
+                                            op: 'create', tipo: 'sequencia',
+                                            dados: {
+                                                nome: `${item.nome} Sequence`,
+                                                descricao: `Sequência criada automaticamente para ${item.nome}`
+                                            }
+                                        },
+                                        {
+                                            op: 'create', tipo: 'sequencia_item',
+                                            dados: { sequencia_id: '$0', linha_id: item.id, ordem: 1 }
+                                        }
+                                    ]
                                 })
                             });
-                            const sequence = await response.json();
-                            await fetch(`/sequencias/${sequence.id}/itens`, {
-                                method: 'POST',
-                                headers: { 'Content-Type': 'application/json' },
-                                body: JSON.stringify({ linha_id: item.id, ordem: 1 })
-                            });
                             await refreshSequenceDisplay(item.id);
                             actionsPanel.style.display = 'none';
                             freshBtn.classList.remove('active');
@@ -1626,6 +1662,7 @@ export {
     showItemDetails,
     showItems,
     bindSinopseButton,
+    carregarSinopse,
     bindExportButton,
     bindPreviewButton,
     createActionButtons
@@ -1642,7 +1642,7 @@
             const sequenceListDiv = document.getElementById('sequenceList');
             sequenceListDiv.innerHTML = sequence.itens.map(item => `
                 <div class="sequence-card${getClasseExtra(item) ? ' ' + getClasseExtra(item) : ''}">
-                    <div class="order">${item.ordem}</div>
+                    <div class="order">${item.posicao ?? item.ordem}</div>
                     <button class="remove-sequence-item" data-id="${item.id}">&times;</button>
                     <img src="${item.imagem_url}" alt="${item.nome}">
                     <p class="sequence-text">${item.nome}</p>
@@ -30,7 +30,7 @@ async function refreshSequenceDisplay(itemId = null) {
                 <div class="sequence-list" id="sequenceList">
                     ${sequence.itens.map(item => `
                         <div class="sequence-card">
-                            <div class="order">${item.ordem}</div>
+                            <div class="order">${item.posicao ?? item.ordem}</div>
                             <button class="remove-sequence-item" data-id="${item.id}">&times;</button>
                             <img src="${item.imagem_url}" alt="${item.nome}">
                             <p class="sequence-text">${item.nome}</p>
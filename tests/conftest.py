@@ -0,0 +1,74 @@
+"""
+Fixtures compartilhadas pelos testes.
+
+Os módulos ficam na raiz do projeto e abrem os bancos por caminho relativo
+(database.MAIN_DB etc.), então cada teste roda num diretório temporário
+próprio, com o pool de conexões zerado antes e depois.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+import database  # noqa: E402
+import relogio  # noqa: E402
+
+
+def _fechar_pools():
+    with database._pools_lock:
+        pools = list(database._pools.values())
+        database._pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def _migrar():
+    for banco, migracoes in (
+        (database.WAITING_DB, database.WAITING_MIGRATIONS),
+        (database.ARQUIVO_DB, database.ARQUIVO_MIGRATIONS),
+        (database.MAIN_DB, database.MAIN_MIGRATIONS),
+    ):
+        database.migrate(banco, migracoes)
+
+
+@pytest.fixture
+def bancos(tmp_path, monkeypatch):
+    """Diretório de trabalho vazio com list_it.db, waiting_list.db e arquivo.db já migrados."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LISTIT_NO", "teste")
+    _fechar_pools()
+    _migrar()
+    yield tmp_path
+    _fechar_pools()
+
+
+@pytest.fixture
+def maquina(tmp_path, monkeypatch):
+    """
+    Fábrica de "máquinas" para testar a sincronização: `with maquina("a") as conn`
+    entra em tmp_path/a (bancos migrados na primeira vez), com o nó "a" no
+    relógio, e devolve a conexão do principal. O relógio do processo é o mesmo
+    nas duas, então quem escreve depois sempre tem o carimbo mais novo.
+    """
+    @contextmanager
+    def entrar(no):
+        diretorio = tmp_path / no
+        diretorio.mkdir(exist_ok=True)
+        monkeypatch.chdir(diretorio)
+        monkeypatch.setattr(relogio.relogio, "_no", no)
+        _fechar_pools()
+        _migrar()
+        conn = database.get_connection(database.MAIN_DB)
+        try:
+            yield conn
+        finally:
+            conn.close()
+            _fechar_pools()
+
+    return entrar
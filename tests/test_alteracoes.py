@@ -0,0 +1,165 @@
+"""
+Changesets entre duas máquinas (alteracoes.py): exporta de um banco, aplica no
+outro e confere o last-writer-wins campo a campo.
+"""
+
+import alteracoes
+import repositorio
+
+
+def _linha(lista_id, nome="Frieren", **campos):
+    return {"lista_id": lista_id, "nome": nome, "conteudo": "Anime", "status": "Vendo", "opiniao": "Bom", **campos}
+
+
+def _nova_linha(conn, nome="Frieren", **campos):
+    """Lista "Animes" com uma linha; retorna o uid da linha."""
+    with repositorio.transacao(conn):
+        lista_id = repositorio.criar_lista(conn, repositorio.MAIN, "Animes")
+        linha_id, _ = repositorio.inserir_linha(conn, repositorio.MAIN, _linha(lista_id, nome, **campos))
+    return _uid(conn, linha_id)
+
+
+def _uid(conn, linha_id):
+    return conn.execute("SELECT uid FROM linhas WHERE id = ?", (linha_id,)).fetchone()[0]
+
+
+def _por_uid(conn, uid, *colunas):
+    row = conn.execute(f"SELECT {', '.join(colunas)} FROM linhas WHERE uid = ?", (uid,)).fetchone()
+    return tuple(row) if row else None
+
+
+def _id(conn, uid):
+    return conn.execute("SELECT id FROM linhas WHERE uid = ?", (uid,)).fetchone()[0]
+
+
+def _editar(conn, uid, **dados):
+    with repositorio.transacao(conn):
+        repositorio.atualizar_linha(conn, repositorio.MAIN, _id(conn, uid), dados)
+
+
+def _sincronizadas(maquina):
+    """A cria uma linha e B recebe tudo; retorna (uid, cursor de A, cursor de B)."""
+    with maquina("a") as conn:
+        uid = _nova_linha(conn)
+        changeset = alteracoes.exportar(conn)
+    with maquina("b") as conn:
+        resultado = alteracoes.aplicar(conn, changeset)
+        assert (resultado["criadas"], resultado["pendentes"]) == (2, 0)
+        cursor_b = resultado["cursor"]
+    return uid, changeset["cursor"], cursor_b
+
+
+def _trocar(maquina, cursores):
+    """Manda as edições novas de A para B e as de B para A; retorna os dois resultados."""
+    with maquina("a") as conn:
+        de_a = alteracoes.exportar(conn, cursores[0])
+    with maquina("b") as conn:
+        de_b = alteracoes.exportar(conn, cursores[1])
+        em_b = alteracoes.aplicar(conn, de_a)
+    with maquina("a") as conn:
+        em_a = alteracoes.aplicar(conn, de_b)
+    return em_a, em_b
+
+
+def test_edicoes_em_campos_diferentes_se_somam(maquina):
+    uid, cursor_a, cursor_b = _sincronizadas(maquina)
+    with maquina("a") as conn:
+        _editar(conn, uid, status="Concluido")
+    with maquina("b") as conn:
+        _editar(conn, uid, episodio=12)
+
+    em_a, em_b = _trocar(maquina, (cursor_a, cursor_b))
+    assert em_a["atualizadas"] == em_b["atualizadas"] == 1
+    for no in ("a", "b"):
+        with maquina(no) as conn:
+            assert _por_uid(conn, uid, "status", "episodio") == ("Concluido", 12)
+
+
+def test_mesmo_campo_vence_o_carimbo_mais_novo(maquina):
+    uid, cursor_a, cursor_b = _sincronizadas(maquina)
+    with maquina("a") as conn:
+        _editar(conn, uid, opiniao="Ruim")
+    with maquina("b") as conn:
+        _editar(conn, uid, opiniao="Favorito")
+
+    em_a, em_b = _trocar(maquina, (cursor_a, cursor_b))
+    assert em_a["atualizadas"] == 1
+    assert (em_b["atualizadas"], em_b["ignoradas"]) == (0, em_b["recebidas"])
+    for no in ("a", "b"):
+        with maquina(no) as conn:
+            assert _por_uid(conn, uid, "opiniao") == ("Favorito",)
+
+
+def test_remocao_mais_velha_que_edicao_nao_apaga(maquina):
+    uid, cursor_a, cursor_b = _sincronizadas(maquina)
+    with maquina("a") as conn:
+        with repositorio.transacao(conn):
+            repositorio.remover_linha(conn, repositorio.MAIN, _id(conn, uid))
+    with maquina("b") as conn:
+        _editar(conn, uid, episodio=5)
+
+    em_a, em_b = _trocar(maquina, (cursor_a, cursor_b))
+    assert (em_b["apagadas"], em_b["mantidas"]) == (0, 1)
+    # Em A a linha volta com a edição de B
+    assert em_a["criadas"] == 1
+    for no in ("a", "b"):
+        with maquina(no) as conn:
+            assert _por_uid(conn, uid, "nome", "episodio") == ("Frieren", 5)
+
+
+def test_remocao_mais_nova_apaga(maquina):
+    uid, cursor_a, cursor_b = _sincronizadas(maquina)
+    with maquina("b") as conn:
+        _editar(conn, uid, episodio=5)
+    with maquina("a") as conn:
+        with repositorio.transacao(conn):
+            repositorio.remover_linha(conn, repositorio.MAIN, _id(conn, uid))
+
+    em_a, em_b = _trocar(maquina, (cursor_a, cursor_b))
+    assert em_b["apagadas"] == 1
+    for no in ("a", "b"):
+        with maquina(no) as conn:
+            assert _por_uid(conn, uid, "id") is None
+
+
+def test_linha_antes_da_lista_fica_pendente(maquina):
+    with maquina("a") as conn:
+        uid = _nova_linha(conn, tags="Ação")
+        changeset = alteracoes.exportar(conn)
+    so_linhas = dict(changeset, alteracoes=[a for a in changeset["alteracoes"] if a["tabela"] == "linhas"])
+
+    with maquina("b") as conn:
+        resultado = alteracoes.aplicar(conn, so_linhas)
+        assert (resultado["pendentes"], resultado["criadas"], resultado["aplicadas"]) == (1, 0, 0)
+        assert _por_uid(conn, uid, "id") is None
+
+        resultado = alteracoes.aplicar(conn, changeset)
+        assert (resultado["pendentes"], resultado["criadas"]) == (0, 2)
+        assert _por_uid(conn, uid, "nome", "tags") == ("Frieren", "Ação")
+        lista = conn.execute("SELECT l.nome FROM linhas x JOIN listas l ON l.id = x.lista_id WHERE x.uid = ?",
+                             (uid,)).fetchone()
+        assert lista[0] == "Animes"
+        assert repositorio.tags_em_uso(conn, repositorio.MAIN) == ["Ação"]
+
+
+def test_lista_apagada_fica_se_ha_linha_editada_depois(maquina):
+    uid, cursor_a, cursor_b = _sincronizadas(maquina)
+    with maquina("a") as conn:
+        lista_id = conn.execute("SELECT lista_id FROM linhas WHERE uid = ?", (uid,)).fetchone()[0]
+        with repositorio.transacao(conn):
+            repositorio.remover_lista(conn, repositorio.MAIN, lista_id)
+    with maquina("b") as conn:
+        _editar(conn, uid, episodio=3)
+
+    em_a, em_b = _trocar(maquina, (cursor_a, cursor_b))
+    assert em_b["mantidas"] == 2
+    # A recebeu a linha antes do novo carimbo da lista: fica pendente até a próxima troca
+    assert em_a["pendentes"] == 1
+    with maquina("b") as conn:
+        de_b = alteracoes.exportar(conn, cursor_b)
+    with maquina("a") as conn:
+        assert alteracoes.aplicar(conn, de_b)["criadas"] == 2
+    for no in ("a", "b"):
+        with maquina(no) as conn:
+            assert _por_uid(conn, uid, "episodio") == (3,)
+            assert [row["nome"] for row in repositorio.listar_listas(conn, repositorio.MAIN)] == ["Animes"]
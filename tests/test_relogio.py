@@ -0,0 +1,58 @@
+"""Relógio lógico híbrido (relogio.py)."""
+
+import pytest
+
+import relogio
+
+
+@pytest.fixture
+def parede(monkeypatch):
+    """Relógio de parede controlado pelo teste, em milissegundos."""
+    agora = {"ms": 1_700_000_000_000}
+    monkeypatch.setattr(relogio.time, "time", lambda: agora["ms"] / 1000)
+    return agora
+
+
+def test_carimbos_crescem_no_mesmo_milissegundo(parede):
+    hlc = relogio.RelogioHLC("a")
+    carimbos = [hlc.agora() for _ in range(3)]
+    assert carimbos == sorted(carimbos)
+    assert [relogio.separar(c) for c in carimbos] == [(1_700_000_000_000, n, "a") for n in range(3)]
+
+
+def test_relogio_de_parede_atrasado_nao_volta(parede):
+    hlc = relogio.RelogioHLC("a")
+    antes = hlc.agora()
+    parede["ms"] -= 60_000
+    depois = hlc.agora()
+    assert depois > antes
+    assert relogio.separar(depois)[:2] == (1_700_000_000_000, 1)
+
+
+def test_observar_carimbo_de_outra_maquina(parede):
+    hlc = relogio.RelogioHLC("a")
+    remoto = "1700000005000-0007-b"
+    hlc.observar(remoto)
+    assert hlc.agora() > remoto
+    assert relogio.separar(hlc.agora())[:2] == (1_700_000_005_000, 9)
+    # Um carimbo mais velho não faz o relógio voltar
+    hlc.observar(relogio.CARIMBO_BASE)
+    assert relogio.separar(hlc.agora())[:2] == (1_700_000_005_000, 10)
+
+
+def test_contador_cheio_passa_para_o_proximo_milissegundo(parede):
+    hlc = relogio.RelogioHLC("a")
+    hlc.observar("1700000000000-9999-b")
+    assert relogio.separar(hlc.agora())[:2] == (1_700_000_000_001, 0)
+
+
+def test_no_desempata_o_mesmo_instante(parede):
+    assert relogio.RelogioHLC("a").agora() < relogio.RelogioHLC("b").agora()
+
+
+@pytest.mark.parametrize("carimbo", [None, "", "123-1-a", "1700000000000-0001-a b"])
+def test_carimbo_invalido(carimbo):
+    with pytest.raises(relogio.RelogioError):
+        relogio.separar(carimbo)
+    with pytest.raises(relogio.RelogioError):
+        relogio.RelogioHLC("a").observar(carimbo)
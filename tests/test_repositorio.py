@@ -0,0 +1,290 @@
+"""
+Contrato do repositório (armazenamento.INTERFACE) sobre o SQLite e o PostgreSQL.
+
+Todo backend precisa responder igual a estes testes: mesmos argumentos,
+retornos e exceções que as rotas de ROTAS_PORTAVEIS usam.
+
+O PostgreSQL só roda com o psycopg instalado e LISTIT_PG_DSN apontando para um
+banco de teste: cada teste apaga e recria os schemas main/espera dele.
+"""
+
+import os
+
+import pytest
+
+import armazenamento
+
+
+def _postgres_limpo():
+    """Schemas main/espera recém-criados no banco de LISTIT_PG_DSN."""
+    pytest.importorskip("psycopg")
+    if not os.environ.get("LISTIT_PG_DSN"):
+        pytest.skip("LISTIT_PG_DSN não definido")
+    repo = armazenamento.carregar("postgres")
+    conn = repo.conectar()
+    try:
+        for schema in repo.SCHEMAS:
+            conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    finally:
+        conn.close()
+    repo.preparar()
+    return repo
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def repo(request):
+    if request.param == "postgres":
+        return _postgres_limpo()
+    request.getfixturevalue("bancos")
+    return armazenamento.carregar("sqlite")
+
+
+@pytest.fixture
+def conn(repo):
+    conn = repo.conectar()
+    yield conn
+    conn.close()
+
+
+def _linha(lista_id, nome="Frieren", **campos):
+    return {"lista_id": lista_id, "nome": nome, "conteudo": "Anime", "status": "Vendo", "opiniao": "Bom", **campos}
+
+
+def _nova_lista(repo, conn, schema, nome="Animes"):
+    with repo.transacao(conn):
+        return repo.criar_lista(conn, schema, nome)
+
+
+def _nova_linha(repo, conn, schema, lista_id, nome="Frieren", **campos):
+    with repo.transacao(conn):
+        linha_id, _ = repo.inserir_linha(conn, schema, _linha(lista_id, nome, **campos))
+    return linha_id
+
+
+def test_implementa_a_interface(repo):
+    faltando = [nome for nome in armazenamento.INTERFACE if not hasattr(repo, nome)]
+    assert faltando == []
+    assert issubclass(repo.NaoEncontrado, LookupError)
+
+
+@pytest.mark.parametrize("schema", ["main", "espera"])
+def test_listas(repo, conn, schema):
+    lista_id = _nova_lista(repo, conn, schema)
+    assert {"id": lista_id, "nome": "Animes"} in repo.listar_listas(conn, schema)
+    assert repo.nome_lista(conn, schema, lista_id) == "Animes"
+
+    _nova_linha(repo, conn, schema, lista_id)
+    with repo.transacao(conn):
+        assert repo.remover_lista(conn, schema, lista_id) == "Animes"
+        assert repo.remover_lista(conn, schema, lista_id) is None
+    assert repo.nome_lista(conn, schema, lista_id) is None
+    assert repo.listar_linhas(conn, schema, lista_id) == []
+
+
+def test_schema_invalido(repo, conn):
+    with pytest.raises(ValueError):
+        repo.listar_listas(conn, "outro")
+
+
+def test_inserir_e_ler_linha(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    with repo.transacao(conn):
+        linha_id, last_highlight = repo.inserir_linha(
+            conn, repo.MAIN, _linha(lista_id, tags=["Ação", "Fantasia"], sinonimos=["Sousou no Frieren"],
+                                    sinopse="<p>Uma elfa</p>")
+        )
+    assert last_highlight
+
+    linha = repo.obter_linha(conn, repo.MAIN, linha_id, ["nome", "tags", "sinonimos", "sinopse", "version"])
+    assert linha == {"nome": "Frieren", "tags": "Ação, Fantasia", "sinonimos": '["Sousou no Frieren"]',
+                     "sinopse": "Uma elfa", "version": 1}
+    assert repo.nome_linha(conn, repo.MAIN, linha_id) == "Frieren"
+    assert repo.versao_linha(conn, repo.MAIN, linha_id) == 1
+    assert [row["id"] for row in repo.listar_linhas(conn, repo.MAIN, lista_id, ["id"])] == [linha_id]
+    assert repo.obter_linha(conn, repo.MAIN, linha_id + 1) is None
+    assert repo.nome_linha(conn, repo.MAIN, linha_id + 1) is None
+
+
+def test_atualizar_linha(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    linha_id = _nova_linha(repo, conn, repo.MAIN, lista_id)
+
+    with repo.transacao(conn):
+        assert repo.atualizar_linha(conn, repo.MAIN, linha_id, {"status": "concluído", "episodio": 28}) == 2
+        assert repo.atualizar_linha(conn, repo.MAIN, linha_id, {"id": 99}) == 0
+    linha = repo.obter_linha(conn, repo.MAIN, linha_id, ["status", "episodio", "version"])
+    # O alias vira o rótulo canônico e a edição conta uma versão só
+    assert linha == {"status": "Concluido", "episodio": 28, "version": 2}
+
+    with pytest.raises(repo.NaoEncontrado):
+        with repo.transacao(conn):
+            repo.atualizar_linha(conn, repo.MAIN, linha_id + 1, {"nome": "X"})
+
+
+def test_atualizar_linha_com_versao(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    linha_id = _nova_linha(repo, conn, repo.MAIN, lista_id)
+
+    with repo.transacao(conn):
+        repo.atualizar_linha(conn, repo.MAIN, linha_id, {"episodio": 3}, versao=1)
+    assert repo.versao_linha(conn, repo.MAIN, linha_id) == 2
+
+    with pytest.raises(repo.ConflitoDeVersao) as erro:
+        with repo.transacao(conn):
+            repo.atualizar_linha(conn, repo.MAIN, linha_id, {"episodio": 4}, versao=1)
+    assert erro.value.versao_atual == 2
+    assert repo.obter_linha(conn, repo.MAIN, linha_id, ["episodio"]) == {"episodio": 3}
+
+    with pytest.raises(repo.NaoEncontrado):
+        with repo.transacao(conn):
+            repo.atualizar_linha(conn, repo.MAIN, linha_id + 1, {"episodio": 4}, versao=1)
+
+
+def test_avancar_progresso(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    linha_id = _nova_linha(repo, conn, repo.MAIN, lista_id, episodio=2)
+
+    with repo.transacao(conn):
+        linha = repo.avancar_progresso(conn, repo.MAIN, linha_id, 3)
+    assert (linha["id"], linha["nome"], linha["episodio"], linha["version"]) == (linha_id, "Frieren", 5, 2)
+    with repo.transacao(conn):
+        assert repo.avancar_progresso(conn, repo.MAIN, linha_id, -10)["episodio"] == 0
+
+    with pytest.raises(repo.NaoEncontrado):
+        with repo.transacao(conn):
+            repo.avancar_progresso(conn, repo.MAIN, linha_id + 1)
+
+
+def test_remover_linha(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    linha_id = _nova_linha(repo, conn, repo.MAIN, lista_id, tags="Ação")
+    with repo.transacao(conn):
+        assert repo.remover_linha(conn, repo.MAIN, linha_id) == "Frieren"
+        assert repo.remover_linha(conn, repo.MAIN, linha_id) is None
+    assert repo.tags_em_uso(conn, repo.MAIN) == []
+
+
+def test_transacao_desfaz_em_erro(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    with pytest.raises(RuntimeError):
+        with repo.transacao(conn):
+            repo.inserir_linha(conn, repo.MAIN, _linha(lista_id))
+            raise RuntimeError("falhou no meio")
+    assert repo.listar_linhas(conn, repo.MAIN, lista_id) == []
+
+
+def test_tags_em_uso(repo, conn):
+    animes = _nova_lista(repo, conn, repo.MAIN)
+    mangas = _nova_lista(repo, conn, repo.MAIN, "Mangás")
+    _nova_linha(repo, conn, repo.MAIN, animes, tags="Romance, Ação")
+    _nova_linha(repo, conn, repo.MAIN, mangas, "Berserk", tags="Drama")
+
+    # Colação PT_BR: "Ação" antes de "Drama", sem olhar acento
+    assert repo.tags_em_uso(conn, repo.MAIN) == ["Ação", "Drama", "Romance"]
+    assert repo.tags_em_uso(conn, repo.MAIN, lista_id=animes) == ["Ação", "Romance"]
+    assert repo.tags_em_uso(conn, repo.ESPERA) == []
+
+
+def test_linhas_incompletas(repo, conn):
+    lista_id = _nova_lista(repo, conn, repo.MAIN)
+    completa = _nova_linha(repo, conn, repo.MAIN, lista_id, imagem_url="http://img", sinopse="Texto",
+                           sinonimos=["a", "b", "c"])
+    incompleta = _nova_linha(repo, conn, repo.MAIN, lista_id, "Berserk")
+    ids = [row["id"] for row in repo.linhas_incompletas(conn, [completa, incompleta])]
+    assert ids == [incompleta]
+
+
+def test_mover_linhas_entre_bancos(repo, conn):
+    principal = _nova_lista(repo, conn, repo.MAIN)
+    espera = _nova_lista(repo, conn, repo.ESPERA, "Para ver")
+    outra = _nova_lista(repo, conn, repo.ESPERA, "Outra")
+    movida = _nova_linha(repo, conn, repo.ESPERA, espera, tags="Ação")
+    de_outra_lista = _nova_linha(repo, conn, repo.ESPERA, outra, "Berserk")
+
+    with repo.transacao(conn):
+        pares = repo.mover_linhas(conn, repo.ESPERA, espera, repo.MAIN, principal, [movida, de_outra_lista])
+    assert list(pares) == [movida]
+    nova = repo.obter_linha(conn, repo.MAIN, pares[movida], ["lista_id", "nome", "tags"])
+    assert nova == {"lista_id": principal, "nome": "Frieren", "tags": "Ação"}
+    assert repo.obter_linha(conn, repo.ESPERA, movida) is None
+    assert repo.tags_em_uso(conn, repo.MAIN) == ["Ação"]
+
+    with pytest.raises(repo.NaoEncontrado):
+        with repo.transacao(conn):
+            repo.mover_linhas(conn, repo.ESPERA, espera, repo.MAIN, principal + 100, [movida])
+
+
+def test_mover_linhas_no_mesmo_banco(repo, conn):
+    origem = _nova_lista(repo, conn, repo.MAIN)
+    destino = _nova_lista(repo, conn, repo.MAIN, "Mangás")
+    linha_id = _nova_linha(repo, conn, repo.MAIN, origem)
+    with repo.transacao(conn):
+        assert repo.mover_linhas(conn, repo.MAIN, origem, repo.MAIN, destino, [linha_id]) == {linha_id: linha_id}
+    assert repo.obter_linha(conn, repo.MAIN, linha_id, ["lista_id"]) == {"lista_id": destino}
+
+
+def test_migrar_espera(repo, conn):
+    existente = _nova_lista(repo, conn, repo.MAIN)
+    espera_animes = _nova_lista(repo, conn, repo.ESPERA)
+    espera_nova = _nova_lista(repo, conn, repo.ESPERA, "Novelas")
+    a = _nova_linha(repo, conn, repo.ESPERA, espera_animes)
+    b = _nova_linha(repo, conn, repo.ESPERA, espera_nova, "Mushoku Tensei")
+
+    with repo.transacao(conn):
+        resultado = repo.migrar_espera(conn)
+    assert resultado["listas_criadas"] == 1
+    assert resultado["listas_migradas"] == 2
+    pares = dict(resultado["pares"])
+    assert sorted(pares) == [a, b]
+    assert repo.obter_linha(conn, repo.MAIN, pares[a], ["lista_id"]) == {"lista_id": existente}
+    assert repo.listar_listas(conn, repo.ESPERA) == []
+
+
+def test_migrar_selecionadas(repo, conn):
+    destino = _nova_lista(repo, conn, repo.MAIN)
+    espera = _nova_lista(repo, conn, repo.ESPERA)
+    linha_id = _nova_linha(repo, conn, repo.ESPERA, espera)
+
+    with repo.transacao(conn):
+        pares, erros = repo.migrar_selecionadas(conn, espera, [linha_id, linha_id + 50], destino)
+    assert [antigo for antigo, _ in pares] == [linha_id]
+    assert erros == [f"Linha {linha_id + 50} não encontrada na lista de espera"]
+    # Continua na espera, marcada como migrada; uma segunda vez vira erro
+    with repo.transacao(conn):
+        pares, erros = repo.migrar_selecionadas(conn, espera, [linha_id], destino)
+    assert pares == []
+    assert erros == [f"Linha {linha_id} já foi migrada anteriormente"]
+
+    with pytest.raises(repo.NaoEncontrado):
+        with repo.transacao(conn):
+            repo.migrar_selecionadas(conn, espera, [linha_id], destino + 100)
+
+
+def test_deduplicar_espera(repo, conn):
+    principal = _nova_lista(repo, conn, repo.MAIN)
+    espera = _nova_lista(repo, conn, repo.ESPERA)
+    _nova_linha(repo, conn, repo.MAIN, principal, "Sousou no Frieren")
+    no_principal = _nova_linha(repo, conn, repo.ESPERA, espera, "Sousou no Frieren!")
+    primeira = _nova_linha(repo, conn, repo.ESPERA, espera, "Berserk")
+    repetida = _nova_linha(repo, conn, repo.ESPERA, espera, "BERSERK")
+
+    with repo.transacao(conn):
+        duplicadas = repo.deduplicar_espera(conn, remover=False)
+    assert [d["id"] for d in duplicadas] == [no_principal, repetida]
+    assert len(repo.listar_linhas(conn, repo.ESPERA, espera)) == 3
+
+    with repo.transacao(conn):
+        repo.deduplicar_espera(conn)
+    assert [row["id"] for row in repo.listar_linhas(conn, repo.ESPERA, espera, ["id"])] == [primeira]
+
+
+def test_limpar(repo, conn):
+    principal = _nova_lista(repo, conn, repo.MAIN)
+    espera = _nova_lista(repo, conn, repo.ESPERA)
+    _nova_linha(repo, conn, repo.MAIN, principal, tags="Ação")
+    _nova_linha(repo, conn, repo.ESPERA, espera, tags="Drama")
+    with repo.transacao(conn):
+        repo.limpar(conn, repo.ESPERA)
+    assert repo.listar_listas(conn, repo.ESPERA) == []
+    assert repo.tags_em_uso(conn, repo.ESPERA) == []
+    assert repo.tags_em_uso(conn, repo.MAIN) == ["Ação"]
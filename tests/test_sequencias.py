@@ -0,0 +1,139 @@
+"""
+Chaves de ordem esparsas das sequências (database.chaves_de_ordem): inserir e
+mover pela posição 1-based, como fazem as rotas /sequencias/<id>/itens/lote e
+.../posicao, e conferir a ordem resultante contra uma lista em Python.
+"""
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def conn(bancos):
+    conn = database.get_connection(database.MAIN_DB)
+    conn.execute("INSERT INTO listas (nome) VALUES ('Animes')")
+    conn.executemany(
+        "INSERT INTO linhas (lista_id, nome, conteudo, status, opiniao) VALUES (1, ?, 'Anime', 'Vendo', 'Bom')",
+        [(f"Item {i}",) for i in range(1, database.SEQUENCIA_GAP + 51)]
+    )
+    conn.execute("INSERT INTO sequencias (nome) VALUES ('Monogatari')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def rebalanceamentos(monkeypatch):
+    """Conta as chamadas de rebalance_sequencia feitas por chaves_de_ordem."""
+    chamadas = []
+    original = database.rebalance_sequencia
+
+    def contar(conn, sequencia_id):
+        chamadas.append(sequencia_id)
+        original(conn, sequencia_id)
+
+    monkeypatch.setattr(database, "rebalance_sequencia", contar)
+    return chamadas
+
+
+def _inserir(conn, linha_ids, posicao=None, sequencia_id=1):
+    """Como POST /sequencias/<id>/itens/lote."""
+    chaves = database.chaves_de_ordem(conn, sequencia_id, len(linha_ids), posicao)
+    conn.executemany(
+        "INSERT INTO sequencia_itens (sequencia_id, linha_id, ordem) VALUES (?, ?, ?)",
+        [(sequencia_id, linha_id, ordem) for linha_id, ordem in zip(linha_ids, chaves)]
+    )
+
+
+def _mover(conn, linha_id, posicao, sequencia_id=1):
+    """Como PUT /sequencias/<id>/itens/<linha_id>/posicao."""
+    (ordem,) = database.chaves_de_ordem(conn, sequencia_id, 1, posicao, ignorar=linha_id)
+    conn.execute("UPDATE sequencia_itens SET ordem = ? WHERE sequencia_id = ? AND linha_id = ?",
+                 (ordem, sequencia_id, linha_id))
+
+
+def _ordem(conn, sequencia_id=1):
+    """Linhas na ordem da sequência (a posição é o índice + 1); as chaves não podem se repetir."""
+    rows = conn.execute(
+        "SELECT linha_id, ordem FROM sequencia_itens WHERE sequencia_id = ? ORDER BY ordem, linha_id",
+        (sequencia_id,)
+    ).fetchall()
+    chaves = [row[1] for row in rows]
+    assert len(set(chaves)) == len(chaves)
+    return [row[0] for row in rows]
+
+
+def test_inserir_no_inicio_no_meio_e_no_fim(conn, rebalanceamentos):
+    esperado = [1, 2, 3]
+    _inserir(conn, [1, 2, 3])
+    for linha_id, posicao in ((4, 1), (5, 3), (6, None), (7, 7), (8, 50)):
+        _inserir(conn, [linha_id], posicao)
+        esperado.insert(len(esperado) if posicao is None else posicao - 1, linha_id)
+        assert _ordem(conn) == esperado
+    assert esperado == [4, 1, 5, 2, 3, 6, 7, 8]
+    assert rebalanceamentos == []
+
+
+def test_lote_no_meio_mantem_a_ordem_do_pedido(conn):
+    _inserir(conn, [1, 2, 3])
+    _inserir(conn, [10, 11, 12], posicao=2)
+    assert _ordem(conn) == [1, 10, 11, 12, 2, 3]
+
+
+@pytest.mark.parametrize("posicao", [1, 2])
+def test_insercoes_repetidas_no_mesmo_ponto_rebalanceiam(conn, rebalanceamentos, posicao):
+    esperado = [1, 2]
+    _inserir(conn, esperado)
+    for linha_id in range(3, 40):
+        _inserir(conn, [linha_id], posicao)
+        esperado.insert(posicao - 1, linha_id)
+        assert _ordem(conn) == esperado
+    # O espaço entre dois vizinhos acaba em log2(SEQUENCIA_GAP) divisões
+    assert rebalanceamentos
+
+
+def test_mover(conn, rebalanceamentos):
+    esperado = list(range(1, 8))
+    _inserir(conn, esperado)
+    for linha_id, posicao in ((7, 1), (7, 7), (1, 4), (4, 2), (3, 100)):
+        _mover(conn, linha_id, posicao)
+        esperado.remove(linha_id)
+        esperado.insert(posicao - 1, linha_id)
+        assert _ordem(conn) == esperado
+    assert rebalanceamentos == []
+
+
+def test_movimentos_repetidos_para_o_mesmo_ponto_rebalanceiam(conn, rebalanceamentos):
+    esperado = list(range(1, 31))
+    _inserir(conn, esperado)
+    # Sempre o último vai para a posição 2: o espaço entre a 1ª e a 2ª chave vai se dividindo
+    for _ in range(29):
+        linha_id = esperado.pop()
+        _mover(conn, linha_id, 2)
+        esperado.insert(1, linha_id)
+        assert _ordem(conn) == esperado
+    assert rebalanceamentos
+
+
+@pytest.mark.parametrize("posicao", [1, 2, None])
+def test_lote_maior_que_o_espaco(conn, rebalanceamentos, posicao):
+    """Mais chaves que SEQUENCIA_GAP entre dois vizinhos: nem o rebalanceamento basta, o restante é empurrado."""
+    _inserir(conn, [1, 2, 3])
+    novos = list(range(4, database.SEQUENCIA_GAP + 50))
+    _inserir(conn, novos, posicao)
+    if posicao is None:
+        assert _ordem(conn) == [1, 2, 3] + novos
+        assert rebalanceamentos == []
+    else:
+        esperado = [1, 2, 3]
+        esperado[posicao - 1:posicao - 1] = novos
+        assert _ordem(conn) == esperado
+        assert rebalanceamentos == [1]
+
+    # Depois do empurrão, inserir e mover no meio continua funcionando
+    ultimo = database.SEQUENCIA_GAP + 50
+    _inserir(conn, [ultimo], 3)
+    assert _ordem(conn)[2] == ultimo
+    _mover(conn, 1, len(novos) + 4)
+    assert _ordem(conn)[-1] == 1
@@ -0,0 +1,151 @@
+"""
+As duas implementações do git de sincronia_git.py (binário e dulwich) contra
+um repositório temporário com um remoto bare: commit, push e leitura do
+histórico precisam dar o mesmo resultado.
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import sincronia_git
+
+ARQUIVOS = ("dados",)
+
+
+def _git(*args, cwd="."):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _gravar(caminho, texto):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "w", encoding="utf-8", newline="\n") as f:
+        f.write(texto)
+
+
+@pytest.fixture
+def repositorio_git(tmp_path, monkeypatch):
+    """Diretório de trabalho com `git init`, identidade configurada e o remoto origin (bare)."""
+    if shutil.which("git") is None:
+        pytest.skip("git não instalado")
+    remoto = tmp_path / "remoto.git"
+    trabalho = tmp_path / "trabalho"
+    _git("init", "-q", "--bare", "-b", "main", str(remoto))
+    _git("init", "-q", "-b", "main", str(trabalho))
+    monkeypatch.chdir(trabalho)
+    _git("config", "user.name", "List_IT")
+    _git("config", "user.email", "listit@localhost")
+    _git("config", "push.default", "current")
+    _git("remote", "add", "origin", str(remoto))
+    return remoto
+
+
+def _nova(nome):
+    if nome == "dulwich":
+        pytest.importorskip("dulwich")
+        if sincronia_git.porcelain is None:
+            pytest.skip("dulwich indisponível para sincronia_git")
+    return sincronia_git.IMPLEMENTACOES[nome]()
+
+
+@pytest.fixture(params=["binario", "dulwich"])
+def git(request, repositorio_git):
+    return _nova(request.param)
+
+
+def _arvore(ref="HEAD"):
+    return _git("ls-tree", "-r", "--name-only", ref).splitlines()
+
+
+def test_commitar_so_quando_muda(git):
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    _gravar("fora.txt", "não versionado")
+    assert git.commitar(ARQUIVOS, "Adicionando Linha: A id: 1") is True
+    assert git.commitar(ARQUIVOS, "nada mudou") is False
+    assert _arvore() == ["dados/list_it/linhas.ndjson"]
+    assert _git("log", "-1", "--format=%s") == "Adicionando Linha: A id: 1"
+
+
+def test_commitar_registra_remocoes(git):
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    _gravar("dados/list_it/antiga.ndjson", "{}\n")
+    git.commitar(ARQUIVOS, "primeiro")
+    os.remove("dados/list_it/antiga.ndjson")
+    assert git.commitar(ARQUIVOS, "tabela removida") is True
+    assert _arvore() == ["dados/list_it/linhas.ndjson"]
+    assert _git("status", "--porcelain") == ""
+
+
+def test_push(git, repositorio_git):
+    assert git.tem_remoto() is True
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    git.commitar(ARQUIVOS, "primeiro")
+    git.push()
+    assert _git("rev-parse", "main", cwd=repositorio_git) == _git("rev-parse", "HEAD")
+
+
+def test_sem_remoto(git):
+    _git("remote", "remove", "origin")
+    assert git.tem_remoto() is False
+
+
+def test_push_falha_vira_git_error(git, tmp_path):
+    _git("remote", "set-url", "origin", str(tmp_path / "nao-existe.git"))
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    git.commitar(ARQUIVOS, "primeiro")
+    with pytest.raises(sincronia_git.GitError):
+        git.push()
+
+
+def test_commits_ler_e_no_historico(git):
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    git.commitar(ARQUIVOS, "primeiro")
+    _gravar("dados/arquivo/linhas.ndjson", '{"id":2}\n')
+    git.commitar(ARQUIVOS, "só no arquivo")
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1,"nome":"B"}\n')
+    git.commitar(ARQUIVOS, "segundo\n\n- Atualizando Linha: B id: 1")
+
+    caminhos = ("dados/list_it/linhas.ndjson",)
+    commits = git.commits(None, caminhos)
+    assert [mensagem for _, _, mensagem, _ in commits] == ["primeiro", "segundo\n\n- Atualizando Linha: B id: 1"]
+    (primeiro, _, _, pai_primeiro), (segundo, quando, _, pai_segundo) = commits
+    assert pai_primeiro is None
+    assert pai_segundo == _git("rev-parse", "HEAD~1")
+    assert quando.startswith(_git("log", "-1", "--format=%cd", "--date=format:%Y-%m-%d"))
+    assert [sha for sha, _, _, _ in git.commits(primeiro, caminhos)] == [segundo]
+    assert git.commits(segundo, caminhos) == []
+
+    assert git.ler(primeiro, "dados/list_it/linhas.ndjson") == b'{"id":1}\n'
+    assert git.ler(primeiro, "dados/arquivo/linhas.ndjson") is None
+    assert git.no_historico(primeiro) is True
+    assert git.no_historico("0" * 40) is False
+
+
+def test_no_historico_depois_de_amend(git):
+    _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+    git.commitar(ARQUIVOS, "primeiro")
+    _gravar("dados/list_it/linhas.ndjson", '{"id":2}\n')
+    git.commitar(ARQUIVOS, "segundo")
+    reescrito = _git("rev-parse", "HEAD")
+    _git("commit", "-q", "--amend", "-m", "segundo (reescrito)")
+    assert git.no_historico(reescrito) is False
+
+
+def test_implementacoes_geram_a_mesma_arvore(repositorio_git):
+    """Mesma sequência de escritas e remoções: mesmas árvores nos dois caminhos."""
+    arvores = {}
+    for nome in ("binario", "dulwich"):
+        git = _nova(nome)
+        _git("rm", "-rq", "--ignore-unmatch", "dados")
+        shutil.rmtree("dados", ignore_errors=True)
+        _gravar("dados/list_it/linhas.ndjson", '{"id":1}\n')
+        _gravar("dados/list_it/tags.ndjson", '{"id":1,"nome":"Ação"}\n')
+        _gravar("dados/waiting_list/linhas.ndjson", "")
+        git.commitar(ARQUIVOS, f"{nome}: primeiro")
+        os.remove("dados/list_it/tags.ndjson")
+        _gravar("dados/list_it/linhas.ndjson", '{"id":1,"nome":"B"}\n')
+        git.commitar(ARQUIVOS, f"{nome}: segundo")
+        arvores[nome] = _git("rev-parse", "HEAD^{tree}")
+    assert arvores["binario"] == arvores["dulwich"]
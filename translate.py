@@ -1,9 +1,10 @@
-import sqlite3
 import re
 import sys
 import requests
 from time import sleep
 
+import database
+
 def is_not_empty(text: str) -> bool:
     return bool(text and text.strip())
 
@@ -31,15 +32,14 @@ def translate_text_via_api(text: str, target_lang: str = 'pt') -> str:
         return text
 
 def migrate_translate_sinopses(db_path: str = "list_it.db"):
-    conn = sqlite3.connect(db_path)
+    # Conexão do pool: os triggers de sinopse usam as funções registradas nela
+    conn = database.get_connection(db_path)
     cursor = conn.cursor()
 
     cursor.execute("""
-        SELECT id, sinopse
-          FROM linhas
-         WHERE sinopse IS NOT NULL
-           AND TRIM(sinopse) != ''
-         ORDER BY id DESC
+        SELECT linha_id, sinopse_texto(texto)
+          FROM sinopses
+         ORDER BY linha_id DESC
          LIMIT 30
     """)
     rows = cursor.fetchall()